@@ -39,33 +39,37 @@ def scrape_amazon_product(url: str) -> Dict:
         response = requests.get(url, headers=HEADERS)
         response.raise_for_status()
         
-        # Parser le HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extraire les données
-        product_data = {
-            'url': url,
-            'title': get_product_title(soup),
-            'price': get_product_price(soup),
-            'original_price': get_original_price(soup),
-            'rating': get_product_rating(soup),
-            'review_count': get_review_count(soup),
-            'availability': get_availability(soup),
-            'description': get_description(soup),
-            'features': get_product_features(soup),
-            'image_url': get_product_image(soup),
-            'brand': get_product_brand(soup),
-            'seller': get_product_seller(soup),
-            'asin': get_product_asin(url),
-            'categories': get_product_categories(soup)
-        }
-        
-        return product_data
+        return parse_product_page(response.text, url)
         
     except Exception as e:
         print(f"Une erreur s'est produite pour {url}: {str(e)}")
         return None
 
+def parse_product_page(html: str, url: str) -> Dict:
+    """Extrait les données d'une page produit Amazon déjà téléchargée"""
+    # Parser le HTML
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Extraire les données
+    product_data = {
+        'url': url,
+        'title': get_product_title(soup),
+        'price': get_product_price(soup),
+        'original_price': get_original_price(soup),
+        'rating': get_product_rating(soup),
+        'review_count': get_review_count(soup),
+        'availability': get_availability(soup),
+        'description': get_description(soup),
+        'features': get_product_features(soup),
+        'image_url': get_product_image(soup),
+        'brand': get_product_brand(soup),
+        'seller': get_product_seller(soup),
+        'asin': get_product_asin(url),
+        'categories': get_product_categories(soup)
+    }
+    
+    return product_data
+
 # Fonctions d'extraction (certaines sont nouvelles)
 def get_product_title(soup):
     try:
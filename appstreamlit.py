@@ -1,10 +1,37 @@
 import streamlit as st
 import pandas as pd
+import os
 import json
-from recommendation_filters import content_based_filter, popularity_filter
+from data_processing import near_duplicates
+from data_processing.tables import read_table
+from recommendation_filters import content_based_filter, popularity_filter, user_profiles
 from models import collaborative_model_based
+from monitoring.instrumentation import span
+from serving import catalog, image_cache, lazy_models, metadata_store, model_registry, model_store, precomputed, rec_cache, title_search
+import threading
 import time
 
+FINAL_PATH = 'data/traitees/final.json.gz'
+NAMES_PATH = 'data/asin_title.json.gz'
+SNAPSHOT_DIR = 'data/snapshots'
+META_PATH = 'data/meta_All_Beauty[1].jsonl'
+PRECOMPUTED_DIR = 'data/precomputed'
+IMAGE_CACHE_DIR = 'data/image_cache'
+# Catalogue partagé par catégorie (python -m serving.catalog)
+CATALOG_DIR = 'data/catalog'
+# Modèles partagés entre les processus Streamlit (fichiers mappés en mémoire)
+MODEL_STORE_DIR = 'data/model_store'
+# Clusters de quasi-doublons (python -m data_processing.near_duplicates)
+CLUSTERS_PATH = 'data/processed/clusters.json.gz'
+# Similarité sur embeddings quantifiés int8 de cette dimension (None : TF-IDF exact)
+CONTENT_EMBEDDING_DIM = None
+# Table des voisins calculée par data_processing.spark_similarity
+CONTENT_NEIGHBOURS = 'data/spark/content_neighbours'
+# Fichiers dont le modèle basé contenu est construit
+CONTENT_SOURCES = [FINAL_PATH, CLUSTERS_PATH, CONTENT_NEIGHBOURS]
+# Recommandations basées contenu classées par requête (la page en affiche 10)
+CONTENT_TOP_N = 10
+
 # Configuration de la page
 st.set_page_config(
     page_title="Système de Recommandation",
@@ -156,46 +183,10 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True) 
 
-# Fonction de chargement des métadonnées avec images
-@st.cache_data(show_spinner=False)
-def load_metadata():
-    """Charge les métadonnées des produits incluant les images"""
+def load_metadata(loader):
+    """Métadonnées depuis le chargeur paresseux ({} si indisponibles)"""
     try:
-        metadata = {}
-        with open('data/meta_All_Beauty[1].jsonl', 'r', encoding='utf-8') as file:
-            for line in file:
-                try:
-                    data = json.loads(line.strip())
-                    # Extraire les informations importantes
-                    asin = data.get('parent_asin', '')
-                    if not asin:
-                        continue
-                    
-                    # Extraire la meilleure image disponible
-                    image_url = None
-                    if data.get('images'):
-                        for img in data['images']:
-                            if img.get('variant') == 'MAIN':
-                                image_url = img.get('large') or img.get('thumb')
-                                break
-                        if not image_url and data['images']:
-                            # Prendre la première image si pas d'image principale
-                            image_url = data['images'][0].get('large') or data['images'][0].get('thumb')
-                    
-                    metadata[asin] = {
-                        'title': data.get('title', ''),
-                        'image_url': image_url,
-                        'average_rating': data.get('average_rating', 0),
-                        'rating_number': data.get('rating_number', 0),
-                        'price': data.get('price', None),
-                        'store': data.get('store', ''),
-                        'main_category': data.get('main_category', ''),
-                        'features': data.get('features', [])
-                    }
-                except json.JSONDecodeError:
-                    continue
-        
-        return metadata
+        return loader.get('metadata')
     except FileNotFoundError:
         st.warning("⚠️ Fichier de métadonnées non trouvé. Les images ne seront pas affichées.")
         return {}
@@ -203,37 +194,276 @@ def load_metadata():
         st.error(f"❌ Erreur lors du chargement des métadonnées: {str(e)}")
         return {}
 
-# Fonction de chargement des données avec cache
-@st.cache_data(show_spinner=False)
+def load_clusters():
+    """asin -> représentant de son cluster de quasi-doublons, None sans l'étape"""
+    return near_duplicates.load_clusters(CLUSTERS_PATH) if os.path.exists(CLUSTERS_PATH) else None
+
+def build_content_model():
+    # Index de similarité sur les représentants des clusters de quasi-doublons
+    clusters = load_clusters()
+    df = content_based_filter.cbf_data(FINAL_PATH)
+    if clusters is not None:
+        df = content_based_filter.representatives(df, clusters)
+    idx = content_based_filter.indices(df, clusters)
+    if os.path.isdir(CONTENT_NEIGHBOURS):
+        cosim = content_based_filter.load_neighbours(CONTENT_NEIGHBOURS, df)
+    elif CONTENT_EMBEDDING_DIM:
+        cosim = content_based_filter.cosine_sim_quantized(df['description'], CONTENT_EMBEDDING_DIM)
+    else:
+        cosim = content_based_filter.cosine_sim(df['description'])
+    return df, idx, cosim
+
+def content_from_store(artifact):
+    return content_based_filter.model_from_arrays(artifact.values)
+
+def publish_if_changed(store, name, sources, build):
+    """Publie build() dans le magasin partagé quand la version courante n'a pas été
+    construite depuis les fichiers sources actuels (ou qu'il n'y en a pas)"""
+    key = json.loads(json.dumps(lazy_models.source_key(sources)))
+    meta = store.current_meta(name)
+    if meta is None or meta.get('sources') != key:
+        store.publish(name, build(), meta={'sources': key})
+
+def shared_content_model(store):
+    """Modèle basé contenu publié dans le magasin partagé (reconstruit quand ses fichiers
+    changent) ; chaque processus s'attache à la version courante sans copie"""
+    publish_if_changed(store, 'content', CONTENT_SOURCES,
+                       lambda: content_based_filter.model_arrays(*build_content_model()))
+    return store.get('content', content_from_store)
+
+def shared_user_profiles(store):
+    """Profils des utilisateurs publiés dans le magasin partagé (reconstruits quand les avis changent)"""
+    publish_if_changed(store, 'user_profiles', [FINAL_PATH], lambda: user_profiles.build(FINAL_PATH).arrays())
+    return store.get('user_profiles', lambda artifact: user_profiles.UserProfiles.from_arrays(artifact.values))
+
+def build_svd_model():
+    return collaborative_model_based.train(
+        df_path=FINAL_PATH, 
+        sample_frac=0.5, 
+        idx='asin',
+        col='reviewerID', 
+        val='positive_prob'
+    )
+
+def build_popularity():
+    recs = popularity_filter.recommend(
+        df_path=FINAL_PATH,
+        rev_count=25, rating=3, sentiment=0.6
+    )
+    clusters = load_clusters()
+    return recs if clusters is None else content_based_filter.collapse(recs, clusters)
+
+def build_title_index(name_df):
+    return title_search.TitleIndex(name_df['title'].tolist(), name_df['asin'].tolist())
+
+# Chargement paresseux : les modèles sont chargés (ou reconstruits) un par un en
+# arrière-plan, depuis un snapshot s'il existe. Partagé entre toutes les sessions.
+@st.cache_resource(show_spinner=False)
 def load_data():
-    with st.spinner("🔄 Chargement des données..."):
-        try:
-            name_df = pd.read_json('data/asin_title.json.gz')
-            final_df = pd.read_json('data/traitees/final.json.gz')
-            df = content_based_filter.cbf_data('data/traitees/final.json.gz')
-            idx = content_based_filter.indices(df)
-            cosim = content_based_filter.cosine_sim(df['description'])
-            svd_model = collaborative_model_based.train(
-                df_path='data/traitees/final.json.gz', 
-                sample_frac=0.5, 
-                idx='asin',
-                col='reviewerID', 
-                val='positive_prob'
-            )
-            metadata = load_metadata()
-            return name_df, final_df, df, idx, cosim, svd_model, metadata
-        except Exception as e:
-            st.error(f"❌ Erreur lors du chargement des données: {str(e)}")
-            return None, None, None, None, None, None, {}
+    loader = lazy_models.ModelLoader(snapshot_dir=SNAPSHOT_DIR)
+    store = model_store.ModelStore(MODEL_STORE_DIR)
+    loader.register('model_store', lambda: store)
+    # sources : fichiers dont le modèle est construit ; il est reconstruit (et son
+    # snapshot réécrit) quand l'un d'eux change
+    loader.register('names', lambda: pd.read_json(NAMES_PATH), sources=[NAMES_PATH])
+    loader.register('title_index', lambda: build_title_index(loader.get('names')), snapshot=True,
+                    sources=[NAMES_PATH])
+    loader.register('metadata', lambda: metadata_store.MetadataStore(META_PATH), sources=[META_PATH])
+    loader.register('tables', lambda: precomputed.PrecomputedTables(PRECOMPUTED_DIR),
+                    sources=[os.path.join(PRECOMPUTED_DIR, 'meta.json')])
+    if os.path.isdir(CATALOG_DIR):
+        loader.register('catalog', lambda: catalog.Catalog(CATALOG_DIR))
+    loader.register('clusters', load_clusters, sources=[CLUSTERS_PATH])
+    loader.register('n_reviews', lambda: len(read_table(FINAL_PATH, columns=['asin'])), snapshot=True,
+                    sources=[FINAL_PATH])
+    loader.register('popularity', build_popularity, snapshot=True, sources=[FINAL_PATH, CLUSTERS_PATH])
+    loader.register('content', lambda: shared_content_model(store), sources=CONTENT_SOURCES)
+    loader.register('svd', build_svd_model, snapshot=True, sources=[FINAL_PATH])
+    loader.register('user_profiles', lambda: shared_user_profiles(store), sources=[FINAL_PATH])
+    # File d'attente dans l'ordre d'enregistrement, les moins coûteux d'abord pour que
+    # la page soit utilisable au plus tôt ; les profils utilisateurs (TF-IDF de tous
+    # les avis) et les modèles servis par des tables précalculées à jour ne sont
+    # chargés qu'à la première demande
+    on_demand = {'user_profiles'}
+    tables = precomputed.fresh_models(PRECOMPUTED_DIR)
+    on_demand.update(name for name, table in (('content', 'content'), ('svd', 'collaborative')) if table in tables)
+    return loader.start([name for name in loader.models if name not in on_demand])
+
+def content_recommend(loader, asin, lim=5, min_rate=2, top_n=CONTENT_TOP_N):
+    loader.get('content')
+    # version courante : une republication est prise en compte sans redémarrage
+    df, idx, cosim = loader.get('model_store').get('content', content_from_store)
+    return content_based_filter.recommend(
+        prod_asin=asin, cosine_sim=cosim, indices=idx,
+        cbf_df=df, lim=lim, min_rate=min_rate, clusters=loader.get('clusters'), top_n=top_n
+    )
+
+def popularity_recommend(loader, asin):
+    return list(loader.get('popularity'))
+
+def collaborative_recommend(loader, asin, corr_thresh=0.5):
+    return collaborative_model_based.recommend(
+        product=asin, model=loader.get('svd'), corr_thresh=corr_thresh
+    )
+
+def hybrid_recommend(loader, asin, corr_thresh=0.5, lim=5, min_rate=2):
+    recs = collaborative_recommend(loader, asin, corr_thresh)
+    if len(recs) < 5:
+        recs.extend(content_recommend(loader, asin, lim, min_rate))
+    if len(recs) < 5:
+        recs.extend(popularity_recommend(loader, asin))
+    return recs
+
+# modèle de l'application -> table précalculée (python -m serving.precomputed)
+PRECOMPUTED_TABLES = {
+    "Basé contenu": 'content',
+    "Popularité": 'popularity',
+    "Collaboratif": 'collaborative'
+}
+
+def precomputed_recommend(loader, model_choice, asin):
+    """Recommandations lues dans les tables précalculées (le shard du produit
+    quand le catalogue est partagé par catégorie), None si indisponibles"""
+    table = PRECOMPUTED_TABLES.get(model_choice)
+    recs = None
+    if 'catalog' in loader.models and loader['catalog'].ready and loader['catalog'].error is None and table:
+        recs = loader.get('catalog').lookup(table, asin)
+    tables = loader['tables']
+    if recs is None and tables.ready and tables.error is None and table in tables.get():
+        recs = tables.get().lookup(table, asin)
+    return collapse_duplicates(loader, table, asin, recs)
+
+def collapse_duplicates(loader, table, asin, recs):
+    """Un produit par cluster de quasi-doublons, comme les modèles en direct (sans effet
+    sur des tables déjà construites avec les clusters)"""
+    if recs is None or table not in ('content', 'popularity') or not loader['clusters'].ready:
+        return recs
+    clusters = loader['clusters'].get() if loader['clusters'].error is None else None
+    if clusters is None:
+        return recs
+    return content_based_filter.collapse(recs, clusters, query=asin if table == 'content' else None)
+
+# modèle -> (fonction, paramètres, artefacts utilisés)
+RECOMMENDERS = {
+    "Basé contenu": (content_recommend, {'lim': 5, 'min_rate': 2}, ['content']),
+    "Popularité": (popularity_recommend, {}, ['popularity']),
+    "Collaboratif": (collaborative_recommend, {'corr_thresh': 0.5}, ['svd']),
+    "Hybride": (hybrid_recommend, {'corr_thresh': 0.5, 'lim': 5, 'min_rate': 2},
+                ['svd', 'content', 'popularity'])
+}
+
+def artifact_version(loader, name):
+    """Version d'un artefact : (mtime, taille) des fichiers dont il est construit, qui
+    change quand le pipeline les réécrit (le modèle est alors rechargé par refresh)"""
+    return loader[name].version
+
+def recommender_version(loader, model_choice):
+    """Artefacts du modèle chargés, et leurs versions"""
+    artifacts = RECOMMENDERS[model_choice][2]
+    for name in artifacts:
+        loader.get(name)
+    return tuple(artifact_version(loader, name) for name in artifacts)
 
-def display_product_card(row, metadata, index):
-    """Affiche une carte produit avec image et informations"""
+def get_recommendations(loader, cache, model_choice, asin):
+    """Recommandations précalculées, sinon depuis le cache partagé, calculées au premier appel"""
+    with span('app.recommend', model=model_choice) as s:
+        recs = precomputed_recommend(loader, model_choice, asin)
+        if recs is not None:
+            s.set(source='precomputed', results=len(recs))
+            return recs
+        recommend, params, _ = RECOMMENDERS[model_choice]
+        # la version change quand un artefact est reconstruit ou republié : les anciens
+        # résultats du modèle sont retirés du cache
+        version = recommender_version(loader, model_choice)
+        cache.set_version(model_choice, version)
+        recs = cache.get_or_compute(
+            model_choice, asin, lambda a, **kw: recommend(loader, a, **kw), params, version
+        )
+        s.set(source='cache', results=len(recs))
+        return recs
+
+def prewarm_hot_items(loader, cache, model_choice="Basé contenu", n=50):
+    """Précalcule les recommandations des produits les plus populaires absents des
+    tables précalculées, sans compter dans les statistiques du cache"""
+    try:
+        loader['tables'].get()  # attend les tables pour ne pas charger le modèle inutilement
+    except Exception:
+        pass
+    try:
+        recommend, params, _ = RECOMMENDERS[model_choice]
+        hot = [asin for asin in list(loader.get('popularity'))[:n]
+               if precomputed_recommend(loader, model_choice, asin) is None]
+        if not hot:
+            return
+        version = recommender_version(loader, model_choice)
+        cache.set_version(model_choice, version)
+        cache.prewarm(model_choice, hot, lambda a, **kw: recommend(loader, a, **kw),
+                      params, version, background=False)
+    except Exception:
+        pass
+
+# Cache des recommandations partagé entre toutes les sessions
+@st.cache_resource(show_spinner=False)
+def get_rec_cache(_loader):
+    cache = rec_cache.RecommendationCache(maxsize=5000, ttl=3600)
+    threading.Thread(target=prewarm_hot_items, args=(_loader, cache), daemon=True).start()
+    return cache
+
+# Vignettes des produits, téléchargées en parallèle et gardées sur disque
+@st.cache_resource(show_spinner=False)
+def get_image_cache():
+    return image_cache.ImageCache(IMAGE_CACHE_DIR, max_workers=10)
+
+def count_products(loader, name_df):
+    """Nombre de produits : somme des shards du catalogue, sinon la table des titres"""
+    if 'catalog' in loader.models and loader['catalog'].ready and loader['catalog'].error is None:
+        return len(loader.get('catalog'))
+    return name_df['asin'].nunique()
+
+def display_user_recommendations(loader, name_df, top_n=5):
+    """Recommandations personnalisées à partir de l'historique d'un reviewerID"""
+    with st.expander("👤 Recommandations personnalisées"):
+        user = st.text_input("Identifiant utilisateur (reviewerID)").strip()
+        if not user:
+            return
+        profiles = loader['user_profiles'].start()
+        if not profiles.ready:
+            st.info("⏳ Profils utilisateurs en cours de chargement…")
+            return
+        if profiles.error is not None:
+            st.error(f"❌ Profils utilisateurs indisponibles: {profiles.error}")
+            return
+        recs = profiles.get().recommend(user, top_n)
+        if not recs:
+            st.warning("⚠️ Utilisateur inconnu ou sans recommandation.")
+            return
+        titles = name_df.drop_duplicates('asin').set_index('asin')['title']
+        for asin in recs:
+            st.markdown(f"- {titles.get(asin, asin)}")
+
+def display_startup_report(loader):
+    """Affiche l'état et le temps de chargement de chaque modèle"""
+    with st.expander("⏱️ Chargement des modèles"):
+        st.progress(loader.progress())
+        st.dataframe(pd.DataFrame(loader.report()), use_container_width=True, hide_index=True)
+        st.caption("Cache des recommandations")
+        st.json(get_rec_cache(loader).stats())
+        if model_registry.REGISTRY.report():
+            st.caption("Artefacts du registre (version, temps de chargement, taille)")
+            st.dataframe(pd.DataFrame(model_registry.REGISTRY.report()), use_container_width=True, hide_index=True)
+        if st.checkbox("Mémoire des modèles (Mo)"):
+            st.dataframe(pd.DataFrame(loader.memory_report()), use_container_width=True, hide_index=True)
+
+def display_product_card(row, metadata, index, images=None):
+    """Affiche une carte produit avec image et informations
+    images : url -> vignette préchargée (None si le téléchargement a échoué)"""
     asin = row['asin']
     title = row.get('title', 'Titre non disponible')
     
     # Récupérer les métadonnées
     meta_info = metadata.get(asin, {})
     image_url = meta_info.get('image_url')
+    image = (images or {}).get(image_url, image_url)
     rating = meta_info.get('average_rating', 0)
     rating_count = meta_info.get('rating_number', 0)
     price = meta_info.get('price')
@@ -245,9 +475,9 @@ def display_product_card(row, metadata, index):
     col1, col2 = st.columns([1, 3])
     
     with col1:
-        if image_url:
+        if image:
             try:
-                st.image(image_url, width=120, caption="")
+                st.image(image, width=120, caption="")
             except:
                 st.markdown("""
                 <div class="no-image-placeholder">
@@ -289,11 +519,18 @@ def main():
     
     # Chargement des données
     data_load_state = st.text('🔄 Chargement des données...')
-    name_df, final_df, df, idx, cosim, svd_model, metadata = load_data()
-    
-    if name_df is None:
+    loader = load_data()
+    # modèles dont les fichiers ont été reconstruits depuis leur chargement
+    loader.refresh()
+    try:
+        # Seule la liste des produits est attendue avant l'affichage de la page
+        name_df = loader.get('names')
+        title_index = loader.get('title_index')
+    except Exception as e:
+        st.error(f"❌ Erreur lors du chargement des données: {str(e)}")
         st.error("❌ Impossible de charger les données. Vérifiez vos fichiers.")
         return
+    metadata = load_metadata(loader) if loader['metadata'].ready else {}
     
     data_load_state.text('✅ Données chargées avec succès!')
     time.sleep(0.5)
@@ -321,9 +558,13 @@ def main():
         st.markdown("### 📊 Statistiques")
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Produits", "3,917")  # Valeur fixe
+            st.metric("Produits", f"{count_products(loader, name_df):,}")
         with col2:
-            st.metric("Données", f"{len(final_df):,}")
+            n_reviews = loader['n_reviews']
+            st.metric("Données", f"{n_reviews.get():,}" if n_reviews.ready and n_reviews.error is None else "…")
+        
+        display_user_recommendations(loader, name_df)
+        display_startup_report(loader)
     
     # Interface principale
     col1, col2 = st.columns([2, 1])
@@ -375,18 +616,13 @@ def main():
             help="Commencez à taper pour filtrer les produits"
         )
         
-        # Filtrer les produits selon la recherche
-        filtered_products = name_df['title'].dropna().unique()
-        if search_term:
-            filtered_products = [p for p in filtered_products if search_term.lower() in p.lower()]
+        # Filtrer les produits selon la recherche (100 meilleurs résultats)
+        filtered_products = title_index.search(search_term, k=100)
         
         if len(filtered_products) == 0:
             st.warning("⚠️ Aucun produit trouvé avec ce terme de recherche.")
             return
         
-        # Limiter à 100 résultats pour la performance
-        filtered_products = filtered_products[:100]
-        
         product_title = st.selectbox(
             "Produit:",
             options=filtered_products,
@@ -416,15 +652,14 @@ def main():
         if product_title:
             st.markdown("### 📦 Produit choisi")
             # Afficher l'image du produit sélectionné si disponible
-            product_row = name_df[name_df['title'] == product_title]
-            if not product_row.empty:
-                product_asin = product_row['asin'].values[0]
+            product_asin = title_index.asin(product_title)
+            if product_asin:
                 meta_info = metadata.get(product_asin, {})
-                image_url = meta_info.get('image_url')
+                image = get_image_cache().get(meta_info.get('image_url'))
                 
-                if image_url:
+                if image:
                     try:
-                        st.image(image_url, width=150, caption="Produit sélectionné")
+                        st.image(image, width=150, caption="Produit sélectionné")
                     except:
                         st.info(f"**{product_title[:100]}**{'...' if len(product_title) > 100 else ''}")
                 else:
@@ -449,8 +684,7 @@ def main():
             return
         
         # Trouver l'ASIN correspondant
-        product_row = name_df[name_df['title'] == product_title]
-        product_asin = product_row['asin'].values[0] if not product_row.empty else None
+        product_asin = title_index.asin(product_title)
         
         if not product_asin:
             st.error("❌ Produit non trouvé dans la base de données.")
@@ -464,35 +698,9 @@ def main():
             status_text.text(f"🔄 Génération des recommandations avec le modèle {model_choice}...")
             progress_bar.progress(25)
             
-            if model_choice == "Basé contenu":
-                recs = content_based_filter.recommend(
-                    prod_asin=product_asin, cosine_sim=cosim, indices=idx,
-                    cbf_df=df, lim=5, min_rate=2
-                )
-            elif model_choice == "Popularité":
-                recs = popularity_filter.recommend(
-                    df_path='data/traitees/final.json.gz',
-                    rev_count=25, rating=3, sentiment=0.6
-                )
-            elif model_choice == "Collaboratif":
-                recs = collaborative_model_based.recommend(
-                    product=product_asin, model=svd_model, corr_thresh=0.5
-                )
-            else:  # Hybride
-                recs = collaborative_model_based.recommend(
-                    product=product_asin, model=svd_model, corr_thresh=0.5
-                )
-                if len(recs) < 5:
-                    recs.extend(content_based_filter.recommend(
-                        prod_asin=product_asin, cosine_sim=cosim, indices=idx,
-                        cbf_df=df, lim=5, min_rate=2
-                    ))
-                if len(recs) < 5:
-                    recs.extend(popularity_filter.recommend(
-                        df_path='data/traitees/final.json.gz',
-                        rev_count=25, rating=3, sentiment=0.6
-                    ))
+            recs = get_recommendations(loader, get_rec_cache(loader), model_choice, product_asin)
             
+            metadata = load_metadata(loader)
             progress_bar.progress(75)
             status_text.text("📊 Traitement des résultats...")
             
@@ -535,10 +743,13 @@ def main():
                 if model_choice == "Basé contenu":
                     st.success("✨ **Recommandations basées sur le contenu** : Ces produits ont été sélectionnés en analysant leurs descriptions et caractéristiques similaires au produit choisi.")
                 
-                # Affichage en cartes avec images
+                # Affichage en cartes avec images (toutes les vignettes chargées en parallèle)
+                images = get_image_cache().prefetch(
+                    metadata.get(asin, {}).get('image_url') for asin in recs_df['asin']
+                )
                 for i, (_, row) in enumerate(recs_df.iterrows()):
                     with st.container():
-                        display_product_card(row, metadata, i)
+                        display_product_card(row, metadata, i, images)
                 
                 # Tableau détaillé
                 with st.expander("📊 Vue tableau détaillée"):
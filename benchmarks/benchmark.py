@@ -0,0 +1,261 @@
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB, None when unavailable."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024  # bytes on macOS, KB on Linux
+
+
+def latency_stats(latencies):
+    """p50/p95/p99/mean latency in ms and queries per second of a list of seconds."""
+    lat = np.asarray(latencies) * 1000
+    total = lat.sum() / 1000
+    return {'n': len(lat),
+            'p50_ms': float(np.percentile(lat, 50)),
+            'p95_ms': float(np.percentile(lat, 95)),
+            'p99_ms': float(np.percentile(lat, 99)),
+            'mean_ms': float(lat.mean()),
+            'qps': float(len(lat) / total) if total > 0 else None}
+
+
+def measure_latency(fn, queries, warmup=3):
+    """Call fn(query) for every query (after warmup calls) and return latency_stats."""
+    for q in queries[:warmup]:
+        fn(q)
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - start)
+    return latency_stats(latencies)
+
+
+def _stage_child(fn, args, kwargs, queue):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    queue.put({'wall_s': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()})
+
+
+def measure_stage(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) in a fresh process and return its wall time and peak RSS,
+    so stages do not share (or inherit) each other's memory high-water mark.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_stage_child, args=(fn, args, kwargs, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        return {'error': f'exit code {proc.exitcode}'}
+    return queue.get()
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+# --- Recommenders ---
+def bench_recommenders(df_path='data/traitees/final.json.gz', n_queries=200, seed=42, collaborative=True):
+    from recommendation_filters import content_based_filter, popularity_filter
+
+    results = []
+    df = content_based_filter.cbf_data(df_path)
+    idx = content_based_filter.indices(df)
+    cosim = content_based_filter.cosine_sim(df['description'])
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(df['asin'].to_numpy(), size=min(n_queries, len(df)), replace=False).tolist()
+    n_items = len(df)
+
+    def content(asin):
+        return content_based_filter.recommend(asin, cosim, idx, df, lim=5, min_rate=2)
+
+    def popularity(asin):
+        return popularity_filter.recommend(df_path, rev_count=25, rating=3, sentiment=0.6)
+
+    results.append(dict(bench='recommend', model='content', n_items=n_items, **measure_latency(content, queries)))
+    # popularity re-reads the dataset on every call, a few queries are enough
+    results.append(dict(bench='recommend', model='popularity', n_items=n_items,
+                        **measure_latency(popularity, queries[:10], warmup=1)))
+
+    if collaborative:
+        from models import collaborative_model_based
+        svd_model = collaborative_model_based.train(
+            df_path=df_path, sample_frac=1.0, idx='asin', col='reviewerID', val='positive_prob')
+
+        def collab(asin):
+            try:
+                return collaborative_model_based.recommend(asin, svd_model, 0.5)
+            except Exception:
+                return []
+
+        popular = popularity(None)
+
+        def hybrid(asin):  # same composition as the app
+            recs = list(collab(asin))
+            if len(recs) < 5:
+                recs.extend(content(asin))
+            if len(recs) < 5:
+                recs.extend(popular)
+            return recs
+
+        results.append(dict(bench='recommend', model='collaborative', n_items=n_items, **measure_latency(collab, queries)))
+        results.append(dict(bench='recommend', model='hybrid', n_items=n_items, **measure_latency(hybrid, queries)))
+    return results
+
+
+# --- Pipeline stages ---
+def head_json(src_path, dest_path, n_rows):
+    """Write the first n_rows records of a (gzip) json dataset to dest_path."""
+    df = pd.read_json(src_path)
+    df.head(n_rows).reset_index(drop=True).to_json(dest_path, compression='gzip')
+    return min(n_rows, len(df))
+
+
+def bench_pipeline(rev_path=None, meta_path=None, sizes=(1000, 10000, 100000), work_dir=None, features=True):
+    """
+    Wall time and peak RSS of reviews_clean, meta_clean, all_feature and final_data
+    on the first `size` reviews / meta records of the inputs, for each size.
+    Without inputs, synthetic reviews (and size / 10 products) are generated per size.
+    """
+    from data_processing import data_cleaning, data_merge, feature_genration, synthetic_data
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix='bench_')
+    results = []
+    for size in sizes:
+        p = lambda name: os.path.join(work_dir, f'{name}_{size}.json.gz')
+        if rev_path is None:
+            n_rev = synthetic_data.generate_reviews(p('raw_reviews'), size)
+            n_meta = synthetic_data.generate_meta(p('raw_meta'), max(10, size // 10))
+        else:
+            n_rev = head_json(rev_path, p('raw_reviews'), size)
+            n_meta = head_json(meta_path, p('raw_meta'), size)
+        stages = [('reviews_clean', data_cleaning.reviews_clean, (p('raw_reviews'), p('clean_reviews')), {}, n_rev),
+                  ('meta_clean', data_cleaning.meta_clean, (p('raw_meta'), p('clean_meta')), {}, n_meta)]
+        if features:
+            stages.append(('all_feature', feature_genration.all_feature, (p('clean_reviews'), p('feat_reviews')), {}, n_rev))
+            stages.append(('final_data', data_merge.final_data, (p('final'),),
+                           {'review_path': p('feat_reviews'), 'meta_path': p('clean_meta')}, n_rev))
+        for name, fn, args, kwargs, rows in stages:
+            results.append(dict(bench='stage', stage=name, rows=rows, **measure_stage(fn, *args, **kwargs)))
+    return results
+
+
+# --- Product page extraction ---
+def bench_extraction(fixtures_dir=None, n_pages=200, processes=(1, None)):
+    """
+    Pages/s of the BeautifulSoup parser and of the compiled extraction spec on saved
+    product pages ('<asin>.html' in fixtures_dir, generated when missing), the
+    compiled one on 1 and cpu_count() (None) processes, with pages/s per core and
+    per field failure counts.
+    """
+    from amazon_product_scraper import parse_product_page
+    from data_processing import synthetic_data
+    from scraping import extraction
+
+    if fixtures_dir is None or not os.path.isdir(fixtures_dir):
+        fixtures_dir = fixtures_dir or tempfile.mkdtemp(prefix='pages_')
+        synthetic_data.generate_product_pages(fixtures_dir, n_pages)
+    pages = []
+    for name in sorted(os.listdir(fixtures_dir))[:n_pages]:
+        if name.endswith('.html'):
+            with open(os.path.join(fixtures_dir, name), encoding='utf-8') as f:
+                pages.append((f.read(), f'https://www.amazon.fr/dp/{name[:-5]}'))
+    mb = sum(len(html) for html, _ in pages) / 1024 ** 2
+
+    results = []
+    start = time.perf_counter()
+    for html, url in pages:
+        parse_product_page(html, url)
+    wall = time.perf_counter() - start
+    results.append({'bench': 'extraction', 'model': 'beautifulsoup', 'rows': len(pages), 'processes': 1,
+                    'wall_s': wall, 'pages_per_s': len(pages) / wall, 'pages_per_s_core': len(pages) / wall,
+                    'mb_per_s': mb / wall})
+    for n in processes:
+        n = n or os.cpu_count()
+        start = time.perf_counter()
+        _, stats = extraction.extract_many(pages, processes=n)
+        wall = time.perf_counter() - start
+        results.append({'bench': 'extraction', 'model': 'compiled', 'rows': len(pages), 'processes': n,
+                        'wall_s': wall, 'pages_per_s': len(pages) / wall, 'pages_per_s_core': len(pages) / wall / n,
+                        'mb_per_s': mb / wall, 'fields': stats.report()['fields']})
+    return results
+
+
+def run(out_path=None, df_path='data/traitees/final.json.gz', rev_path='data/raw/All_Beauty_25.json.gz',
+        meta_path='data/raw/meta_All_Beauty_25.json.gz', sizes=(1000, 10000, 100000)):
+    """
+    Run every benchmark and write {'environment', 'results'} as JSON to out_path.
+    rev_path=None benchmarks the pipeline on synthetic data (data_processing.synthetic_data).
+    """
+    report = {'environment': environment(), 'results': []}
+    report['results'] += bench_recommenders(df_path)
+    report['results'] += bench_pipeline(rev_path, meta_path, sizes)
+    report['results'] += bench_extraction()
+    out_path = out_path or os.path.join('benchmarks', 'results', f"{report['environment']['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report saved to '{out_path}'")
+    return report
+
+
+def _key(result):
+    return tuple(result.get(k) for k in ('bench', 'model', 'stage', 'rows', 'n_items', 'processes'))
+
+
+def compare(old_path, new_path, metrics=('p95_ms', 'wall_s', 'peak_rss_mb'), threshold=0.10):
+    """
+    Results of new_path worse than old_path by more than threshold (relative),
+    as a list of dicts (benchmark key, metric, old, new, change).
+    """
+    with open(old_path) as f:
+        old = {_key(r): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+    regressions = []
+    for result in new:
+        before = old.get(_key(result))
+        if before is None:
+            continue
+        for metric in metrics:
+            a, b = before.get(metric), result.get(metric)
+            if a and b and (b - a) / a > threshold:
+                regressions.append({'key': _key(result), 'metric': metric, 'old': a, 'new': b,
+                                    'change': round((b - a) / a, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == 'compare':
+        found = compare(sys.argv[2], sys.argv[3])
+        for r in found:
+            print(r)
+        sys.exit(1 if found else 0)
+    run()
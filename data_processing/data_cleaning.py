@@ -1,4 +1,5 @@
 from data_processing.text_processing import text_clean, rem_stopwords, stem_text
+from monitoring.instrumentation import span
 import pandas as pd
 import numpy as np
 
@@ -10,7 +11,9 @@ def reviews_clean(src_path, dest_path):
     src_path : path for dataset
     dest_path : path where cleaned data will be stored
     """
-    df = pd.read_json(src_path)
+    with span('reviews_clean.read') as s:
+        df = pd.read_json(src_path)
+        s.set(rows=len(df))
     features_not_req = ['reviewTime', 'style', 'image']
     df.drop(features_not_req, axis=1, inplace=True)
     
@@ -23,11 +26,13 @@ def reviews_clean(src_path, dest_path):
     
     # Nettoyage texte : nettoyage, suppression des stopwords, stemming
     for col in ['reviewText', 'summary']:
-        df[col] = df[col].apply(text_clean)
-        df[col] = df[col].apply(rem_stopwords)
-        df[col] = df[col].apply(stem_text)
+        with span('reviews_clean.text', column=col, rows=len(df)):
+            df[col] = df[col].apply(text_clean)
+            df[col] = df[col].apply(rem_stopwords)
+            df[col] = df[col].apply(stem_text)
     
-    df.to_json(dest_path, compression='gzip')
+    with span('reviews_clean.write', rows=len(df)):
+        df.to_json(dest_path, compression='gzip')
     return df
 
 
@@ -38,11 +43,27 @@ def meta_clean(src_path, dest_path):
     src_path : path for dataset
     dest_path : path where cleaned data will be stored.
     """
-    df = pd.read_json(src_path)
-    features_not_req = ['category', 'tech1', 'fit', 'tech2', 'feature', 'date',
-                        'image', 'main_cat', 'also_buy', 'rank', 'also_view',
+    with span('meta_clean.read') as s:
+        df = pd.read_json(src_path)
+        s.set(rows=len(df))
+    df = clean_meta_frame(df)
+
+    with span('meta_clean.write', rows=len(df)):
+        df.to_json(dest_path, compression='gzip')
+    return df
+
+
+def clean_meta_frame(df, price_fill=None):
+    """
+    Cleaning steps of meta_clean on an already loaded raw meta DataFrame.
+    price_fill : value of missing prices, the mean price of df by default
+    (pass the catalog mean when cleaning a few updated records).
+    """
+    features_not_req = ['tech1', 'fit', 'tech2', 'feature', 'date',
+                        'image', 'also_buy', 'rank', 'also_view',
                         'similar_item', 'details']
     # Suppression des colonnes non pertinentes ou très peu renseignées
+    # (main_cat et category sont gardées : elles définissent les shards du catalogue)
     df.drop(features_not_req, axis=1, inplace=True)
 
     apply_func = lambda x: np.nan if (isinstance(x, list) and len(x) == 0) else (np.nan if x == '' else x)
@@ -61,20 +82,24 @@ def meta_clean(src_path, dest_path):
 
     df.dropna(subset=['title'], inplace=True)  # suppression des lignes sans titre
 
-    df['description'].fillna(df['title'], inplace=True)  # imputation des descriptions manquantes par le titre
+    df['description'] = df['description'].fillna(df['title'])  # imputation des descriptions manquantes par le titre
 
-    df['brand'].fillna("", inplace=True)  # imputation des marques manquantes par une chaîne vide
+    df['brand'] = df['brand'].fillna("")  # imputation des marques manquantes par une chaîne vide
+
+    # Catégories : chemin 'a > b > c' si liste, chaîne vide si absente
+    df['category'] = df['category'].apply(lambda x: ' > '.join(x) if isinstance(x, list) else x).fillna('')
+    df['main_cat'] = df['main_cat'].fillna('')
 
     # Nettoyage texte pour les colonnes textuelles
-    df['title'] = df['title'].apply(text_clean)
-    df['description'] = df['description'].apply(text_clean)
+    with span('meta_clean.text', rows=len(df)):
+        df['title'] = df['title'].apply(text_clean)
+        df['description'] = df['description'].apply(text_clean)
 
-    df['price'].fillna(df['price'].mean(), inplace=True)  # imputation des prix manquants par la moyenne
+    # imputation des prix manquants par la moyenne
+    df['price'] = df['price'].fillna(df['price'].mean() if price_fill is None else price_fill)
 
     df['price'] = df['price'].apply(lambda x: round(x, 2))  # arrondi des prix à 2 décimales
 
     df.drop_duplicates(inplace=True)
     df.reset_index(inplace=True, drop=True)
-
-    df.to_json(dest_path, compression='gzip')
     return df
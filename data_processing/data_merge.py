@@ -1,4 +1,10 @@
-import pandas as pd
+from data_processing.tables import MEMORY_BUDGET, compact_frame, read_table
+from monitoring.instrumentation import span
+
+FEATURES = ['asin', 'reviewerID', 'description', 'title', 'price', 'overall', 'review_count', 'reviewText_senti', 'positive_prob', 'main_cat']
+# only the columns used by the merge are kept from each input (not the review texts)
+REVIEW_COLUMNS = ['asin', 'reviewerID', 'verified', 'overall', 'review_count', 'reviewText_senti', 'positive_prob']
+META_COLUMNS = ['asin', 'description', 'title', 'price', 'main_cat']
 
 
 def final_data(dest_path, review_path=None, meta_path=None,
@@ -8,16 +14,19 @@ def final_data(dest_path, review_path=None, meta_path=None,
     # reviews_clean(review_path, temp_rev)
     # meta_clean(meta_path, temp_meta)
     if review_path is None and meta_path is None:
-        df_review = pd.read_json(temp_rev)
-        df_meta = pd.read_json(temp_meta)
-    else:
-        df_review = pd.read_json(review_path)
-        df_meta = pd.read_json(meta_path)
+        review_path, meta_path = temp_rev, temp_meta
+    df_review = read_table(review_path, columns=REVIEW_COLUMNS)
+    df_meta = read_table(meta_path, columns=META_COLUMNS)
 
-    one_df = df_review.merge(df_meta, on='asin')
+    with span('final_data.merge', review_rows=len(df_review), meta_rows=len(df_meta)) as s:
+        one_df = df_review.merge(df_meta, on='asin')
+        s.set(rows=len(one_df))
+    del df_review, df_meta
     one_df = one_df[one_df['verified']]
-    features = ['asin', 'reviewerID', 'description', 'title', 'price', 'overall', 'review_count', 'reviewText_senti', 'positive_prob']
-    one_df = one_df[features]
+    one_df = one_df[FEATURES]
+    if MEMORY_BUDGET:  # the merge turns categories with different values back into objects
+        one_df = compact_frame(one_df)
     one_df.drop_duplicates(subset=['asin', 'reviewerID'], inplace=True)
-    one_df.to_json(dest_path, compression='gzip')
+    with span('final_data.write', rows=len(one_df)):
+        one_df.to_json(dest_path, compression='gzip')
     return one_df
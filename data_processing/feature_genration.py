@@ -1,6 +1,10 @@
+from data_processing.tables import MEMORY_BUDGET, compact_frame
 from data_processing.text_processing import stem_text, rem_stopwords, text_clean
+from monitoring.instrumentation import span
+from serving import model_registry
 import pandas as pd
-import pickle
+
+TEXT_COLUMNS = ['reviewText', 'summary', 'reviewerName']  # not used after the features
 
 
 def review_count(df):
@@ -8,53 +12,56 @@ def review_count(df):
 
 
 def svc_features(df_ser):
-    print('Loading models...')
-    ngram_vect = pickle.load(open('./models/pickle_files/svc/ngram_vec.pkl', 'rb'))
-    svc_model = pickle.load(open('./models/pickle_files/svc/final_Lin_SVC.pkl', 'rb'))
+    with span('svc_features.load_models'):
+        ngram_vect = model_registry.get('svc.ngram_vec')
+        svc_model = model_registry.get('svc.model')
 
-    print('Cleaning text...')
-    df_ser = df_ser.apply(text_clean)
+    with span('svc_features.clean', rows=len(df_ser)):
+        df_ser = df_ser.apply(text_clean)
 
-    print('Removing Stopwords...')
-    df_ser = df_ser.apply(rem_stopwords)
+    with span('svc_features.stopwords', rows=len(df_ser)):
+        df_ser = df_ser.apply(rem_stopwords)
 
-    print('Stemming text ...')
-    df_ser = df_ser.apply(stem_text)
+    with span('svc_features.stem', rows=len(df_ser)):
+        df_ser = df_ser.apply(stem_text)
 
-    ngram = ngram_vect.transform(df_ser)
-    svc_pred = svc_model.predict(ngram)
+    with span('svc_features.predict', rows=len(df_ser)):
+        ngram = ngram_vect.transform(df_ser)
+        svc_pred = svc_model.predict(ngram)
 
-    del ngram_vect
-    del svc_model
     return pd.DataFrame(data=svc_pred, columns=['reviewText_senti'])
 
 
 def nb_features(df_ser):
-    print('Loading models...')
-    count_vect = pickle.load(open('./models/pickle_files/nb/count_vect_file.pkl', 'rb'))
-    tfidf_vect = pickle.load(open('./models/pickle_files/nb/tfidf_vect_file.pkl', 'rb'))
-    nb_model = pickle.load(open('./models/pickle_files/nb/final_nb_file.pkl', 'rb'))
-
-    print('Cleaning text...')
-    df_ser = df_ser.apply(text_clean)
-    nb_model_prediction = nb_model.predict_proba(tfidf_vect.transform(count_vect.transform(df_ser)))
-    del count_vect
-    del tfidf_vect
-    del nb_model
+    with span('nb_features.load_models'):
+        count_vect = model_registry.get('nb.count_vect')
+        tfidf_vect = model_registry.get('nb.tfidf_vect')
+        nb_model = model_registry.get('nb.model')
+
+    with span('nb_features.clean', rows=len(df_ser)):
+        df_ser = df_ser.apply(text_clean)
+    with span('nb_features.predict', rows=len(df_ser)):
+        nb_model_prediction = nb_model.predict_proba(tfidf_vect.transform(count_vect.transform(df_ser)))
     return pd.DataFrame(nb_model_prediction, columns=['negative_prob', 'neutral_prob', 'positive_prob'])
 
 
 def all_feature(df_path='All_Beauty_clean.json.gz', dest_path='./data/processed/clean_reviews.json.gz'):
-    df = pd.read_json(df_path)
-    req_features = ['asin', 'reviewerID', 'reviewText', 'summary']
-    feat_df = df[req_features]
-    #feat_df['review_count'] = 0
-    feat_df.loc[:, 'review_count'] = df['asin'].map(dict(df.groupby('asin').count()['reviewerID']))
+    """
+    Add review_count, reviewText_senti and the nb class probabilities to the clean
+    reviews and write them to dest_path. In memory-budget mode (tables.MEMORY_BUDGET)
+    the returned frame has compact dtypes and no reviewText / summary columns.
+    """
+    with span('all_feature.read') as s:
+        df = pd.read_json(df_path)
+        s.set(rows=len(df))
+    # features are computed from the columns of df, without a copy of the texts
+    feat_df = pd.DataFrame({'review_count': review_count(df)})
     feat_df = pd.concat([feat_df, svc_features(df['reviewText'])], axis=1)
     feat_df = pd.concat([feat_df, nb_features(df['summary'])], axis=1)
-    feat_df.drop(['asin', 'reviewerID', 'reviewText', 'summary'], inplace=True, axis=1)
     final = pd.concat([df, feat_df], axis=1)
-    final.to_json(dest_path, compression='gzip')
-    del df
+    del df, feat_df
+    with span('all_feature.write', rows=len(final)):
+        final.to_json(dest_path, compression='gzip')
+    if MEMORY_BUDGET:
+        return compact_frame(final, drop=TEXT_COLUMNS)
     return final
-
@@ -0,0 +1,126 @@
+import sys
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from data_processing.tables import read_table
+from monitoring.instrumentation import span
+
+CLUSTERS_PATH = 'data/processed/clusters.json.gz'
+PRIME = 4294967291  # largest prime below 2**32: (a * x + b) % PRIME never overflows uint64
+SHINGLE_WORDS = 3
+
+
+def shingles(text, k=SHINGLE_WORDS):
+    """crc32 of the k-word shingles of a cleaned text (the whole text when shorter)."""
+    words = str(text).split()
+    grams = {' '.join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+    return np.array([zlib.crc32(g.encode('utf-8')) for g in grams], dtype=np.uint64)
+
+
+def permutations(num_perm=128, seed=1):
+    """Coefficients (a, b) of num_perm hash functions (a * x + b) % PRIME."""
+    rng = np.random.default_rng(seed)
+    return (rng.integers(1, PRIME, num_perm, dtype=np.uint64),
+            rng.integers(0, PRIME, num_perm, dtype=np.uint64))
+
+
+def signatures(texts, num_perm=128, seed=1, chunk_size=2048):
+    """
+    MinHash signatures, (len(texts), num_perm) uint32: column j is the minimum of hash
+    function j over the shingles of each text, so two rows agree on a column with
+    probability equal to the Jaccard similarity of their shingle sets.
+    """
+    a, b = permutations(num_perm, seed)
+    texts = list(texts)
+    out = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for start in range(0, len(texts), chunk_size):
+        hashes = [shingles(t) for t in texts[start:start + chunk_size]]
+        offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+        flat = np.concatenate(hashes)
+        for j in range(num_perm):
+            out[start:start + len(hashes), j] = np.minimum.reduceat((a[j] * flat + b[j]) % PRIME, offsets)
+    return out
+
+
+def lsh_params(threshold, num_perm=128):
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve threshold
+    (1 / bands) ** (1 / rows) is the closest to threshold.
+    """
+    pairs = [(num_perm // r, r) for r in range(1, num_perm + 1)]
+    return min(pairs, key=lambda p: abs((1 / p[0]) ** (1 / p[1]) - threshold))
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def clusters(sigs, threshold=0.8, bands=None, rows=None):
+    """
+    Cluster label of each row of a signature matrix (the lowest row of its cluster).
+    Rows sharing a band bucket (LSH) are compared with the first row of the bucket and
+    joined when their estimated Jaccard similarity reaches threshold; clusters are the
+    connected components of these links.
+    """
+    n, num_perm = sigs.shape
+    if bands is None or rows is None:
+        bands, rows = lsh_params(threshold, num_perm)
+    parent = np.arange(n)
+    for band in range(bands):
+        keys = np.ascontiguousarray(sigs[:, band * rows:(band + 1) * rows]).view(f'V{rows * 4}').ravel()
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = order[start:start + size]
+            leader = members[0]
+            similar = (sigs[members[1:]] == sigs[leader]).mean(axis=1) >= threshold
+            for member in members[1:][similar]:
+                ra, rb = _find(parent, leader), _find(parent, member)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+    return np.array([_find(parent, i) for i in range(n)])
+
+
+def detect(meta, threshold=0.8, num_perm=128, seed=1):
+    """
+    Near-duplicate clusters of a clean meta DataFrame (title + description), one row
+    per asin: DataFrame (asin, cluster, cluster_size) where cluster is the asin of the
+    cluster representative (its lowest asin).
+    """
+    with span('near_duplicates.detect', rows=len(meta)) as s:
+        df = meta.drop_duplicates('asin').sort_values('asin').reset_index(drop=True)
+        sigs = signatures(df['title'].fillna('') + ' ' + df['description'].fillna(''), num_perm, seed)
+        labels = clusters(sigs, threshold)
+        out = pd.DataFrame({'asin': df['asin'], 'cluster': df['asin'].to_numpy()[labels]})
+        out['cluster_size'] = out.groupby('cluster')['asin'].transform('size')
+        s.set(clusters=out['cluster'].nunique())
+    return out
+
+
+def run(meta_clean_path='data/processed/clean_meta.json.gz', dest_path=CLUSTERS_PATH, threshold=0.8, num_perm=128):
+    """Pipeline stage: write the clusters of the clean meta to dest_path and return them."""
+    table = detect(read_table(meta_clean_path, columns=['asin', 'title', 'description'], compact=False),
+                   threshold, num_perm)
+    table.to_json(dest_path, compression='gzip')
+    n_clusters = table['cluster'].nunique()
+    print(f"Quasi-doublons : {len(table)} produits, {n_clusters} clusters "
+          f"({len(table) - n_clusters} produits regroupés)")
+    return table
+
+
+def load_clusters(path=CLUSTERS_PATH):
+    """Series asin -> cluster representative asin."""
+    table = read_table(path, columns=['asin', 'cluster'])
+    return pd.Series(table['cluster'].astype(str).to_numpy(), index=table['asin'].astype(str))
+
+
+if __name__ == "__main__":
+    # python -m data_processing.near_duplicates [clean meta] [dest] [threshold]
+    run(*sys.argv[1:3], *(float(t) for t in sys.argv[3:4]))
@@ -0,0 +1,225 @@
+import gzip
+import os
+import sys
+
+import pandas as pd
+from pyspark import SparkConf
+from pyspark.sql import SparkSession, Window
+from pyspark.sql import functions as F
+from pyspark.sql import types as T
+
+from data_processing.tables import BUCKET_COLUMN, N_BUCKETS
+from monitoring.instrumentation import span
+
+REVIEW_SCHEMA = T.StructType([
+    T.StructField('overall', T.DoubleType(), True),
+    T.StructField('vote', T.StringType(), True),
+    T.StructField('verified', T.BooleanType(), True),
+    T.StructField('reviewTime', T.StringType(), True),
+    T.StructField('reviewerID', T.StringType(), True),
+    T.StructField('asin', T.StringType(), True),
+    T.StructField('reviewerName', T.StringType(), True),
+    T.StructField('reviewText', T.StringType(), True),
+    T.StructField('summary', T.StringType(), True),
+    T.StructField('unixReviewTime', T.LongType(), True),
+])  # style and image are not read, reviews_clean drops them
+
+FINAL_FEATURES = ['asin', 'reviewerID', 'description', 'title', 'price', 'overall', 'review_count',
+                  'reviewText_senti', 'positive_prob', 'main_cat']
+
+# text_processing.text_clean in Java regex syntax. Its reg_no_space default is the class
+# [.;:!'?,"()[] followed by the literal '#]' in Python (the class ends at the first ']'),
+# so it only removes those characters when they precede '#]'; brackets are escaped here
+# because Java would read '[' inside a class as a nested class.
+NO_SPACE_PATTERN = r"""[.;:!'?,"()\[]#\]"""
+SPACE_PATTERN = r'(<br\s*/><br\s*/>)|(\-)|(\/)|(\n)|(\t)|(;)|(&amp)'
+# str.split() whitespace: Unicode White_Space plus the \x1c-\x1f separators
+WHITESPACE_PATTERN = r'(?U)[\s\x{1C}-\x{1F}]+'
+
+
+def get_spark(app_name='amazon_etl', master=None, conf=None):
+    """
+    SparkSession for the ETL jobs. Without master (and outside spark-submit) it runs
+    in local mode on every core; conf : extra {'spark.key': value} settings.
+    """
+    builder = SparkSession.builder.appName(app_name)
+    if master is not None or not SparkConf().contains('spark.master'):
+        builder = builder.master(master or 'local[*]')
+    builder = builder.config('spark.sql.execution.arrow.pyspark.enabled', 'true')
+    for key, value in (conf or {}).items():
+        builder = builder.config(key, value)
+    return builder.getOrCreate()
+
+
+def text_clean_col(c):
+    """Column expression equal to text_processing.text_clean applied to c."""
+    c = F.regexp_replace(F.lower(c), NO_SPACE_PATTERN, '')
+    c = F.regexp_replace(c, SPACE_PATTERN, ' ')
+    return F.trim(F.regexp_replace(c, WHITESPACE_PATTERN, ' '))
+
+
+@F.pandas_udf(T.StringType())
+def stopwords_stem(texts: pd.Series) -> pd.Series:
+    """rem_stopwords then stem_text (nltk, run on the executors)."""
+    from data_processing.text_processing import rem_stopwords, stem_text
+    return texts.map(lambda text: stem_text(rem_stopwords(text)))
+
+
+@F.pandas_udf(T.DoubleType())
+def round_price(prices: pd.Series) -> pd.Series:
+    """Python round(x, 2) as in meta_clean (Spark round/bround differ on halves)."""
+    return prices.map(lambda x: round(x, 2))
+
+
+def asin_bucket_col(asin, n_buckets=N_BUCKETS):
+    """Partition of an asin column, same value as tables.asin_bucket."""
+    return F.pmod(F.conv(F.substring(F.md5(asin), 1, 8), 16, 10).cast('long'), F.lit(n_buckets))
+
+
+def write_partitioned(df, path, n_buckets=N_BUCKETS):
+    """Parquet under path partitioned by asin bucket, one file per bucket."""
+    (df.withColumn(BUCKET_COLUMN, asin_bucket_col(F.col('asin'), n_buckets))
+       .repartition(n_buckets, BUCKET_COLUMN)
+       .write.mode('overwrite').partitionBy(BUCKET_COLUMN).parquet(path))
+
+
+def _is_json_array(path):
+    """True when a local json file is one array (pandas layout) rather than json lines."""
+    if not os.path.exists(path):
+        return False
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for char in iter(lambda: f.read(1), ''):
+            if not char.isspace():
+                return char == '['
+    return False
+
+
+def read_json(spark, path, schema=None, multiline=None):
+    """Raw json dataset, either json lines or a single array (detected for local files)."""
+    if multiline is None:
+        multiline = _is_json_array(path)
+    reader = spark.read.option('multiLine', multiline)
+    if schema is not None:
+        reader = reader.schema(schema)
+    return reader.json(path)
+
+
+def _drop_duplicates(df, order_col='row_id'):
+    """drop_duplicates() on every column but order_col, keeping the first row (lowest order_col)."""
+    cols = [c for c in df.columns if c != order_col]
+    return df.groupBy(cols).agg(F.min(order_col).alias(order_col))
+
+
+def reviews_clean(spark, src_path, dest_path=None, n_buckets=N_BUCKETS):
+    """
+    data_cleaning.reviews_clean on Spark: same imputation, duplicate removal and
+    text normalization of reviewText and summary.
+    A row_id column keeps the input order for final_data.
+    """
+    with span('spark.reviews_clean', path=src_path):
+        df = read_json(spark, src_path, REVIEW_SCHEMA).drop('reviewTime')
+        df = df.fillna('', subset=['reviewerName', 'reviewText', 'summary']).fillna('0', subset=['vote'])
+        df = _drop_duplicates(df.withColumn('row_id', F.monotonically_increasing_id()))
+        for col in ['reviewText', 'summary']:
+            df = df.withColumn(col, stopwords_stem(text_clean_col(F.col(col))))
+        if dest_path is not None:
+            write_partitioned(df, dest_path, n_buckets)
+    return df
+
+
+def _category_path(df):
+    """category column as the 'a > b > c' string of data_cleaning.clean_meta_frame."""
+    category = F.col('category')
+    if isinstance(df.schema['category'].dataType, T.ArrayType):
+        category = F.when(F.size(category) > 0, F.concat_ws(' > ', category))
+    return F.coalesce(F.when(category != '', category), F.lit(''))
+
+
+def meta_clean(spark, src_path, dest_path=None, n_buckets=N_BUCKETS):
+    """
+    data_cleaning.meta_clean on Spark. Keeps asin, title, description, brand, price,
+    main_cat and category: empty strings and lists become null, prices over 6 characters
+    (ranges) are dropped, untitled products removed, missing descriptions replaced by the
+    title, missing brands and categories by '' and missing prices by the mean price,
+    titles and descriptions cleaned, category lists joined as 'a > b > c'.
+    """
+    with span('spark.meta_clean', path=src_path):
+        df = read_json(spark, src_path).withColumn('row_id', F.monotonically_increasing_id())
+        description = F.col('description')
+        if isinstance(df.schema['description'].dataType, T.ArrayType):
+            description = F.when(F.size(description) > 0, F.concat_ws(' ', description))
+        else:
+            description = F.when(description != '', description)
+        price = F.regexp_replace(F.col('price').cast('string'), r'^[ $]+|[ $]+$', '')
+        df = df.select(
+            F.when(F.col('title') != '', F.col('title')).alias('title'),
+            description.alias('description'),
+            F.coalesce(F.when(F.col('brand') != '', F.col('brand')), F.lit('')).alias('brand'),
+            F.when(F.length(price) <= 6, price.cast('double')).alias('price'),
+            F.coalesce(F.when(F.col('main_cat') != '', F.col('main_cat')), F.lit('')).alias('main_cat'),
+            _category_path(df).alias('category'),
+            'asin', 'row_id'
+        )
+        df = df.filter(F.col('title').isNotNull())
+        df = df.withColumn('description', F.coalesce(F.col('description'), F.col('title')))
+        df = df.withColumn('title', text_clean_col(F.col('title')))
+        df = df.withColumn('description', text_clean_col(F.col('description')))
+        mean_price = df.agg(F.avg('price')).first()[0]
+        df = df.withColumn('price', round_price(F.coalesce(F.col('price'), F.lit(mean_price).cast('double'))))
+        df = _drop_duplicates(df)
+        if dest_path is not None:
+            write_partitioned(df, dest_path, n_buckets)
+    return df
+
+
+def add_review_count(reviews):
+    """review_count column of feature_genration.all_feature: reviews (with a reviewerID) per asin."""
+    return reviews.withColumn('review_count', F.count('reviewerID').over(Window.partitionBy('asin')))
+
+
+def final_data(reviews, meta, dest_path=None, n_buckets=N_BUCKETS):
+    """
+    data_merge.final_data on Spark: verified reviews joined with their product,
+    one row per (asin, reviewerID) (the first in input order), FINAL_FEATURES columns.
+    reviews must carry the all_feature columns (review_count, reviewText_senti, positive_prob).
+    """
+    with span('spark.final_data'):
+        df = reviews.join(meta.withColumnRenamed('row_id', 'meta_row_id'), on='asin')
+        df = df.filter(F.col('verified'))
+        first = Window.partitionBy('asin', 'reviewerID').orderBy('row_id', 'meta_row_id')
+        df = df.withColumn('_rank', F.row_number().over(first)).filter(F.col('_rank') == 1).select(FINAL_FEATURES)
+        if dest_path is not None:
+            write_partitioned(df, dest_path, n_buckets)
+    return df
+
+
+def run(spark, rev_path, meta_path, out_dir='data/spark', features=None, n_buckets=N_BUCKETS):
+    """
+    Clean reviews and meta into out_dir/clean_reviews and out_dir/clean_meta.
+    features : function(spark, clean reviews) -> reviews with the all_feature columns
+    (spark_sentiment.add_features); when given the scored reviews are written to
+    out_dir/review_features and the merged dataset to out_dir/final.
+    Every output is parquet partitioned by asin bucket (read with tables.read_table).
+    Returns the output paths.
+    """
+    names = ('clean_reviews', 'clean_meta') + (('review_features', 'final') if features else ())
+    paths = {name: os.path.join(out_dir, name) for name in names}
+    reviews_clean(spark, rev_path, paths['clean_reviews'], n_buckets)
+    meta_clean(spark, meta_path, paths['clean_meta'], n_buckets)
+    if features is None:
+        return paths
+    with span('spark.features'):
+        scored = features(spark, spark.read.parquet(paths['clean_reviews']).drop(BUCKET_COLUMN))
+        write_partitioned(scored, paths['review_features'], n_buckets)
+    reviews = spark.read.parquet(paths['review_features']).drop(BUCKET_COLUMN)
+    meta = spark.read.parquet(paths['clean_meta']).drop(BUCKET_COLUMN)
+    final_data(reviews, meta, paths['final'], n_buckets)
+    return paths
+
+
+if __name__ == "__main__":
+    # python -m data_processing.spark_etl <reviews json> <meta json> [out dir]
+    session = get_spark()
+    print(run(session, sys.argv[1], sys.argv[2], *sys.argv[3:4]))
+    session.stop()
@@ -0,0 +1,98 @@
+import sys
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from pyspark.sql import functions as F
+from pyspark.sql import types as T
+
+from data_processing import spark_etl
+from monitoring.instrumentation import span
+from serving import model_registry
+
+# Same registry models as feature_genration.svc_features / nb_features
+SVC_MODELS = ('svc.ngram_vec', 'svc.model')
+NB_MODELS = ('nb.count_vect', 'nb.tfidf_vect', 'nb.model')
+NB_COLUMNS = ['negative_prob', 'neutral_prob', 'positive_prob']
+
+
+def _load(names):
+    return tuple(model_registry.get(name) for name in names)
+
+
+def broadcast_models(spark, svc_models=SVC_MODELS, nb_models=NB_MODELS):
+    """
+    Load the fitted vectorizers and models on the driver and broadcast them:
+    each executor receives them once and every Python worker unpickles them once.
+    Returns (svc broadcast, nb broadcast).
+    """
+    with span('spark_sentiment.broadcast'):
+        sc = spark.sparkContext
+        return sc.broadcast(_load(svc_models)), sc.broadcast(_load(nb_models))
+
+
+def _label_type(classes):
+    """Spark type of the labels predicted by a classifier, as pandas would store them."""
+    kind = np.asarray(classes).dtype.kind
+    if kind == 'b':
+        return T.BooleanType()
+    if kind in 'iu':
+        return T.LongType()
+    return T.DoubleType() if kind == 'f' else T.StringType()
+
+
+def svc_sentiment_udf(svc_bc, return_type):
+    """Vectorized svc_features: text_clean, rem_stopwords, stem_text, ngram vectorizer, LinearSVC."""
+
+    @F.pandas_udf(return_type)
+    def svc_sentiment(batches: Iterator[pd.Series]) -> Iterator[pd.Series]:
+        from data_processing.text_processing import rem_stopwords, stem_text, text_clean
+        ngram_vect, svc_model = svc_bc.value
+        for texts in batches:
+            if texts.empty:
+                yield pd.Series([], dtype=object)
+                continue
+            texts = texts.apply(text_clean).apply(rem_stopwords).apply(stem_text)
+            yield pd.Series(svc_model.predict(ngram_vect.transform(texts)))
+
+    return svc_sentiment
+
+
+def nb_proba_udf(nb_bc):
+    """Vectorized nb_features: text_clean, count and tf-idf vectorizers, naive Bayes class probabilities."""
+
+    @F.pandas_udf(', '.join(f'{c} double' for c in NB_COLUMNS))
+    def nb_proba(batches: Iterator[pd.Series]) -> Iterator[pd.DataFrame]:
+        from data_processing.text_processing import text_clean
+        count_vect, tfidf_vect, nb_model = nb_bc.value
+        for texts in batches:
+            if texts.empty:
+                yield pd.DataFrame(columns=NB_COLUMNS, dtype=float)
+                continue
+            proba = nb_model.predict_proba(tfidf_vect.transform(count_vect.transform(texts.apply(text_clean))))
+            yield pd.DataFrame(proba, columns=NB_COLUMNS)
+
+    # the struct is expanded into 3 columns below, nondeterministic keeps the optimizer
+    # from inlining (and running) the UDF once per column
+    return nb_proba.asNondeterministic()
+
+
+def add_features(spark, reviews, models=None):
+    """
+    feature_genration.all_feature on a Spark DataFrame of clean reviews: adds
+    review_count, reviewText_senti (from reviewText) and negative/neutral/positive_prob
+    (from summary). models : broadcast_models() result, loaded when None.
+    """
+    svc_bc, nb_bc = models or broadcast_models(spark)
+    svc = svc_sentiment_udf(svc_bc, _label_type(svc_bc.value[1].classes_))
+    reviews = spark_etl.add_review_count(reviews)
+    reviews = reviews.withColumn('reviewText_senti', svc(F.col('reviewText')))
+    reviews = reviews.withColumn('_nb', nb_proba_udf(nb_bc)(F.col('summary')))
+    return reviews.select('*', *[F.col('_nb')[c].alias(c) for c in NB_COLUMNS]).drop('_nb')
+
+
+if __name__ == "__main__":
+    # python -m data_processing.spark_sentiment <reviews json> <meta json> [out dir]
+    session = spark_etl.get_spark('amazon_sentiment')
+    print(spark_etl.run(session, sys.argv[1], sys.argv[2], *sys.argv[3:4], features=add_features))
+    session.stop()
@@ -0,0 +1,174 @@
+import io
+import sys
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from pyspark.sql import Window
+from pyspark.sql import functions as F
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from data_processing import spark_etl
+from monitoring.instrumentation import span
+from recommendation_filters.content_based_filter import top_k_block
+
+BLOCK_SCHEMA = 'block long, start long, matrix binary'
+BAND_SCHEMA = 'band long, band_start long, band_matrix binary'
+NEIGHBOUR_SCHEMA = 'asin string, neighbours array<string>, scores array<double>'
+# serialized size of a band: well under the 2GB limit of a binary cell and of a
+# broadcast variable, a band is also held by every task multiplying with it
+BAND_BYTES = 128 * 1024 ** 2
+
+
+def _analyzer():
+    """Tokenizer of content_based_filter.cosine_sim (sklearn token pattern, english stop words)."""
+    return TfidfVectorizer(stop_words='english').build_analyzer()
+
+
+def _to_bytes(matrix):
+    buf = io.BytesIO()
+    sparse.save_npz(buf, matrix.tocsr(), compressed=False)
+    return buf.getvalue()
+
+
+def _from_bytes(data):
+    return sparse.load_npz(io.BytesIO(data)).tocsr()
+
+
+def load_documents(spark, meta_path):
+    """(row, asin, description) of every product of a clean meta table, rows numbered in asin order."""
+    docs = spark.read.parquet(meta_path)
+    if 'row_id' in docs.columns:  # first record of an asin, as in the pandas pipeline
+        first = Window.partitionBy('asin').orderBy('row_id')
+        docs = docs.withColumn('_rank', F.row_number().over(first)).filter(F.col('_rank') == 1)
+    else:
+        docs = docs.dropDuplicates(['asin'])
+    docs = docs.select('asin', F.coalesce(F.col('description'), F.lit('')).alias('description'))
+    rows = docs.orderBy('asin').rdd.zipWithIndex().map(lambda p: (p[1], p[0]['asin'], p[0]['description']))
+    return rows.toDF('row long, asin string, description string')
+
+
+def vocabulary(docs):
+    """
+    Terms sorted like TfidfVectorizer.vocabulary_ and their smoothed idf
+    (ln((1 + n) / (1 + df)) + 1), from document frequencies counted on the executors.
+    """
+    def terms(batches):
+        analyze = _analyzer()
+        for pdf in batches:
+            yield pd.DataFrame({'term': [t for text in pdf['description'] for t in set(analyze(text))]})
+
+    n_docs = docs.count()
+    counts = docs.mapInPandas(terms, 'term string').groupBy('term').count().collect()
+    counts.sort(key=lambda r: r['term'])
+    vocab = {r['term']: i for i, r in enumerate(counts)}
+    df = np.array([r['count'] for r in counts], dtype=np.float64)
+    return vocab, np.log((1 + n_docs) / (1 + df)) + 1
+
+
+def block_matrices(docs, vocab_bc, idf_bc, block_size):
+    """One row per block of block_size documents: its l2 normalized tf-idf CSR matrix."""
+    def build(pdf):
+        vocab, idf = vocab_bc.value, idf_bc.value
+        analyze = _analyzer()
+        pdf = pdf.sort_values('row')
+        indptr, indices, data = [0], [], []
+        for text in pdf['description']:
+            counts = Counter(vocab[t] for t in analyze(text) if t in vocab)
+            cols = sorted(counts)
+            indices.extend(cols)
+            data.extend(counts[c] for c in cols)
+            indptr.append(len(indices))
+        counts = sparse.csr_matrix((np.array(data, dtype=np.float64), indices, indptr), shape=(len(pdf), len(idf)))
+        matrix = normalize(counts.multiply(idf).tocsr())
+        return pd.DataFrame({'block': [int(pdf['row'].iloc[0]) // block_size],
+                             'start': [int(pdf['row'].iloc[0])], 'matrix': [_to_bytes(matrix)]})
+
+    return (docs.withColumn('block', F.floor(F.col('row') / block_size))
+                .groupBy('block').applyInPandas(build, BLOCK_SCHEMA))
+
+
+def band_count(total_bytes, n_blocks, band_bytes=BAND_BYTES):
+    """Number of bands of at most about band_bytes each, between 1 and n_blocks."""
+    return int(min(max(1, -(-total_bytes // band_bytes)), max(1, n_blocks)))
+
+
+def band_matrices(blocks, n_blocks, n_bands):
+    """Consecutive blocks stacked into n_bands bands, the right hand side of the products."""
+    def stack(pdf):
+        pdf = pdf.sort_values('start')
+        matrix = sparse.vstack([_from_bytes(m) for m in pdf['matrix']]).tocsr()
+        return pd.DataFrame({'band': [int(pdf['band'].iloc[0])], 'band_start': [int(pdf['start'].iloc[0])],
+                             'band_matrix': [_to_bytes(matrix)]})
+
+    return (blocks.withColumn('band', F.floor(F.col('block') * n_bands / n_blocks))
+                  .groupBy('band').applyInPandas(stack, BAND_SCHEMA))
+
+
+def run(spark, meta_path, dest_path, top_k=100, block_size=2048, n_bands=None, broadcast=None,
+        band_bytes=BAND_BYTES):
+    """
+    Top top_k content neighbours of every product of a clean meta table, written to
+    dest_path as (asin, neighbours, scores) partitioned by asin bucket, loadable with
+    content_based_filter.load_neighbours.
+    The normalized tf-idf matrix is cut in row blocks; every block is multiplied with
+    each band (n_bands groups of blocks, by default as many as needed for bands of
+    about band_bytes serialized) keeping the per row top_k, then the band results
+    are merged per row. broadcast : send the bands to every executor instead of
+    shuffling the block x band pairs, by default only when there is a single band.
+    """
+    with span('spark.similarity', path=meta_path) as job:
+        docs = load_documents(spark, meta_path).cache()
+        asins = np.array([r['asin'] for r in docs.select('asin').orderBy('row').collect()], dtype=object)
+        n_blocks = -(-len(asins) // block_size)
+        vocab, idf = vocabulary(docs)
+        sc = spark.sparkContext
+        vocab_bc, idf_bc, asins_bc = sc.broadcast(vocab), sc.broadcast(idf), sc.broadcast(asins)
+        k = min(top_k, len(asins))
+
+        blocks = block_matrices(docs, vocab_bc, idf_bc, block_size).cache()
+        if n_bands is None:
+            total_bytes = blocks.select(F.sum(F.length('matrix'))).first()[0] or 0
+            n_bands = band_count(total_bytes, n_blocks, band_bytes)
+        if broadcast is None:
+            broadcast = n_bands == 1
+        bands = band_matrices(blocks, n_blocks, n_bands)
+        pairs = blocks.crossJoin(F.broadcast(bands) if broadcast else bands)
+
+        def multiply(batches):
+            names = asins_bc.value
+            for pdf in batches:
+                for start, matrix, band_start, band_matrix in zip(pdf['start'], pdf['matrix'],
+                                                                  pdf['band_start'], pdf['band_matrix']):
+                    ids, scores = top_k_block(_from_bytes(matrix), _from_bytes(band_matrix), k, band_start)
+                    keep = ids >= 0
+                    yield pd.DataFrame({
+                        'asin': names[start:start + len(ids)],
+                        'neighbours': [names[i[m]].tolist() for i, m in zip(ids, keep)],
+                        'scores': [s[m].tolist() for s, m in zip(scores, keep)]
+                    })
+
+        neighbours = pairs.mapInPandas(multiply, NEIGHBOUR_SCHEMA)
+        if n_bands > 1:
+            # decreasing score then asin (row order), as top_k_block orders a single band
+            ranked = F.array_sort(F.flatten(F.collect_list(F.transform(
+                F.arrays_zip('scores', 'neighbours'),
+                lambda x: F.struct((-x['scores']).alias('neg_score'), x['neighbours'].alias('asin'))))))
+            neighbours = (neighbours.groupBy('asin').agg(F.slice(ranked, 1, k).alias('top'))
+                          .select('asin', F.col('top.asin').alias('neighbours'),
+                                  F.transform(F.col('top.neg_score'), lambda s: -s).alias('scores')))
+        spark_etl.write_partitioned(neighbours, dest_path)
+        job.set(rows=len(asins), bands=n_bands)
+        blocks.unpersist()
+        docs.unpersist()
+    return dest_path
+
+
+if __name__ == "__main__":
+    # python -m data_processing.spark_similarity <clean meta parquet> <dest dir> [top_k]
+    session = spark_etl.get_spark('amazon_similarity')
+    meta = sys.argv[1]
+    print(run(session, meta, sys.argv[2], *(int(a) for a in sys.argv[3:4])))
+    session.stop()
@@ -0,0 +1,332 @@
+import gzip
+import os
+
+import numpy as np
+import pandas as pd
+
+BEAUTY_WORDS = ['hair', 'skin', 'cream', 'oil', 'shampoo', 'conditioner', 'lotion', 'soap', 'nail', 'polish',
+                'lip', 'gloss', 'mask', 'serum', 'brush', 'scent', 'fragrance', 'dry', 'smooth', 'soft',
+                'great', 'love', 'product', 'smell', 'works', 'price', 'quality', 'bottle', 'size', 'color',
+                'face', 'body', 'wash', 'natural', 'organic', 'gentle', 'sensitive', 'moisturizer', 'daily', 'set']
+FILLER_WORDS = ['the', 'and', 'it', 'is', 'this', 'my', 'for', 'not', 'very', 'but', 'with', 'after', 'use', 'was']
+CATEGORIES = ['Beauty & Personal Care', 'Skin Care', 'Hair Care', 'Makeup', 'Fragrance', 'Tools & Accessories']
+
+
+def vocabulary(size=5000, seed=0):
+    """Deterministic word list: common beauty words first, then pronounceable made-up words."""
+    rng = np.random.default_rng(seed)
+    consonants, vowels = list('bcdfghklmnprstvz'), list('aeiou')
+    words = FILLER_WORDS + BEAUTY_WORDS
+    seen = set(words)
+    while len(words) < size:
+        n = rng.integers(2, 5)
+        word = ''.join(rng.choice(consonants) + rng.choice(vowels) for _ in range(n))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return np.array(words[:size])
+
+
+class Zipf:
+    """
+    Zipf(a) law over ranks 1..n, sampled by rejection-inversion (Hörmann and Derflinger):
+    exact, in O(1) memory whatever n, about one draw per sample.
+    """
+
+    def __init__(self, n, a):
+        self.n = n
+        self.a = a
+        self.h_x1 = self._h_integral(1.5) - 1
+        self.h_n = self._h_integral(n + 0.5)
+        self.s = 2 - self._h_integral_inverse(self._h_integral(2.5) - 2.0 ** -a)
+
+    def _h_integral(self, x):
+        """Integral of x ** -a from 1 to x."""
+        log_x = np.log(x)
+        return log_x if self.a == 1 else np.expm1((1 - self.a) * log_x) / (1 - self.a)
+
+    def _h_integral_inverse(self, y):
+        return np.exp(y) if self.a == 1 else np.exp(np.log1p(y * (1 - self.a)) / (1 - self.a))
+
+    def sample(self, rng, size):
+        """Ranks (0-based) drawn from the law."""
+        ranks = np.empty(size, dtype=np.int64)
+        todo = np.arange(size)
+        while len(todo):  # rejected draws are drawn again
+            u = self.h_n + rng.random(len(todo)) * (self.h_x1 - self.h_n)
+            x = self._h_integral_inverse(u)
+            k = np.clip(np.floor(x + 0.5), 1, self.n)
+            accepted = (k - x <= self.s) | (u >= self._h_integral(k + 0.5) - k ** -self.a)
+            ranks[todo[accepted]] = k[accepted] - 1
+            todo = todo[~accepted]
+        return ranks
+
+
+def item_asin(i):
+    return f'B{i:09d}'
+
+
+def reviewer_id(u):
+    return 'A' + np.base_repr(u * 2654435761 % 36 ** 12, 36).rjust(12, '0') + 'Q'  # stable, id-looking
+
+
+def texts(rng, words, word_law, n, mean_words, sigma=0.8):
+    """n texts with lognormal word counts (mean around mean_words) and word frequencies following word_law (Zipf)."""
+    lengths = np.maximum(1, rng.lognormal(np.log(mean_words), sigma, n).astype(np.int64))
+    picked = words[word_law.sample(rng, lengths.sum())].tolist()
+    ends = np.cumsum(lengths).tolist()
+    return [' '.join(picked[start:end]) for start, end in zip([0] + ends[:-1], ends)]
+
+
+class _JsonWriter:
+    """
+    Streams records as a JSON array (read by pd.read_json) or JSON lines, gzip when path ends with .gz.
+    Records are written a DataFrame at a time, encoded by DataFrame.to_json.
+    """
+
+    def __init__(self, path, lines=False):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.f = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) if path.endswith('.gz') else open(path, 'w', encoding='utf-8')
+        self.lines = lines
+        self.count = 0
+        if not lines:
+            self.f.write('[')
+
+    def write_frame(self, frame):
+        """Write the rows of frame as records."""
+        if not len(frame):
+            return
+        text = frame.to_json(orient='records', lines=self.lines)
+        if self.lines:
+            self.f.write(text if text.endswith('\n') else text + '\n')
+        else:
+            if self.count:
+                self.f.write(',\n')
+            self.f.write(text[1:-1])  # without the brackets of the chunk's array
+        self.count += len(frame)
+
+    def close(self):
+        if not self.lines:
+            self.f.write(']')
+        self.f.close()
+
+
+def _chunks(n_rows, chunk_size):
+    for chunk_id, start in enumerate(range(0, n_rows, chunk_size)):
+        yield chunk_id, min(chunk_size, n_rows - start)
+
+
+def _asins(items):
+    return [item_asin(i) for i in items.tolist()]
+
+
+def generate_reviews(path, n_rows, n_items=None, n_users=None, seed=0, item_a=1.1, user_a=1.3,
+                     dup_rate=0.01, chunk_size=100000):
+    """
+    Write n_rows raw reviews with the columns read by data_cleaning.reviews_clean.
+    Item popularity and user activity follow Zipf laws, review/summary lengths are
+    lognormal, dup_rate of the rows repeat the previous row of their chunk exactly.
+    Every chunk has its own seeded generator, so output only depends on the arguments;
+    memory is bounded by chunk_size, whatever n_items and n_users.
+    """
+    n_items = n_items or max(10, n_rows // 10)
+    n_users = n_users or max(10, n_rows // 3)
+    words = vocabulary(seed=seed)
+    word_law = Zipf(len(words), 1.0)
+    item_law, user_law = Zipf(n_items, item_a), Zipf(n_users, user_a)
+    writer = _JsonWriter(path)
+    for chunk_id, size in _chunks(n_rows, chunk_size):
+        rng = np.random.default_rng([seed, 1, chunk_id])
+        items = item_law.sample(rng, size)
+        users, user_rows = np.unique(user_law.sample(rng, size), return_inverse=True)
+        overall = rng.choice([1.0, 2.0, 3.0, 4.0, 5.0], size, p=[0.07, 0.05, 0.09, 0.17, 0.62])
+        verified = rng.random(size) < 0.9
+        votes = np.where(rng.random(size) < 0.15, rng.geometric(0.3, size), 0)
+        times = rng.integers(1_000_000_000, 1_540_000_000, size)
+        review_texts = texts(rng, words, word_law, size, 30)
+        summaries = texts(rng, words, word_law, size, 4, 0.5)
+        dups = rng.random(size) < dup_rate
+        rows = np.arange(size)
+        source = np.maximum.accumulate(np.where(dups & (rows > 0), -1, rows))  # row each row repeats
+        frame = pd.DataFrame({
+            'overall': overall,
+            'vote': np.array([str(v) if v else None for v in votes.tolist()], dtype=object),
+            'verified': verified,
+            'reviewTime': '',
+            'reviewerID': np.array([reviewer_id(u) for u in users.tolist()], dtype=object)[user_rows],
+            'asin': _asins(items),
+            'style': None,
+            'reviewerName': np.array([f'user{u}' for u in users.tolist()], dtype=object)[user_rows],
+            'reviewText': review_texts,
+            'summary': summaries,
+            'unixReviewTime': times,
+            'image': None
+        })
+        writer.write_frame(frame.iloc[source])
+    writer.close()
+    return writer.count
+
+
+def _prices(rng, size):
+    """Lognormal prices as raw '$12.34' strings, sometimes missing or a range (dropped by meta_clean)."""
+    r = rng.random(size)
+    values = np.round(rng.lognormal(np.log(15), 0.8, size), 2)
+    return [('' if u < 0.25 else f'${v:.2f} - ${v * 2:.2f}' if u < 0.28 else f'${v:.2f}')
+            for u, v in zip(r.tolist(), values.tolist())]
+
+
+def generate_meta(path, n_items, seed=0, dup_rate=0.01, chunk_size=100000, main_cats=('All Beauty',)):
+    """
+    Write n_items raw metadata records (asin 0..n_items-1) with the columns read by
+    data_cleaning.meta_clean, as a JSON array; dup_rate of them are written twice.
+    main_cats : main categories, assigned to the items in turn (catalog shards)
+    """
+    words = vocabulary(seed=seed)
+    word_law = Zipf(len(words), 1.0)
+    writer = _JsonWriter(path)
+    for chunk_id, size in _chunks(n_items, chunk_size):
+        rng = np.random.default_rng([seed, 2, chunk_id])
+        ids = chunk_id * chunk_size + np.arange(size)
+        titles = texts(rng, words, word_law, size, 8, 0.4)
+        descriptions = texts(rng, words, word_law, size, 60)
+        categories = rng.choice(CATEGORIES, size).tolist()
+        has_description, has_title, has_brand = rng.random((3, size)) > [[0.1], [0.01], [0.2]]
+        brands = rng.integers(0, 1000, size)
+        dups = rng.random(size) < dup_rate
+        empty = [[] for _ in range(size)]
+        frame = pd.DataFrame({
+            'category': [[c] for c in categories],
+            'tech1': '', 'fit': '', 'tech2': '', 'feature': empty, 'date': '', 'image': empty,
+            'description': [[d] if ok else [] for d, ok in zip(descriptions, has_description.tolist())],
+            'title': np.where(has_title, titles, ''),
+            'also_buy': empty, 'brand': [f'brand{b}' if ok else '' for b, ok in zip(brands.tolist(), has_brand.tolist())],
+            'rank': '', 'also_view': empty, 'similar_item': '',
+            'main_cat': [main_cats[i % len(main_cats)] for i in ids.tolist()],
+            'price': _prices(rng, size), 'asin': _asins(ids), 'details': [{} for _ in range(size)]
+        })
+        writer.write_frame(frame.iloc[np.repeat(np.arange(size), 1 + dups)])  # duplicates: exact listings
+    writer.close()
+    return writer.count
+
+
+def generate_meta_jsonl(path, n_items, seed=0, chunk_size=100000):
+    """Write n_items product records in the JSONL schema read by the app (parent_asin, images, ...)."""
+    words = vocabulary(seed=seed)
+    word_law = Zipf(len(words), 1.0)
+    writer = _JsonWriter(path, lines=True)
+    for chunk_id, size in _chunks(n_items, chunk_size):
+        rng = np.random.default_rng([seed, 3, chunk_id])
+        asins = _asins(chunk_id * chunk_size + np.arange(size))
+        titles = texts(rng, words, word_law, size, 8, 0.4)
+        features = texts(rng, words, word_law, 3 * size, 6, 0.5)
+        ratings = np.clip(rng.normal(4.1, 0.6, size), 1, 5).round(1)
+        counts = rng.geometric(0.01, size)
+        n_features = rng.integers(0, 4, size).tolist()
+        prices = np.round(rng.lognormal(np.log(15), 0.8, size), 2)
+        has_price, has_image = rng.random((2, size)) > [[0.3], [0.05]]
+        frame = pd.DataFrame({
+            'main_category': 'All Beauty',
+            'title': titles,
+            'average_rating': ratings,
+            'rating_number': counts,
+            'features': [features[3 * i:3 * i + n] for i, n in enumerate(n_features)],
+            'description': [[] for _ in range(size)],
+            'price': np.array([p if ok else None for p, ok in zip(prices.tolist(), has_price.tolist())], dtype=object),
+            'images': [[{'thumb': f'https://example.com/images/{a}_thumb.jpg',
+                         'large': f'https://example.com/images/{a}.jpg', 'variant': 'MAIN'}] if ok else []
+                       for a, ok in zip(asins, has_image.tolist())],
+            'store': [f'brand{b}' for b in rng.integers(0, 1000, size).tolist()],
+            'categories': [[] for _ in range(size)],
+            'details': [{} for _ in range(size)],
+            'parent_asin': asins
+        })
+        writer.write_frame(frame)
+    writer.close()
+    return writer.count
+
+
+def generate_dataset(out_dir, n_reviews, n_items=None, n_users=None, seed=0, chunk_size=100000):
+    """
+    Write a consistent synthetic category in out_dir:
+    reviews.json.gz (reviews_clean), meta.json.gz (meta_clean), meta.jsonl (app metadata).
+    Returns the paths.
+    """
+    n_items = n_items or max(10, n_reviews // 10)
+    paths = {'reviews': os.path.join(out_dir, 'reviews.json.gz'),
+             'meta': os.path.join(out_dir, 'meta.json.gz'),
+             'meta_jsonl': os.path.join(out_dir, 'meta.jsonl')}
+    generate_reviews(paths['reviews'], n_reviews, n_items, n_users, seed, chunk_size=chunk_size)
+    generate_meta(paths['meta'], n_items, seed, chunk_size=chunk_size)
+    generate_meta_jsonl(paths['meta_jsonl'], n_items, seed, chunk_size=chunk_size)
+    return paths
+
+
+def product_page_html(rng, asin, words, word_law, filler_kb=40):
+    """
+    Amazon-like product page for the scraper: the elements read by amazon_product_scraper
+    (sometimes through their fallback, sometimes missing) inside filler_kb KB of unrelated
+    markup, scripts and styles.
+    """
+    title, description = texts(rng, words, word_law, 1, 8, 0.4)[0], texts(rng, words, word_law, 1, 60)[0]
+    features = texts(rng, words, word_law, int(rng.integers(0, 6)), 8, 0.5)
+    price = float(rng.lognormal(np.log(15), 0.8))
+    whole, fraction = f'{int(price)},', f'{int(price * 100) % 100:02d}'
+    category = str(rng.choice(CATEGORIES))
+    parts = ['<!DOCTYPE html><html lang="fr-fr"><head><meta charset="utf-8"><title>Amazon.fr : ',
+             title, '</title><style>.a-price{color:#B12704}</style>',
+             '<script>var ue_t0 = +new Date(); if (a < b && c > d) { window.ue = {}; }</script></head><body>',
+             '<div id="wayfinding-breadcrumbs_container"><ul class="a-unordered-list">',
+             '<li><span class="a-list-item"><a href="/b/ref=dp_bc_1">Beauté et Parfum</a></span></li>',
+             f'<li><span class="a-list-item"><a href="/b/ref=dp_bc_2">{category}</a></span></li></ul></div>']
+    filler = []
+    while sum(map(len, filler)) < filler_kb * 512:  # half before, half after the product block
+        filler.append(f'<div class="a-section a-spacing-small"><span class="a-size-base">'
+                      f'{texts(rng, words, word_law, 1, 20)[0]}</span><br/><img src="/s/{rng.integers(1e9)}.gif"></div>')
+    parts += filler
+    parts += ['<div id="centerCol"><h1 id="title" class="a-size-large">',
+              f'<span id="productTitle" class="a-size-large product-title-word-break">  {title}  </span></h1>']
+    if rng.random() < 0.9:
+        byline = 'bylineInfo' if rng.random() < 0.8 else 'brand'
+        parts.append(f'<a id="{byline}" class="a-link-normal" href="/stores/b">Marque : brand{int(rng.integers(1000))}</a>')
+    if rng.random() < 0.95:
+        rating = f'{float(np.clip(rng.normal(4.1, 0.6), 1, 5)):.1f}'.replace('.', ',')
+        parts.append(f'<span class="a-icon-alt">{rating} sur 5 étoiles</span>')
+        parts.append(f'<span id="acrCustomerReviewText" class="a-size-base">{int(rng.geometric(0.001)):,} évaluations</span>'
+                     .replace(',', '.'))
+    r = rng.random()
+    if r < 0.7:
+        parts.append(f'<span class="a-price aok-align-center"><span class="a-offscreen">{whole}{fraction}€</span>'
+                     f'<span class="a-price-whole">{whole}</span><span class="a-price-fraction">{fraction}</span></span>')
+        if rng.random() < 0.3:
+            parts.append(f'<span class="a-price a-text-price"><span class="a-offscreen">{price * 1.3:.2f}€</span></span>')
+    elif r < 0.9:
+        parts.append(f'<span id="priceblock_ourprice" class="a-size-medium">{price:.2f} €</span>')
+    parts.append('<div id="availability" class="a-section"><span class="a-size-medium a-color-success">'
+                 + ('En stock' if rng.random() < 0.9 else 'Temporairement en rupture de stock') + '</span></div>')
+    parts.append('<div id="merchant-info">Expédié et vendu par Amazon.</div>')
+    if features:
+        parts.append('<div id="feature-bullets"><ul class="a-unordered-list a-vertical">'
+                     + ''.join(f'<li><span class="a-list-item"> {f} </span></li>' for f in features) + '</ul></div>')
+    parts.append(f'<div id="imgTagWrapperId"><img id="landingImage" alt="{title}" '
+                 f'src="https://m.media-amazon.com/images/I/{asin}._AC_SL1500_.jpg"></div></div>')
+    if rng.random() < 0.85:
+        parts.append(f'<div id="productDescription" class="a-section"><p><span>{description}</span></p></div>')
+    parts += filler[::-1]
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def generate_product_pages(out_dir, n_pages, seed=0, filler_kb=40):
+    """Write n_pages product pages '<asin>.html' in out_dir, returns {url: path}."""
+    os.makedirs(out_dir, exist_ok=True)
+    words = vocabulary(seed=seed)
+    word_law = Zipf(len(words), 1.0)
+    pages = {}
+    for i in range(n_pages):
+        rng = np.random.default_rng([seed, 4, i])
+        asin = item_asin(i)
+        path = os.path.join(out_dir, f'{asin}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(product_page_html(rng, asin, words, word_law, filler_kb))
+        pages[f'https://www.amazon.fr/dp/{asin}'] = path
+    return pages
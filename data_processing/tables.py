@@ -0,0 +1,74 @@
+import hashlib
+import os
+
+import pandas as pd
+
+# Partitioned outputs of the Spark jobs: '<dir>/asin_bucket=<k>/part-*.parquet'
+BUCKET_COLUMN = 'asin_bucket'
+N_BUCKETS = 64
+
+# Memory-budget mode (RECO_MEMORY_BUDGET=1): read_table returns compact_frame(df)
+MEMORY_BUDGET = os.environ.get('RECO_MEMORY_BUDGET', '') not in ('', '0')
+# repeated values (identifiers, and product texts once merged with the reviews),
+# stored once as categories with integer codes
+CATEGORY_COLUMNS = ('asin', 'reviewerID', 'brand', 'title', 'description', 'main_cat', 'category')
+
+
+def compact_frame(df, categories=CATEGORY_COLUMNS, drop=()):
+    """
+    df with smaller dtypes: categories columns as category, floats as float32,
+    integers downcast to the smallest type holding them; drop : columns removed first.
+    Other text columns (reviewText, summary, ...) are kept as they are.
+    """
+    df = df.drop(columns=[c for c in drop if c in df.columns])
+    for col in df.columns:
+        kind = df[col].dtype.kind
+        if col in categories and pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype('category')
+        elif kind == 'f':
+            df[col] = pd.to_numeric(df[col], downcast='float')
+        elif kind in 'iu':
+            df[col] = pd.to_numeric(df[col], downcast='integer' if kind == 'i' else 'unsigned')
+    return df
+
+
+def asin_bucket(asin, n_buckets=N_BUCKETS):
+    """Partition of an asin, same value as spark_etl.asin_bucket_col (first 8 hex digits of its md5)."""
+    return int(hashlib.md5(asin.encode('utf-8')).hexdigest()[:8], 16) % n_buckets
+
+
+def is_partitioned(path):
+    return os.path.isdir(path) or str(path).endswith('.parquet')
+
+
+def read_table(path, columns=None, asins=None, n_buckets=N_BUCKETS, compact=None):
+    """
+    DataFrame of a pipeline output: gzip json written by pandas, or a parquet
+    directory partitioned by asin bucket written by the Spark jobs.
+    columns : columns to read (all by default), only those are decoded from parquet
+    asins : restrict a partitioned read to the buckets holding these asins
+    compact : apply compact_frame (MEMORY_BUDGET when None)
+    """
+    df = _read_table(path, columns, asins, n_buckets)
+    return compact_frame(df) if (MEMORY_BUDGET if compact is None else compact) else df
+
+
+def _read_table(path, columns, asins, n_buckets):
+    if not is_partitioned(path):
+        df = pd.read_json(path)
+        if asins is not None:
+            df = df[df['asin'].isin(set(asins))].reset_index(drop=True)
+        return df if columns is None else df.loc[:, columns]
+    filters, read_columns = None, columns
+    if asins is not None:
+        filters = [(BUCKET_COLUMN, 'in', sorted({asin_bucket(a, n_buckets) for a in asins}))]
+        if columns is not None and 'asin' not in columns:
+            read_columns = list(columns) + ['asin']
+    df = pd.read_parquet(path, columns=read_columns, filters=filters)
+    if asins is not None:
+        df = df[df['asin'].isin(set(asins))]
+    if columns is not None:
+        df = df.loc[:, columns]
+    elif BUCKET_COLUMN in df.columns:
+        df = df.drop(columns=BUCKET_COLUMN)
+    return df.reset_index(drop=True)
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+import pandas as pd
+
+from evaluation import metrics
+from monitoring.instrumentation import count, span
+from recommendation_filters import content_based_filter, popularity_filter
+from serving import model_store
+
+_worker = {}  # models shared with the pool workers
+
+
+def _init_worker(models):
+    _worker.update(models)
+    if '_store' in models:  # arrays published in a model store: attach them without copy
+        root, name, version = models['_store']
+        _worker.update(model_store.ModelStore(root).attach(name, version).values)
+
+
+# models entries published to the store by evaluate(store_dir=...)
+SHARED_ARRAYS = ('cbf_df', 'indices', 'cosine_sim', 'asins', 'prices', 'ratings')
+
+
+def load_models(df_path='data/traitees/final.json.gz', sample_frac=1.0, collaborative=True):
+    """
+    Load every model needed by the evaluation once.
+    Returns dict with cbf_df, indices, cosine_sim, asins, prices, ratings and svd_model.
+    """
+    with span('evaluation.load_content', path=df_path):
+        df = content_based_filter.cbf_data(df_path)
+        cosine_sim = content_based_filter.cosine_sim(df['description'])
+    models = {
+        'df_path': df_path,
+        'cbf_df': df,
+        'indices': content_based_filter.indices(df),
+        'cosine_sim': cosine_sim,
+        'asins': df['asin'].to_numpy(),
+        'prices': df['price'].to_numpy(dtype=float),
+        'ratings': df['overall'].to_numpy(dtype=float),
+        'svd_model': None,
+        'sample_frac': sample_frac if collaborative else None
+    }
+    if collaborative:
+        from models import collaborative_model_based
+        with span('evaluation.train_collaborative', sample_frac=sample_frac):
+            models['svd_model'] = collaborative_model_based.train(
+                df_path=df_path, sample_frac=sample_frac, idx='asin',
+                col='reviewerID', val='positive_prob'
+            )
+    return models
+
+
+def positions(asins, indices):
+    """Row of each asin in the content data, -1 when unknown."""
+    return np.array([indices[a] if a in indices else -1 for a in asins], dtype=np.int64)
+
+
+def _ranked(block):
+    """Column order of each row by decreasing similarity, ties kept in row order (like sorted())."""
+    return np.argsort(-block, axis=1, kind='stable')
+
+
+def ground_truth_batch(rows, cosine_sim, asins, top_k=5):
+    """For each row, the asins of the top_k most similar items, skipping the first (the item itself)."""
+    order = _ranked(cosine_sim[rows])[:, 1:top_k + 1]
+    return [asins[o].tolist() for o in order]
+
+
+def content_batch(rows, cosine_sim, asins, prices, ratings, lim=5, min_rate=2, keep=None):
+    """
+    Batched content_based_filter.recommend: items by decreasing similarity priced
+    within +-lim of the query item and rated at least min_rate.
+    keep : length of the returned lists, None for the full list.
+    """
+    order = _ranked(cosine_sim[rows])
+    ok = ((prices[order] >= prices[rows, None] - lim) & (prices[order] <= prices[rows, None] + lim) &
+          (ratings[order] >= min_rate))
+    return [asins[o[m]][:keep].tolist() for o, m in zip(order, ok)]
+
+
+def _ground_truth_job(rows):
+    m = _worker
+    return ground_truth_batch(rows, m['cosine_sim'], m['asins'], m['top_k'])
+
+
+def _content_job(rows):
+    m = _worker
+    return content_batch(rows, m['cosine_sim'], m['asins'], m['prices'], m['ratings'],
+                         m['lim'], m['min_rate'], m['keep'])
+
+
+def _collaborative_job(asins):
+    from models import collaborative_model_based
+    m = _worker
+    recs, failures = [], 0
+    for asin in asins:
+        try:
+            recs.append(list(collaborative_model_based.recommend(asin, m['svd_model'], m['corr_thresh'], m['top_n'])))
+        except Exception:
+            recs.append([])
+            failures += 1
+    return recs, failures
+
+
+def _batches(items, batch_size):
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def data_version(path):
+    """(mtime_ns, size) of a data file: cache keys change when the file is rebuilt."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class OutputCache:
+    """
+    Per-model outputs pickled in cache_dir, keyed by model name and a hash of its
+    inputs (evaluate puts the data file's data_version in every key).
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+
+    def path(self, name, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'{name}_{digest}.pkl')
+
+    def get_or_compute(self, name, key, compute):
+        if self.cache_dir is None:
+            return compute()
+        path = self.path(name, key)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        value = compute()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+        return value
+
+
+def evaluate(test_asins, models, k=5, n_jobs=None, batch_size=256, cache_dir=None,
+             diversity_k=None, content_params=None, collaborative_params=None, popularity_params=None,
+             store_dir=None):
+    """
+    Evaluate popularity, content based and collaborative recommendations on test_asins.
+    Ground truth sets and recommendations are computed for all items in batches
+    on a process pool sharing the loaded models; each model's outputs are cached
+    in cache_dir when given.
+    diversity_k : length of the lists scored for diversity (k by default)
+    store_dir : publish the arrays to a serving.model_store there, the workers map
+    them instead of receiving a pickled copy each
+    Returns a DataFrame with one row per (asin, method): precision, recall, ndcg,
+    map (average precision) and diversity, scored with the vectorized metrics.
+    Its attrs hold 'timings' (seconds per model, cache reads included) and
+    'collaborative_failures' (test asins the collaborative model raised on).
+    """
+    content_params = content_params or {'lim': 5, 'min_rate': 2}
+    collaborative_params = collaborative_params or {'corr_thresh': 0.3, 'top_n': 10}
+    popularity_params = popularity_params or {'rev_count': 25, 'rating': 3, 'sentiment': 0.6}
+    diversity_k = diversity_k or k
+    cache = OutputCache(cache_dir)
+    timings = {}
+    failures = 0
+
+    rows_all = positions(test_asins, models['indices'])
+    known = rows_all >= 0
+    test_asins = [a for a, ok in zip(test_asins, known) if ok]
+    rows = rows_all[known]
+    row_batches = _batches(rows, batch_size)
+    data = {'df_path': models['df_path'], 'data_version': data_version(models['df_path'])}
+    base_key = dict(data, asins=test_asins)
+
+    shared = dict(models, top_k=k, keep=max(k, diversity_k), **content_params, **collaborative_params)
+    if store_dir is not None:
+        arrays = {key: models[key] for key in SHARED_ARRAYS}
+        arrays['cbf_df'] = arrays['cbf_df'][content_based_filter.MODEL_COLUMNS]  # the texts are not used
+        version = model_store.ModelStore(store_dir).publish('evaluation', arrays, {'df_path': models['df_path']})
+        shared = {key: value for key, value in shared.items() if key not in SHARED_ARRAYS}
+        shared['_store'] = (store_dir, 'evaluation', version)
+    with Pool(n_jobs or cpu_count(), initializer=_init_worker, initargs=(shared,)) as pool:
+        def run(job, batches):
+            return [r for out in pool.map(job, batches) for r in out]
+
+        start = time.perf_counter()
+        with span('evaluation.ground_truth', rows=len(rows)):
+            truth = cache.get_or_compute('ground_truth', dict(base_key, k=k),
+                                         lambda: run(_ground_truth_job, row_batches))
+        timings['ground_truth'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with span('evaluation.content', rows=len(rows)):
+            content = cache.get_or_compute('content', dict(base_key, keep=shared['keep'], **content_params),
+                                           lambda: run(_content_job, row_batches))
+        timings['content'] = time.perf_counter() - start
+
+        collaborative = None
+        if models.get('svd_model') is not None:
+            start = time.perf_counter()
+
+            def compute_collaborative():
+                out = pool.map(_collaborative_job, _batches(test_asins, batch_size))
+                return [r for recs, _ in out for r in recs], sum(f for _, f in out)
+
+            key = dict(base_key, sample_frac=models.get('sample_frac'), **collaborative_params)
+            with span('evaluation.collaborative', rows=len(test_asins)):
+                # recommendations and number of failures, cached together
+                collaborative, failures = cache.get_or_compute('collaborative_outputs', key, compute_collaborative)
+            count('evaluation.collaborative_failures', failures)
+            timings['collaborative'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with span('evaluation.popularity'):
+        popular = cache.get_or_compute('popularity', dict(data, **popularity_params),
+                                       lambda: popularity_filter.recommend(models['df_path'], **popularity_params))
+    timings['popularity'] = time.perf_counter() - start
+
+    asin_to_idx = {asin: i for i, asin in enumerate(models['asins'])}
+    n_items = len(models['asins'])
+    width = max(k, diversity_k)
+    has_truth = np.array([len(t) > 0 for t in truth], dtype=bool)
+    relevant = metrics.to_csr(metrics.encode(truth, asin_to_idx, k), n_items)[has_truth]
+    test_asins = np.array(test_asins, dtype=object)[has_truth]
+
+    method_recs = [("Popularité", [popular] * len(truth)), ("Basé contenu", content)]
+    if collaborative is not None:
+        method_recs.append(("Collaboratif", collaborative))
+
+    results = []
+    for method, recs in method_recs:
+        encoded = metrics.encode(recs, asin_to_idx, width)[has_truth]
+        results.append(pd.DataFrame({
+            'asin': test_asins,
+            'method': method,
+            'precision': metrics.precision_at_k(encoded, relevant, k, n_items),
+            'recall': metrics.recall_at_k(encoded, relevant, k, n_items),
+            'ndcg': metrics.ndcg_at_k(encoded, relevant, k, n_items),
+            'map': metrics.average_precision_at_k(encoded, relevant, k, n_items),
+            'diversity': metrics.intra_list_diversity(encoded, diversity_k, similarity=models['cosine_sim'])
+        }))
+    results = pd.concat(results, ignore_index=True)
+    results.attrs.update(timings=timings, collaborative_failures=failures)
+    return results
@@ -0,0 +1,152 @@
+# Ranking metrics over many recommendation lists in one vectorized pass.
+# Lists are padded int arrays: recs[i, j] is the item id at rank j of list i,
+# PAD (-1) for padding or unknown items. Relevance is a padded int array (n, R)
+# or a CSR matrix (n, n_items) whose nonzeros are the relevant items.
+import numpy as np
+from scipy import sparse
+
+PAD = -1
+
+
+def encode(lists, item_index, length=None):
+    """
+    Padded int array of item ids from lists of asins.
+    item_index : dict asin -> item id; unknown asins become PAD but keep their rank.
+    length : width of the array, the longest list by default.
+    """
+    length = length if length is not None else max((len(l) for l in lists), default=0)
+    out = np.full((len(lists), length), PAD, dtype=np.int64)
+    for i, items in enumerate(lists):
+        ids = [item_index.get(a, PAD) for a in items[:length]]
+        out[i, :len(ids)] = ids
+    return out
+
+
+def to_csr(relevant, n_items):
+    """Binary CSR (n, n_items) from a padded relevance array (returned unchanged if already sparse)."""
+    if sparse.issparse(relevant):
+        return sparse.csr_matrix(relevant)
+    relevant = np.asarray(relevant)
+    rows, cols = np.nonzero(relevant != PAD)
+    items = relevant[rows, cols]
+    mat = sparse.csr_matrix((np.ones(len(items), dtype=np.int8), (rows, items)),
+                            shape=(relevant.shape[0], n_items))
+    mat.data[:] = 1  # duplicated relevant items count once
+    return mat
+
+
+def hits(recs, relevant, n_items=None, k=None):
+    """Boolean (n, k) array: recs[i, j] is relevant for list i."""
+    recs = np.asarray(recs)[:, :k]
+    if n_items is None:
+        n_items = relevant.shape[1] if sparse.issparse(relevant) else \
+            int(max(recs.max(initial=0), np.asarray(relevant).max(initial=0))) + 1
+    rel = to_csr(relevant, n_items)
+    rel.sort_indices()
+    rel_keys = np.repeat(np.arange(rel.shape[0], dtype=np.int64), np.diff(rel.indptr)) * rel.shape[1] + rel.indices
+    rec_keys = np.arange(recs.shape[0], dtype=np.int64)[:, None] * rel.shape[1] + recs
+    return np.isin(rec_keys, rel_keys) & (recs != PAD)
+
+
+def n_relevant(relevant, n_items=None):
+    """Number of distinct relevant items of each list."""
+    if sparse.issparse(relevant):
+        return np.diff(sparse.csr_matrix(relevant).indptr)
+    relevant = np.asarray(relevant)
+    srt = np.sort(relevant, axis=1)
+    distinct = (srt != PAD) & np.concatenate([np.ones((len(srt), 1), bool), srt[:, 1:] != srt[:, :-1]], axis=1)
+    return distinct.sum(axis=1)
+
+
+def precision_at_k(recs, relevant, k, n_items=None):
+    return hits(recs, relevant, n_items, k).sum(axis=1) / k if k > 0 else np.zeros(len(recs))
+
+
+def recall_at_k(recs, relevant, k, n_items=None):
+    n_rel = n_relevant(relevant)
+    h = hits(recs, relevant, n_items, k).sum(axis=1)
+    return np.divide(h, n_rel, out=np.zeros(len(h)), where=n_rel > 0)
+
+
+def _discounts(k):
+    return 1 / np.log2(np.arange(2, k + 2))
+
+
+def ndcg_at_k(recs, relevant, k, n_items=None):
+    """Binary-relevance NDCG@k."""
+    h = hits(recs, relevant, n_items, k)
+    disc = _discounts(h.shape[1])
+    dcg = (h * disc).sum(axis=1)
+    ideal = np.concatenate([[0], np.cumsum(_discounts(k))])[np.minimum(n_relevant(relevant), k)]
+    return np.divide(dcg, ideal, out=np.zeros(len(dcg)), where=ideal > 0)
+
+
+def average_precision_at_k(recs, relevant, k, n_items=None):
+    """AP@k of each list, MAP is its mean."""
+    h = hits(recs, relevant, n_items, k)
+    prec = np.cumsum(h, axis=1) / np.arange(1, h.shape[1] + 1)
+    denom = np.minimum(n_relevant(relevant), k)
+    return np.divide((prec * h).sum(axis=1), denom, out=np.zeros(len(h)), where=denom > 0)
+
+
+def intra_list_diversity(recs, k=None, similarity=None, item_vectors=None):
+    """
+    1 - mean pairwise similarity within each list (0 for lists of less than two items).
+    similarity : dense (n_items, n_items) similarity matrix, or
+    item_vectors : L2 normalized item vectors (dense or sparse), similarity being
+    their dot product; the pair sum is then (|sum v|^2 - sum |v|^2) / 2.
+    """
+    recs = np.asarray(recs)[:, :k]
+    valid = recs != PAD
+    safe = np.where(valid, recs, 0)
+    n = valid.sum(axis=1)
+    if similarity is not None:
+        sims = np.asarray(similarity)[safe[:, :, None], safe[:, None, :]]
+        pair_mask = valid[:, :, None] & valid[:, None, :]
+        np.einsum('ijj->ij', pair_mask)[:] = False
+        pair_sum = (sims * pair_mask).sum(axis=(1, 2)) / 2
+    else:
+        rows = np.repeat(np.arange(len(recs)), valid.sum(axis=1))
+        select = sparse.csr_matrix((np.ones(len(rows)), (rows, recs[valid])),
+                                   shape=(len(recs), item_vectors.shape[0]))
+        summed = select @ item_vectors
+        if sparse.issparse(summed):
+            sq_sum = np.asarray(summed.multiply(summed).sum(axis=1)).ravel()
+            norms = np.asarray(item_vectors.multiply(item_vectors).sum(axis=1)).ravel()
+        else:
+            sq_sum = (summed ** 2).sum(axis=1)
+            norms = (np.asarray(item_vectors) ** 2).sum(axis=1)
+        pair_sum = (sq_sum - (norms[safe] * valid).sum(axis=1)) / 2
+    n_pairs = n * (n - 1) / 2
+    return np.where(n_pairs > 0, 1 - np.divide(pair_sum, n_pairs, out=np.zeros(len(n)), where=n_pairs > 0), 0.0)
+
+
+def catalog_coverage(recs, n_items, k=None):
+    """Fraction of the catalog appearing in at least one list (single value)."""
+    recs = np.asarray(recs)[:, :k]
+    return len(np.unique(recs[recs != PAD])) / n_items if n_items else 0.0
+
+
+def novelty(recs, item_counts, n_users, k=None):
+    """Mean self-information -log2(count / n_users) of the recommended items of each list."""
+    recs = np.asarray(recs)[:, :k]
+    valid = recs != PAD
+    p = np.clip(np.asarray(item_counts, dtype=float) / n_users, 1e-12, 1)
+    info = -np.log2(p)[np.where(valid, recs, 0)] * valid
+    n = valid.sum(axis=1)
+    return np.divide(info.sum(axis=1), n, out=np.zeros(len(n)), where=n > 0)
+
+
+def summary(recs, relevant, k, n_items, similarity=None, item_vectors=None, item_counts=None, n_users=None):
+    """Dict of per-list metric arrays plus the catalog coverage, in one call."""
+    rel = to_csr(relevant, n_items)
+    out = {'precision': precision_at_k(recs, rel, k, n_items),
+           'recall': recall_at_k(recs, rel, k, n_items),
+           'ndcg': ndcg_at_k(recs, rel, k, n_items),
+           'ap': average_precision_at_k(recs, rel, k, n_items)}
+    if similarity is not None or item_vectors is not None:
+        out['diversity'] = intra_list_diversity(recs, k, similarity, item_vectors)
+    if item_counts is not None:
+        out['novelty'] = novelty(recs, item_counts, n_users, k)
+    out['coverage'] = catalog_coverage(recs, n_items, k)
+    return out
@@ -1,29 +1,55 @@
-from data_processing import data_cleaning, data_merge, feature_genration
+from data_processing import data_cleaning, data_merge, feature_genration, near_duplicates
 from models import lin_svc, nb
+from monitoring import instrumentation
+from monitoring.instrumentation import file_size, span
+from monitoring.memory import memory_report
 import pandas as pd
+import sys
 
-def run_all():
-    rev_path = 'data/raw/All_Beauty_25.json.gz'
+def run_all(category='All_Beauty'):
+    rev_path = f'data/raw/{category}_25.json.gz'
     rev_clean_path = 'data/processed/clean_reviews.json.gz'
-    meta_path = 'data/raw/meta_All_Beauty_25.json.gz'
+    meta_path = f'data/raw/meta_{category}_25.json.gz'
     meta_clean_path = 'data/processed/clean_meta.json.gz'
 
     # Nettoyage
-    data_cleaning.reviews_clean(rev_path, rev_clean_path)
-    data_cleaning.meta_clean(meta_path, meta_clean_path)
+    with span('run_all.reviews_clean', bytes_read=file_size(rev_path)):
+        data_cleaning.reviews_clean(rev_path, rev_clean_path)
+    with span('run_all.meta_clean', bytes_read=file_size(meta_path)):
+        data_cleaning.meta_clean(meta_path, meta_clean_path)
+    # Quasi-doublons : clusters utilisés par les recommandations basées contenu
+    with span('run_all.near_duplicates', bytes_read=file_size(meta_clean_path)):
+        near_duplicates.run(meta_clean_path)
     
     # Entraînement
-    lin_svc.train(rev_clean_path)
-    nb.train(rev_clean_path)
+    with span('run_all.train_lin_svc', bytes_read=file_size(rev_clean_path)):
+        lin_svc.train(rev_clean_path)
+    with span('run_all.train_nb', bytes_read=file_size(rev_clean_path)):
+        nb.train(rev_clean_path)
     
     # Génération des features
-    feature_genration.all_feature(rev_clean_path)
+    with span('run_all.all_feature', bytes_read=file_size(rev_clean_path)):
+        features = feature_genration.all_feature(rev_clean_path)
+    # Mémoire des tables en sortie (RECO_MEMORY_BUDGET=1 pour les types compacts),
+    # chacune libérée avant l'étape suivante
+    memory = {'features': memory_report({'features': features})[0]['mb']}
+    del features
     
     # Fusion finale
-    data_merge.final_data(dest_path='data/traitees/final.json.gz')
+    with span('run_all.final_data'):
+        final = data_merge.final_data(dest_path='data/traitees/final.json.gz')
+    memory['final'] = memory_report({'final': final})[0]['mb']
+    del final
+    print(f"Mémoire (Mo) : {memory}")
+    
+    # Trace des étapes (RECO_TRACE=1)
+    if instrumentation.ENABLED:
+        instrumentation.export_chrome_trace('data/preprocessing_trace.json')
+        instrumentation.export_json('data/preprocessing_metrics.json')
 
     # Sauvegarder un résumé ou indicateur que c'est prêt
     print("Prétraitement terminé et fichiers enregistrés.")
 
 if __name__ == "__main__":
-    run_all()
+    # python "final preprocessing.py" [catégorie du jeu brut, All_Beauty par défaut]
+    run_all(*sys.argv[1:2])
@@ -0,0 +1,205 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+# Disabled by default: span() then returns a shared no-op object and count()/observe()
+# return right away, so instrumented code pays one global lookup per call.
+ENABLED = os.environ.get('RECO_TRACE', '') not in ('', '0')
+# Finished spans kept for the exports; the oldest are dropped past this number, the
+# per-name totals of summary() still count them.
+MAX_SPANS = int(os.environ.get('RECO_TRACE_MAX_SPANS', 100000))
+
+_lock = threading.Lock()
+_spans = deque(maxlen=MAX_SPANS)  # finished spans: dicts name, start, duration, thread, attrs
+_span_totals = {}  # name -> calls, total_s, max_s of every finished span
+_dropped = 0
+_counters = defaultdict(float)
+_histograms = {}
+_origin = time.perf_counter()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Drop every recorded span, counter and histogram."""
+    global _origin, _dropped
+    with _lock:
+        _spans.clear()
+        _span_totals.clear()
+        _dropped = 0
+        _counters.clear()
+        _histograms.clear()
+        _origin = time.perf_counter()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """Timed section; attributes (rows, bytes, ...) can be added while it runs with set()."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        record = {'name': self.name, 'start': self.start - _origin, 'duration': duration,
+                  'thread': threading.get_ident(), 'pid': os.getpid(), 'attrs': self.attrs}
+        _record(record)
+        observe(f'{self.name}.seconds', duration)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def _record(record):
+    global _dropped
+    with _lock:
+        if len(_spans) == _spans.maxlen:
+            _dropped += 1
+        _spans.append(record)
+        agg = _span_totals.setdefault(record['name'], {'calls': 0, 'total_s': 0.0, 'max_s': 0.0})
+        agg['calls'] += 1
+        agg['total_s'] += record['duration']
+        agg['max_s'] = max(agg['max_s'], record['duration'])
+
+
+def span(name, **attrs):
+    """Context manager timing a block: `with span('meta_clean', path=p) as s: ... s.set(rows=n)`."""
+    if not ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name=None):
+    """Decorator wrapping every call of the function in a span (module.function by default)."""
+    def decorator(fn):
+        label = name or f'{fn.__module__}.{fn.__name__}'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Add value to counter name."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] += value
+
+
+class Histogram:
+    """Count, sum, min, max and power-of-two buckets of observed values."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = defaultdict(int)  # upper bound 2**i -> count
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.buckets[math.ceil(math.log2(value)) if value > 0 else None] += 1
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'mean': self.sum / self.count if self.count else None,
+                'buckets': {('<=0' if b is None else f'<=2^{b}'): n for b, n in sorted(
+                    self.buckets.items(), key=lambda item: -math.inf if item[0] is None else item[0])}}
+
+
+def observe(name, value):
+    """Record value in histogram name."""
+    if not ENABLED:
+        return
+    with _lock:
+        _histograms.setdefault(name, Histogram()).add(value)
+
+
+def file_size(path):
+    """
+    Size of path in bytes (0 when it cannot be read), for bytes-read attributes;
+    None without a stat call when tracing is disabled.
+    """
+    if not ENABLED:
+        return None
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def summary():
+    """
+    Per span name: calls, total and max seconds; plus counters, histograms and the
+    number of spans dropped from the exports (MAX_SPANS).
+    """
+    with _lock:
+        per_name = {name: dict(agg) for name, agg in _span_totals.items()}
+        counters = dict(_counters)
+        histograms = {name: h.to_dict() for name, h in _histograms.items()}
+        dropped = _dropped
+    return {'spans': per_name, 'counters': counters, 'histograms': histograms, 'dropped_spans': dropped}
+
+
+def export_json(path):
+    """Write the summary and every recorded span as JSON."""
+    with _lock:
+        spans = list(_spans)
+    with open(path, 'w') as f:
+        json.dump(dict(summary(), events=spans), f, indent=2, default=str)
+
+
+def export_chrome_trace(path):
+    """Write spans and counters in the Chrome trace event format (chrome://tracing, Perfetto)."""
+    with _lock:
+        spans = list(_spans)
+        counters = dict(_counters)
+    events = [{'name': s['name'], 'ph': 'X', 'ts': s['start'] * 1e6, 'dur': s['duration'] * 1e6,
+               'pid': s['pid'], 'tid': s['thread'], 'args': s['attrs']} for s in spans]
+    end = max((e['ts'] + e['dur'] for e in events), default=0)
+    events += [{'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {'value': value}}
+               for name, value in counters.items()]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
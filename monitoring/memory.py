@@ -0,0 +1,50 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+def deep_size(obj, _seen=None):
+    """
+    Approximate resident size in bytes of obj and what it references:
+    deep memory_usage for pandas objects, nbytes for numpy and scipy sparse
+    arrays, recursive getsizeof for containers and plain objects.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(deep_size(x, seen) for x in obj.ravel())
+        return obj.nbytes
+    if all(hasattr(obj, a) for a in ('data', 'indices', 'indptr')):  # scipy CSR / CSC
+        return sum(getattr(obj, a).nbytes for a in ('data', 'indices', 'indptr'))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return size + sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_size(x, seen) for x in obj)
+    if hasattr(obj, '__dict__'):
+        return size + deep_size(vars(obj), seen)
+    if hasattr(obj, '__slots__'):
+        return size + sum(deep_size(getattr(obj, s), seen) for s in obj.__slots__ if hasattr(obj, s))
+    return size
+
+
+def memory_report(objects):
+    """
+    List of dicts (object, type, mb) for a {name: object} mapping, largest first,
+    with a 'total' row at the end.
+    """
+    rows = [{'object': name, 'type': type(obj).__name__, 'mb': deep_size(obj) / 2 ** 20}
+            for name, obj in objects.items()]
+    rows.sort(key=lambda r: r['mb'], reverse=True)
+    rows.append({'object': 'total', 'type': '', 'mb': sum(r['mb'] for r in rows)})
+    for row in rows:
+        row['mb'] = round(row['mb'], 2)
+    return rows
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import linear_kernel
+from data_processing.tables import read_table
+from monitoring.instrumentation import count, span
+from recommendation_filters import embeddings
 
 
 def cbf_data(df_path='final.json.gz'):
@@ -11,31 +15,201 @@ def cbf_data(df_path='final.json.gz'):
     output :
     DataFrame
     """
-    main_df = pd.read_json(df_path)
+    main_df = read_table(df_path, columns=['asin', 'description', 'title', 'price', 'overall'])
     feat1 = ['asin', 'description', 'title', 'price']
     feat2 = ['asin', 'overall']
     df1 = main_df.loc[:, feat1].drop_duplicates().reset_index().drop('index', axis=1) #faetures to check duplicate records
-    df2 = main_df.loc[:, feat2].groupby('asin').mean() # mean of overall corresponding to 1 asin(many ratings for 1 asin)
+    df2 = main_df.loc[:, feat2].groupby('asin', observed=True).mean() # mean of overall corresponding to 1 asin(many ratings for 1 asin)
     return df1.merge(df2, on='asin')
 
 
-def indices(df):
+def indices(df, clusters=None):
     """
     Generate Series with itemID as index and index of itemID in the dataframe as value.
+    clusters : near_duplicates.load_clusters Series; the asins of a cluster missing from
+    df (collapsed by representatives) map to the row of their representative.
     """
-    return pd.Series(df.index, index=df['asin']).drop_duplicates() # index is asin and value is index(0,1,2,3....). done to keep record of index corresponding to asin.
+    idx = pd.Series(df.index, index=df['asin']).drop_duplicates() # index is asin and value is index(0,1,2,3....). done to keep record of index corresponding to asin.
+    if clusters is None:
+        return idx
+    keys = clusters.reindex(idx.index).fillna(pd.Series(idx.index, index=idx.index))
+    rows = pd.Series(idx.to_numpy(), index=keys.to_numpy())
+    rows = rows[~rows.index.duplicated()]
+    members = clusters[~clusters.index.isin(idx.index) & clusters.isin(rows.index)]
+    return pd.concat([idx, pd.Series(rows[members].to_numpy(), index=members.index)])
+
+
+def representatives(df, clusters):
+    """
+    Rows of df (cbf_data) keeping one product per near-duplicate cluster (its first row),
+    so the similarity index is built over the cluster representatives only.
+    """
+    keys = df['asin'].map(clusters).fillna(df['asin'])
+    return df[~keys.duplicated()].reset_index(drop=True)
+
+
+def collapse(recs, clusters, query=None):
+    """
+    recs with one asin per near-duplicate cluster (the first); the query's cluster is
+    represented by the query item itself, so the list holds it as without clusters.
+    """
+    query_key = None if query is None else clusters.get(query, query)
+    seen = set()
+    out = []
+    for asin in recs:
+        key = clusters.get(asin, asin)
+        if key not in seen:
+            seen.add(key)
+            out.append(query if key == query_key else asin)
+    return out
 
 
 def cosine_sim(df):
     """
     Generate cosine similarity with TfidfVectorizer and linear_kernel
     """
-    tfidf = TfidfVectorizer(stop_words='english') 
-    tfidf_mat = tfidf.fit_transform(df) #generrating vectors from text(description)
-    return linear_kernel(tfidf_mat, tfidf_mat) #making a matrix which gives similarity between different procucts.one vector has similarity of all products related to that product.
+    with span('content.cosine_sim', rows=len(df)):
+        tfidf = TfidfVectorizer(stop_words='english') 
+        tfidf_mat = tfidf.fit_transform(df) #generrating vectors from text(description)
+        return linear_kernel(tfidf_mat, tfidf_mat) #making a matrix which gives similarity between different procucts.one vector has similarity of all products related to that product.
 #Kernels are measures of similarity
 
-def recommend(prod_asin, cosine_sim, indices, cbf_df, lim=5, min_rate=2):
+
+def top_k_block(left, right, k, offset=0, chunk_size=8192, best=None):
+    """
+    Top k columns per row of left @ right.T (l2 normalized tf-idf rows: cosine similarity).
+    Column ids are offset + row of right; best=(ids, scores) of earlier right blocks is merged in.
+    Returns (ids int64, scores float64), (n_left, k) each, by decreasing score, -1 / 0 padded.
+    Only positive similarities are kept: which of the tied zero columns would fill a row is arbitrary.
+    """
+    n = left.shape[0]
+    if best is None:
+        ids, scores = np.full((n, k), -1, dtype=np.int64), np.full((n, k), -np.inf)
+    else:
+        ids, scores = best
+        scores = np.where(ids >= 0, scores, -np.inf)
+    for start in range(0, right.shape[0], chunk_size):
+        sims = (left @ right[start:start + chunk_size].T).toarray()
+        cand = np.broadcast_to(np.arange(offset + start, offset + start + sims.shape[1]), sims.shape)
+        all_scores, all_ids = np.hstack([scores, sims]), np.hstack([ids, cand])
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k] if all_scores.shape[1] > k else \
+            np.broadcast_to(np.arange(all_scores.shape[1]), all_scores.shape)
+        scores, ids = np.take_along_axis(all_scores, top, 1), np.take_along_axis(all_ids, top, 1)
+    order = np.lexsort((ids, -scores), axis=1)  # decreasing score, then lower id
+    ids, scores = np.take_along_axis(ids, order, 1), np.take_along_axis(scores, order, 1)
+    missing = ~(scores > 0)
+    return np.where(missing, -1, ids), np.where(missing, 0.0, scores)
+
+
+class NeighbourSimilarity:
+    """
+    Row indexable stand-in for the cosine_sim matrix built from a top-k neighbour table:
+    row i holds the stored similarities of item i (itself included) and 0 elsewhere.
+    recommend() ranks the stored neighbours only (row()), without building the dense row.
+    neighbours : int (n, k) row positions, -1 padded ; scores : float (n, k)
+    """
+
+    def __init__(self, neighbours, scores):
+        self.neighbours = neighbours
+        self.scores = scores
+        self.shape = (len(neighbours), len(neighbours))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        scalar = np.ndim(rows) == 0
+        rows = np.atleast_1d(rows)
+        nbrs, scores = self.neighbours[rows], self.scores[rows]
+        out = np.zeros((len(rows), self.shape[1]))
+        r, c = np.nonzero(nbrs >= 0)
+        out[r, nbrs[r, c]] = scores[r, c]
+        return out[0] if scalar else out
+
+    def row(self, i):
+        """(positions, scores) of the stored neighbours of item i."""
+        nbrs = np.asarray(self.neighbours[i])
+        keep = nbrs >= 0
+        return nbrs[keep], np.asarray(self.scores[i])[keep]
+
+
+def cosine_sim_top_k(df, k=100, block_size=2048):
+    """
+    cosine_sim keeping the k most similar items per row, computed by blocks of rows
+    (memory O(n * k) instead of O(n^2)).
+    """
+    with span('content.cosine_sim_top_k', rows=len(df)):
+        tfidf_mat = TfidfVectorizer(stop_words='english').fit_transform(df)
+        k = min(k, tfidf_mat.shape[0])
+        blocks = [top_k_block(tfidf_mat[i:i + block_size], tfidf_mat, k)
+                  for i in range(0, tfidf_mat.shape[0], block_size)]
+        return NeighbourSimilarity(np.vstack([b[0] for b in blocks]), np.vstack([b[1] for b in blocks]))
+
+
+def cosine_sim_quantized(df, n_components=256, dtype='int8'):
+    """
+    cosine_sim on truncated SVD embeddings of the TF-IDF rows stored as int8 (per row
+    scales) or float16: rows are scored on demand from n x n_components codes.
+    """
+    with span('content.cosine_sim_quantized', rows=len(df)):
+        return embeddings.build(df, n_components, dtype)[0]
+
+
+def load_neighbours(path, df):
+    """
+    NeighbourSimilarity over the rows of df (cbf_data) from a neighbour table
+    (asin, neighbours: list of asins, scores) such as the spark_similarity output.
+    Neighbours missing from df are skipped.
+    """
+    with span('content.load_neighbours') as s:
+        table = read_table(path, columns=['asin', 'neighbours', 'scores'])
+        idx = indices(df)
+        lengths = table['neighbours'].map(len).to_numpy()
+        k = int(lengths.max()) if len(lengths) else 0
+        rows = np.repeat(idx.reindex(table['asin']).fillna(-1).to_numpy(dtype=np.int64), lengths)
+        flat = np.concatenate(table['neighbours'].tolist()) if k else np.array([])
+        cols = idx.reindex(flat).fillna(-1).to_numpy(dtype=np.int64)
+        slots = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        keep = (rows >= 0) & (cols >= 0)
+        neighbours = np.full((len(df), k), -1, dtype=np.int64)
+        scores = np.zeros((len(df), k))
+        neighbours[rows[keep], slots[keep]] = cols[keep]
+        scores[rows[keep], slots[keep]] = np.concatenate(table['scores'].tolist())[keep] if k else []
+        s.set(rows=len(table), k=k)
+        return NeighbourSimilarity(neighbours, scores)
+
+
+# columns of cbf_df read by recommend(); the texts are only needed to build cosine_sim
+MODEL_COLUMNS = ['asin', 'price', 'overall']
+
+
+def model_arrays(cbf_df, indices, cosine_sim):
+    """
+    (cbf_df, indices, cosine_sim) as the {key: array} values of a serving.model_store
+    publish; cbf_df is reduced to MODEL_COLUMNS, a NeighbourSimilarity is stored as
+    its two (n, k) arrays, a QuantizedSimilarity as its codes and scales.
+    """
+    values = {'cbf_df': cbf_df[MODEL_COLUMNS], 'indices': indices}
+    if isinstance(cosine_sim, NeighbourSimilarity):
+        values.update(neighbours=cosine_sim.neighbours, scores=cosine_sim.scores)
+    elif isinstance(cosine_sim, embeddings.QuantizedSimilarity):
+        values.update(cosine_sim.arrays())
+    else:
+        values['cosine_sim'] = cosine_sim
+    return values
+
+
+def model_from_arrays(values):
+    """(cbf_df, indices, cosine_sim) back from model_arrays values (memory-mapped arrays)."""
+    if 'neighbours' in values:
+        cosine_sim = NeighbourSimilarity(values['neighbours'], values['scores'])
+    elif 'codes' in values:
+        cosine_sim = embeddings.QuantizedSimilarity.from_arrays(values)
+    else:
+        cosine_sim = values['cosine_sim']
+    return values['cbf_df'], values['indices'], cosine_sim
+
+def recommend(prod_asin, cosine_sim, indices, cbf_df, lim=5, min_rate=2, clusters=None, top_n=None):
     """
     Recommend products for prod_asin
     cosine_sim = <cosine similarity matrix>
@@ -45,19 +219,60 @@ def recommend(prod_asin, cosine_sim, indices, cbf_df, lim=5, min_rate=2):
     deviation in price for similar priced item filtering
     min_rate=2
     minimum rating for item to be in list
+    clusters = <near-duplicate clusters> one product per cluster, prod_asin for its own
+    top_n = length of the list, None for every item passing the filters
+    """
+    with span('content.recommend') as s:
+        if clusters is None:
+            recs = _recommend(prod_asin, cosine_sim, indices, cbf_df, lim, min_rate, top_n)
+        else:
+            # collapsing shortens the list: rank more items until top_n are left
+            limit = None if top_n is None else 4 * top_n
+            while True:
+                ranked = _recommend(prod_asin, cosine_sim, indices, cbf_df, lim, min_rate, limit)
+                recs = collapse(ranked, clusters, query=prod_asin)[:top_n]
+                if limit is None or len(recs) == top_n or len(ranked) < limit:
+                    break
+                limit *= 4
+        s.set(results=len(recs))
+    count('content.recommend.calls')
+    return recs
+
+
+def _top(scores, items, top_n, first=None):
     """
+    Positions of the top_n highest scores, by decreasing score then item (as a stable
+    sort of a row); item first wins its ties (the query item before its exact duplicates).
+    """
+    items = np.where(items == first, -1, items) if first is not None else items
+    if top_n is not None and top_n < len(scores):
+        if top_n <= 0:
+            return np.empty(0, dtype=np.int64)
+        kth = np.partition(-scores, top_n - 1)[top_n - 1]
+        above = np.flatnonzero(-scores < kth)
+        ties = np.flatnonzero(-scores == kth)
+        ties = ties[np.argsort(items[ties], kind='stable')][:top_n - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((items[candidates], -scores[candidates]))]
+
+
+def _recommend(prod_asin, cosine_sim, indices, cbf_df, lim, min_rate, top_n=None):
     df = cbf_df
     if prod_asin not in indices:
         return []
     idx = indices[prod_asin] #index value corresponding to asin
-    price = df.iloc[idx]['price'] #price of asin given by user
-    sim_scores = list(enumerate(cosine_sim[idx])) #from similarity matrix only row corresponding to given asin is selected.
-
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True) #sorting according to heighest similarity value
-
-    # sim_scores = sim_scores[1:11]
-    prod_indices = [i[0] for i in sim_scores] #storing index value corresponding to similarity generated
-    temp = df.iloc[prod_indices] #subsetting dataframe according to indices generating
-
-    return temp[(temp['price'] >= price-lim) & (temp['price'] <= price+lim) &
-                (temp['overall'] >= min_rate)]['asin'].tolist() #to give products only in price range and with good rating.
+    prices = df['price'].to_numpy(dtype=float)
+    ratings = df['overall'].to_numpy(dtype=float)
+    price = prices[idx] #price of asin given by user
+    if isinstance(cosine_sim, NeighbourSimilarity):
+        items, scores = cosine_sim.row(idx) #only the stored neighbours are ranked
+    else:
+        scores = np.asarray(cosine_sim[idx]) #from similarity matrix only row corresponding to given asin is selected.
+        items = np.arange(len(scores))
+    #to give products only in price range and with good rating, filtered before ranking
+    ok = (prices[items] >= price - lim) & (prices[items] <= price + lim) & (ratings[items] >= min_rate)
+    items, scores = items[ok], scores[ok]
+    order = _top(scores, items, top_n, first=idx) #by heighest similarity value, the query item first
+    return df['asin'].iloc[items[order]].tolist()
@@ -0,0 +1,145 @@
+import sys
+import time
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from monitoring.instrumentation import span
+
+DTYPES = ('int8', 'float16')
+
+
+def tfidf_vectors(descriptions):
+    """l2 normalized TF-IDF rows, as in content_based_filter.cosine_sim."""
+    return TfidfVectorizer(stop_words='english').fit_transform(descriptions)
+
+
+def reduce(tfidf, n_components=256, seed=0):
+    """Truncated SVD of the TF-IDF rows, l2 normalized again, float32 (n_items, n_components)."""
+    n_components = min(n_components, tfidf.shape[1] - 1, tfidf.shape[0] - 1)
+    with span('embeddings.svd', rows=tfidf.shape[0], components=n_components):
+        latent = TruncatedSVD(n_components, random_state=seed).fit_transform(tfidf)
+    return normalize(latent).astype(np.float32)
+
+
+def quantize(vectors, dtype='int8'):
+    """
+    (codes, scales): int8 codes with one float32 scale per row (row max / 127),
+    or float16 values with unit scales.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f'dtype must be one of {DTYPES}')
+    if dtype == 'float16':
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedSimilarity:
+    """
+    Cosine similarity on quantized item embeddings, row indexable like the
+    cosine_sim matrix (recommend() works unchanged): row i is computed on demand as
+    (codes[i] . codes[j]) * scales[i] * scales[j], in float32 blocks.
+    """
+
+    def __init__(self, codes, scales, block_size=65536):
+        self.codes = codes
+        self.scales = scales
+        self.block_size = block_size
+        self.shape = (len(codes), len(codes))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def scores(self, rows):
+        """(len(rows), n_items) float32 similarities."""
+        left = self.codes[rows].astype(np.float32) * self.scales[rows, None]
+        out = np.empty((len(left), self.shape[1]), dtype=np.float32)
+        for start in range(0, self.shape[1], self.block_size):
+            block = self.codes[start:start + self.block_size].astype(np.float32)
+            out[:, start:start + len(block)] = (left @ block.T) * self.scales[start:start + len(block)]
+        return out
+
+    def __getitem__(self, rows):
+        scalar = np.ndim(rows) == 0
+        out = self.scores(np.atleast_1d(rows))
+        return out[0] if scalar else out
+
+    def top_k(self, rows, k):
+        """(ids, scores) of the k most similar items of each row, by decreasing score then item."""
+        scores = self.scores(np.atleast_1d(rows))
+        k = min(k, scores.shape[1])
+        # every item tied with the k-th score is a candidate, the ties at the cut go to the lowest items
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+        top = np.empty((len(scores), k), dtype=np.int64)
+        for i, (row_scores, cut) in enumerate(zip(scores, kth)):
+            candidates = np.flatnonzero(row_scores >= cut)
+            top[i] = candidates[np.lexsort((candidates, -row_scores[candidates]))][:k]
+        return top, np.take_along_axis(scores, top, 1)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def arrays(self):
+        """Values for serving.model_store.publish."""
+        return {'codes': self.codes, 'scales': self.scales}
+
+    @classmethod
+    def from_arrays(cls, values):
+        return cls(values['codes'], values['scales'])
+
+
+def build(descriptions, n_components=256, dtype='int8', seed=0):
+    """(QuantizedSimilarity over the reduced TF-IDF of descriptions, TF-IDF matrix)."""
+    tfidf = tfidf_vectors(descriptions)
+    codes, scales = quantize(reduce(tfidf, n_components, seed), dtype)
+    return QuantizedSimilarity(codes, scales), tfidf
+
+
+def quality_report(tfidf, similarity, k=10, sample=500, seed=0):
+    """
+    Quantized neighbours against the exact TF-IDF ones on sample random items:
+    recall@k of the exact top k (the item itself excluded), mean absolute error of
+    the similarities, memory of both representations and time of one full row.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(tfidf.shape[0], min(sample, tfidf.shape[0]), replace=False))
+    k = min(k, tfidf.shape[0] - 1)
+
+    start = time.perf_counter()
+    exact = (tfidf[rows] @ tfidf.T).toarray()
+    exact_time = (time.perf_counter() - start) / len(rows)
+    start = time.perf_counter()
+    approx = similarity.scores(rows)
+    approx_time = (time.perf_counter() - start) / len(rows)
+
+    exact[np.arange(len(rows)), rows] = -np.inf  # the item itself
+    approx_masked = approx.copy()
+    approx_masked[np.arange(len(rows)), rows] = -np.inf
+    exact_top = np.argpartition(-exact, k - 1, axis=1)[:, :k]
+    approx_top = np.argpartition(-approx_masked, k - 1, axis=1)[:, :k]
+    recall = np.mean([len(set(e) & set(a)) / k for e, a in zip(exact_top, approx_top)])
+    exact[np.arange(len(rows)), rows] = 1.0
+    return {
+        'items': tfidf.shape[0], 'dimensions': similarity.codes.shape[1],
+        'dtype': str(similarity.codes.dtype), 'sample': len(rows), 'k': k,
+        f'recall@{k}': round(float(recall), 4),
+        'mean_abs_error': round(float(np.abs(exact - approx).mean()), 5),
+        'tfidf_mb': round(sum(getattr(tfidf, a).nbytes for a in ('data', 'indices', 'indptr')) / 2 ** 20, 2),
+        'embedding_mb': round(similarity.nbytes / 2 ** 20, 2),
+        'tfidf_row_ms': round(exact_time * 1000, 3),
+        'embedding_row_ms': round(approx_time * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    # python -m recommendation_filters.embeddings [final json] [n_components] [int8|float16]
+    from recommendation_filters.content_based_filter import cbf_data
+    source = sys.argv[1] if len(sys.argv) > 1 else 'data/traitees/final.json.gz'
+    sim, matrix = build(cbf_data(source)['description'], *(int(a) for a in sys.argv[2:3]), *sys.argv[3:4])
+    print(quality_report(matrix, sim))
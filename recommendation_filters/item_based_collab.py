@@ -1,6 +1,6 @@
-import pickle
+from serving import model_registry
 
 
 def ib_collab_recommend(df):
-    final_knn = pickle.load(open('./models/pickle_files/knn/final_knn.pkl', 'rb'))
+    final_knn = model_registry.get('knn.model')
     return final_knn.test(df)
@@ -1,4 +1,5 @@
-import pandas as pd
+from data_processing.tables import read_table
+from monitoring.instrumentation import file_size, span, traced
 
 
 # avg_rev_count = df['review_count'].mean()
@@ -7,6 +8,7 @@ import pandas as pd
 #4.098
 # avg_sentiment = df['reviewText_senti'].mean()
 #0.44
+@traced('popularity.recommend')
 def recommend(df_path, rev_count, rating, sentiment):
     """
     Returns the list of most popular item in the data based on its
@@ -15,10 +17,11 @@ def recommend(df_path, rev_count, rating, sentiment):
     sentiment = <Minimum sentiment required to be in list>
     sentiment ranges from -1 to 1, representing most negative, neutral and positive sentiment as -1, 0, 1
     """
-    df = pd.read_json(df_path)
-    df = df.loc[:, ['asin', 'overall', 'review_count', 'reviewText_senti', 'positive_prob']]
+    with span('popularity.read', bytes_read=file_size(df_path)) as s:
+        df = read_table(df_path, columns=['asin', 'overall', 'review_count', 'reviewText_senti', 'positive_prob'])
+        s.set(rows=len(df))
     # df1 = df.loc[:, ['asin', 'title']].drop_duplicates().reset_index().drop('index', axis=1)
-    pop_prod = df.groupby('asin').mean()
+    pop_prod = df.groupby('asin', observed=True).mean()
     # df1.merge(pop_prod, on='asin')
     pop_prod = pop_prod[(pop_prod['overall'] >= rating) &
                         (pop_prod['review_count'] >= rev_count) &
@@ -0,0 +1,131 @@
+import sys
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from data_processing.tables import read_table
+from monitoring.instrumentation import count, span
+from recommendation_filters import content_based_filter
+
+
+def item_vectors(descriptions, n_components=None, seed=0):
+    """
+    l2 normalized item vectors: the TF-IDF rows of content_based_filter.cosine_sim
+    (sparse), or their n_components latent factors (truncated SVD, dense) when given.
+    """
+    tfidf = TfidfVectorizer(stop_words='english').fit_transform(descriptions)
+    if n_components is None:
+        return tfidf.astype(np.float32)
+    latent = TruncatedSVD(min(n_components, tfidf.shape[1] - 1), random_state=seed).fit_transform(tfidf)
+    return normalize(latent).astype(np.float32)
+
+
+def sentiment_weights(positive_prob):
+    """Weight of a review in its reviewer's profile: 2p - 1, negative reviews push away."""
+    return 2 * np.asarray(positive_prob, dtype=np.float32) - 1
+
+
+class UserProfiles:
+    """
+    One l2 normalized profile per reviewer, the sentiment weighted sum of the vectors
+    of the items they reviewed; scores of a user are profile . item for every item.
+    users : sorted reviewerIDs ; profiles : (n_users, d) ; items : (n_items, d)
+    seen : (n_users, n_items) sparse mask of the reviewed items, excluded from results
+    asins : asin of each item row
+    """
+
+    def __init__(self, users, profiles, items, seen, asins):
+        self.users = users
+        self.profiles = profiles
+        self.items = items
+        self.seen = seen
+        self.asins = asins
+
+    def __len__(self):
+        return len(self.users)
+
+    def position(self, user):
+        pos = int(np.searchsorted(self.users, user))
+        if pos < len(self.users) and self.users[pos] == user:
+            return pos
+        return None
+
+    def scores(self, rows):
+        """Dense (len(rows), n_items) float32 scores, reviewed items at -inf."""
+        scores = self.profiles[rows] @ self.items.T
+        scores = np.asarray(scores.toarray() if sparse.issparse(scores) else scores, dtype=np.float32)
+        r, c = self.seen[rows].nonzero()
+        scores[r, c] = -np.inf
+        return scores
+
+    def recommend_batch(self, users, top_n=10, batch_size=1024):
+        """Dict user -> top_n asins by decreasing score, [] for unknown users."""
+        positions = [(u, self.position(u)) for u in users]
+        known = [(u, p) for u, p in positions if p is not None]
+        out = {u: [] for u, p in positions if p is None}
+        k = min(top_n, len(self.asins))
+        with span('user_profiles.recommend', users=len(known)):
+            for start in range(0, len(known), batch_size):
+                batch = known[start:start + batch_size]
+                scores = self.scores(np.array([p for _, p in batch]))
+                if k == 0:
+                    out.update((u, []) for u, _ in batch)
+                    continue
+                # k-th highest score of each row: every item tied with it is a candidate,
+                # so the ties at the cut are broken by item row like the others
+                kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+                for (user, _), row_scores, cut in zip(batch, scores, kth):
+                    top = np.flatnonzero(row_scores >= cut)
+                    top = top[np.lexsort((top, -row_scores[top]))][:k]  # decreasing score, then item row
+                    out[user] = self.asins[top[np.isfinite(row_scores[top])]].tolist()
+        count('user_profiles.users', len(known))
+        return out
+
+    def recommend(self, user, top_n=10):
+        return self.recommend_batch([user], top_n)[user]
+
+    def arrays(self):
+        """Values for serving.model_store.publish."""
+        return {'users': self.users, 'profiles': self.profiles, 'items': self.items,
+                'seen': self.seen, 'asins': self.asins}
+
+    @classmethod
+    def from_arrays(cls, values):
+        return cls(values['users'], values['profiles'], values['items'], values['seen'], values['asins'])
+
+
+def build(df_path='data/traitees/final.json.gz', cbf_df=None, n_components=None):
+    """
+    UserProfiles of every reviewer of df_path over the items of cbf_df
+    (content_based_filter.cbf_data of df_path by default).
+    n_components : latent profiles of that size instead of TF-IDF ones
+    """
+    if cbf_df is None:
+        cbf_df = content_based_filter.cbf_data(df_path)
+    with span('user_profiles.build', items=len(cbf_df)) as s:
+        idx = content_based_filter.indices(cbf_df)
+        items = item_vectors(cbf_df['description'], n_components)
+        reviews = read_table(df_path, columns=['asin', 'reviewerID', 'positive_prob'])
+        item_rows = idx.reindex(reviews['asin'].astype(str)).to_numpy()
+        known = ~np.isnan(item_rows.astype(float))
+        users, user_rows = np.unique(reviews['reviewerID'].astype(str).to_numpy()[known], return_inverse=True)
+        item_rows = item_rows[known].astype(np.int64)
+        shape = (len(users), len(cbf_df))
+        weights = sparse.csr_matrix(
+            (sentiment_weights(reviews['positive_prob'].to_numpy()[known]), (user_rows, item_rows)), shape=shape)
+        seen = sparse.csr_matrix((np.ones(len(item_rows), dtype=bool), (user_rows, item_rows)), shape=shape)
+        profiles = normalize(weights @ items).astype(np.float32)
+        s.set(users=len(users))
+    return UserProfiles(users.astype(str), profiles, items, seen,
+                        cbf_df['asin'].astype(str).to_numpy())
+
+
+if __name__ == "__main__":
+    # python -m recommendation_filters.user_profiles [final json] [n_components]
+    from serving.model_store import ModelStore
+    source = sys.argv[1] if len(sys.argv) > 1 else 'data/traitees/final.json.gz'
+    model = build(source, n_components=int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    print(f"{len(model)} profils, version {ModelStore().publish('user_profiles', model.arrays())}")
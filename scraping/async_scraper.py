@@ -0,0 +1,269 @@
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from amazon_product_scraper import HEADERS, REQUEST_DELAY
+from monitoring.instrumentation import count, observe
+from scraping.extraction import extract_product
+
+try:
+    import aiohttp
+except ImportError:  # requests session driven from a thread pool instead
+    aiohttp = None
+
+Response = namedtuple('Response', ['url', 'status', 'headers', 'text'])
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: rate tokens per second, at most capacity in reserve.
+    acquire() waits until a token is available, callers are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Empty the bucket for seconds (server asked to slow down)."""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class _AiohttpClient:
+    def __init__(self, concurrency, timeout, headers):
+        connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(connector=connector, headers=headers,
+                                             timeout=aiohttp.ClientTimeout(total=timeout))
+        self.errors = (aiohttp.ClientError, asyncio.TimeoutError)
+
+    async def get(self, url, headers=None):
+        async with self.session.get(url, headers=headers) as r:
+            return Response(str(r.url), r.status, dict(r.headers), await r.text(errors='replace'))
+
+    async def close(self):
+        await self.session.close()
+
+
+class _RequestsClient:
+    """Pooled keep-alive requests session, blocking calls run on a thread pool."""
+
+    def __init__(self, concurrency, timeout, headers):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(headers)
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='scraper')
+        self.errors = (requests.RequestException,)
+
+    def _get(self, url, headers):
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+        return Response(r.url, r.status_code, dict(r.headers), r.text)
+
+    async def get(self, url, headers=None):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._get, url, headers)
+
+    async def close(self):
+        self._pool.shutdown(wait=False)
+        self.session.close()
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delay form only), None when absent."""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncScraper:
+    """
+    Concurrent product page scraper.
+    rate : requests per second allowed per host (1 / REQUEST_DELAY by default)
+    burst : requests a host may receive back to back before rate applies
+    concurrency : requests in flight overall, also the connection pool size
+    retries : extra attempts on connection errors, timeouts and 429/5xx answers,
+        spaced by backoff * 2**attempt seconds plus jitter (or the Retry-After delay)
+    parse : function(html, url) -> product dict, run off the event loop on executor
+        (threads by default, pass a ProcessPoolExecutor to parse on several cores)
+    cache : optional scraping.page_cache.PageCache; pages are then requested conditionally
+        and only new or changed products are yielded (a delta stream)
+    save_cache : save the cache when scrape() ends; False leaves it to the caller, who
+        saves it once the yielded products are stored (a product whose hash was recorded
+        but which was lost would otherwise never be yielded again)
+    Uses aiohttp when installed, a pooled requests session otherwise.
+    """
+
+    def __init__(self, rate=1 / REQUEST_DELAY, burst=1, concurrency=8, retries=3, backoff=1.0,
+                 timeout=30, headers=None, parse=extract_product, executor=None, cache=None, client=None,
+                 save_cache=True):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = dict(HEADERS if headers is None else headers)
+        self.parse = parse
+        self.executor = executor
+        self.cache = cache
+        self.save_cache = save_cache
+        self.client = client
+        self._buckets = {}
+        self.stats = {'pages': 0, 'unchanged': 0, 'failures': 0, 'retries': 0, 'bytes': 0, 'seconds': 0.0}
+
+    def bucket(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._buckets[host]
+
+    async def fetch(self, url, headers=None):
+        """Response of url, retried on transient failures; raises the last error when retries run out."""
+        bucket = self.bucket(url)
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = await self.client.get(url, headers=headers)
+            except self.client.errors as e:
+                error, delay = e, None
+            else:
+                observe('scraper.fetch.seconds', time.perf_counter() - start)
+                if response.status not in RETRY_STATUSES:
+                    return response
+                error, delay = RuntimeError(f'HTTP {response.status}'), _retry_after(response)
+                if delay is not None:
+                    bucket.pause(delay)
+            if attempt == self.retries:
+                raise error
+            self.stats['retries'] += 1
+            count('scraper.retry')
+            await asyncio.sleep(delay if delay is not None else self.backoff * 2 ** attempt * (1 + random.random()))
+
+    async def scrape_one(self, url):
+        """(url, product dict or None, error message or None), product and error are None for an unchanged page."""
+        cache = self.cache
+        try:
+            response = await self.fetch(url, cache.validators(url) if cache is not None else None)
+            if cache is not None and response.status == 304:
+                return self._unchanged(url, response)
+            if response.status >= 400:
+                raise RuntimeError(f'HTTP {response.status}')
+            self.stats['bytes'] += len(response.text)
+            if cache is not None and cache.same_page(url, response.text):
+                return self._unchanged(url, response)
+            product = await asyncio.get_running_loop().run_in_executor(self.executor, self.parse, response.text, url)
+        except Exception as e:
+            self.stats['failures'] += 1
+            count('scraper.failure')
+            return url, None, f'{type(e).__name__}: {e}'
+        self.stats['pages'] += 1
+        if cache is not None and not cache.update(url, response, product):
+            return self._unchanged(url)
+        count('scraper.page')
+        return url, product, None
+
+    def _unchanged(self, url, response=None):
+        self.cache.touch(url, response)
+        self.stats['unchanged'] += 1
+        count('scraper.unchanged')
+        return url, None, None
+
+    async def scrape(self, urls):
+        """
+        Async generator of (url, product, error) in completion order.
+        At most concurrency urls are in flight, so urls may be a long or lazy iterable.
+        """
+        own_client = self.client is None
+        if own_client:
+            make = _AiohttpClient if aiohttp is not None else _RequestsClient
+            self.client = make(self.concurrency, self.timeout, self.headers)
+        start = time.perf_counter()
+        urls = iter(urls)
+        pending = set()
+        try:
+            while True:
+                for url in urls:
+                    pending.add(asyncio.ensure_future(self.scrape_one(url)))
+                    if len(pending) >= self.concurrency:
+                        break
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            self.stats['seconds'] += time.perf_counter() - start
+            if self.cache is not None and self.save_cache:
+                self.cache.save()
+            if own_client:
+                await self.client.close()
+                self.client = None
+
+    def report(self):
+        seconds = self.stats['seconds']
+        return dict(self.stats, pages_per_s=round(self.stats['pages'] / seconds, 2) if seconds else None)
+
+
+async def _scrape_to_jsonl(scraper, urls, path, errors_path):
+    errors = open(errors_path, 'a', encoding='utf-8') if errors_path else None
+    try:
+        with open(path, 'a', encoding='utf-8') as out:
+            async for url, product, error in scraper.scrape(urls):
+                if product is not None:
+                    out.write(json.dumps(product, ensure_ascii=False) + '\n')
+                    out.flush()
+                elif error is not None and errors is not None:
+                    errors.write(json.dumps({'url': url, 'error': error}) + '\n')
+    finally:
+        if errors is not None:
+            errors.close()
+
+
+def scrape_to_jsonl(urls, path='amazon_products_data.jsonl', errors_path=None, **kwargs):
+    """
+    Scrape urls with an AsyncScraper(**kwargs), appending each product to path as one
+    JSON line as soon as it is parsed (failures to errors_path when given).
+    Returns the scraper report.
+    """
+    scraper = AsyncScraper(**kwargs)
+    asyncio.run(_scrape_to_jsonl(scraper, urls, path, errors_path))
+    return scraper.report()
+
+
+if __name__ == "__main__":
+    # python -m scraping.async_scraper urls.txt [out.jsonl]
+    with open(sys.argv[1], encoding='utf-8') as f:
+        product_urls = [line.strip() for line in f if line.strip()]
+    out_path = sys.argv[2] if len(sys.argv) > 2 else 'amazon_products_data.jsonl'
+    print(f"Début de l'extraction pour {len(product_urls)} produits...")
+    print(scrape_to_jsonl(product_urls, out_path, errors_path=out_path + '.errors'))
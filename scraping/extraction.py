@@ -0,0 +1,301 @@
+import re
+from collections import Counter, namedtuple
+from html.parser import HTMLParser
+from multiprocessing import Pool, cpu_count
+
+from amazon_product_scraper import get_product_asin
+
+# name : output key
+# selectors : fallbacks in priority order, the first one matching wins. A selector is
+#     'tag#id.class ancestor-descendant ... [@attr]' (descendant combinator only), or a tuple
+#     of selectors that must all match, the field value is then the list of their values.
+# many : every match (list of texts) instead of the first one
+# convert : function applied to the raw value, an exception counts as an extraction error
+Field = namedtuple('Field', ['name', 'selectors', 'many', 'convert'], defaults=(False, None))
+
+
+def _price(value):
+    if isinstance(value, list):  # whole and fraction parts
+        return f"{value[0]}{value[1]} €"
+    return value
+
+
+def _rating(text):
+    return float(text.split()[0].replace(',', '.'))
+
+
+def _review_count(text):
+    return int(text.split()[0].replace('.', '').replace(',', ''))
+
+
+# Same fields and fallbacks as the get_* helpers of amazon_product_scraper
+PRODUCT_SPEC = (
+    Field('title', ['span#productTitle']),
+    Field('price', [('span.a-price-whole', 'span.a-price-fraction'), 'span#priceblock_ourprice'], convert=_price),
+    Field('original_price', ['span.a-price.a-text-price span.a-offscreen']),
+    Field('rating', ['span.a-icon-alt'], convert=_rating),
+    Field('review_count', ['span#acrCustomerReviewText'], convert=_review_count),
+    Field('availability', ['div#availability']),
+    Field('description', ['div#productDescription']),
+    Field('features', ['div#feature-bullets li'], many=True),
+    Field('image_url', ['img#landingImage@src']),
+    Field('brand', ['a#bylineInfo', 'a#brand']),
+    Field('seller', ['div#merchant-info']),
+    Field('categories', ['div#wayfinding-breadcrumbs_container li'], many=True),
+)
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+             'source', 'track', 'wbr'}
+SKIP_TAGS = {'script', 'style'}  # their text is not part of get_text()
+
+_COMPOUND = re.compile(r'([\w-]*)((?:[#.][\w-]+)*)$')
+
+Compound = namedtuple('Compound', ['tag', 'id', 'classes'])
+Selector = namedtuple('Selector', ['key', 'chain', 'attr', 'many'])
+
+
+def parse_selector(text):
+    """List of Compound (outermost first) and the attribute to read (None for the text)."""
+    text, _, attr = text.partition('@')
+    chain = []
+    for part in text.split():
+        m = _COMPOUND.match(part)
+        if m is None:
+            raise ValueError(f'Unsupported selector: {text!r}')
+        tag, rest = m.group(1) or None, m.group(2)
+        ids = re.findall(r'#([\w-]+)', rest)
+        chain.append(Compound(tag, ids[0] if ids else None, frozenset(re.findall(r'\.([\w-]+)', rest))))
+    if not chain:
+        raise ValueError(f'Empty selector: {text!r}')
+    return chain, attr or None
+
+
+class CompiledSpec:
+    """
+    Selectors of a spec indexed by the most selective part of their last compound
+    (id, else a class, else the tag), so each start tag is only checked against the
+    selectors that can match it.
+    """
+
+    def __init__(self, spec=PRODUCT_SPEC):
+        self.fields = tuple(spec)
+        self.by_id, self.by_class, self.by_tag = {}, {}, {}
+        for f, field in enumerate(self.fields):
+            for s, alternative in enumerate(field.selectors):
+                parts = (alternative,) if isinstance(alternative, str) else alternative
+                for p, text in enumerate(parts):
+                    chain, attr = parse_selector(text)
+                    selector = Selector((f, s, p), chain, attr, field.many)
+                    last = chain[-1]
+                    if last.id:
+                        self.by_id.setdefault(last.id, []).append(selector)
+                    elif last.classes:
+                        self.by_class.setdefault(min(last.classes), []).append(selector)
+                    else:
+                        self.by_tag.setdefault(last.tag, []).append(selector)
+
+    def candidates(self, tag, id_, classes):
+        found = list(self.by_id.get(id_, ())) if id_ else []
+        for c in classes:
+            found.extend(self.by_class.get(c, ()))
+        found.extend(self.by_tag.get(tag, ()))
+        return found
+
+
+def _matches(compound, tag, id_, classes):
+    return ((compound.tag is None or compound.tag == tag) and (compound.id is None or compound.id == id_)
+            and compound.classes <= classes)
+
+
+class _Extractor(HTMLParser):
+    """Single pass over the document collecting the text or attribute of every selector match."""
+
+    def __init__(self, compiled):
+        super().__init__(convert_charrefs=True)
+        self.compiled = compiled
+        self.stack = []  # open elements: (tag, id, classes)
+        self.captures = []  # [depth, selector, text parts] of open matched elements
+        self.values = {}  # selector key -> text (list of texts for many)
+        self.skip = 0
+
+    def _store(self, selector, value):
+        if selector.many:
+            self.values.setdefault(selector.key, []).append(value)
+        else:
+            self.values.setdefault(selector.key, value)
+
+    def _ancestors_match(self, chain):
+        i = len(chain) - 2
+        for tag, id_, classes in reversed(self.stack):
+            if i < 0:
+                break
+            if _matches(chain[i], tag, id_, classes):
+                i -= 1
+        return i < 0
+
+    def handle_starttag(self, tag, attrs, void=False):
+        attrs = dict(attrs)
+        id_ = attrs.get('id')
+        classes = frozenset((attrs.get('class') or '').split())
+        void = void or tag in VOID_TAGS
+        for selector in self.compiled.candidates(tag, id_, classes):
+            if not selector.many and (selector.key in self.values
+                                      or any(c[1].key == selector.key for c in self.captures)):
+                continue
+            if not _matches(selector.chain[-1], tag, id_, classes) or not self._ancestors_match(selector.chain):
+                continue
+            if selector.attr is not None:
+                if attrs.get(selector.attr) is not None:
+                    self._store(selector, attrs[selector.attr])
+            elif void:
+                self._store(selector, '')
+            else:
+                self.captures.append([len(self.stack) + 1, selector, []])
+        if not void:
+            self.stack.append((tag, id_, classes))
+            if tag in SKIP_TAGS:
+                self.skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, void=True)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            return  # stray end tag
+        while len(self.stack) > i:
+            self._close()
+
+    def _close(self):
+        depth = len(self.stack)
+        if self.captures and self.captures[-1][0] == depth:
+            still_open = []
+            for capture in self.captures:
+                if capture[0] == depth:
+                    self._store(capture[1], ''.join(capture[2]).strip())
+                else:
+                    still_open.append(capture)
+            self.captures = still_open
+        if self.stack.pop()[0] in SKIP_TAGS:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if self.captures and not self.skip:
+            for capture in self.captures:
+                capture[2].append(data)
+
+    def close(self):
+        super().close()
+        while self.stack:
+            self._close()
+
+
+def extract(html, compiled):
+    """
+    Field values of html, and dict field -> 'missing' (no selector matched) or
+    'error' (convert failed) for the fields left to None.
+    """
+    parser = _Extractor(compiled)
+    parser.feed(html)
+    parser.close()
+    values = parser.values
+    out, failures = {}, {}
+    for f, field in enumerate(compiled.fields):
+        value = None
+        for s, alternative in enumerate(field.selectors):
+            if isinstance(alternative, str):
+                value = values.get((f, s, 0))
+            else:
+                parts = [values.get((f, s, p)) for p in range(len(alternative))]
+                value = None if any(v is None for v in parts) else parts
+            if value is not None:
+                break
+        if value is None:
+            failures[field.name] = 'missing'
+        elif field.convert is not None:
+            try:
+                value = field.convert(value)
+            except Exception:
+                value, failures[field.name] = None, 'error'
+        out[field.name] = value
+    return out, failures
+
+
+_default = None
+
+
+def _compiled_default():
+    global _default
+    if _default is None:
+        _default = CompiledSpec()
+    return _default
+
+
+def extract_product(html, url):
+    """Drop-in for amazon_product_scraper.parse_product_page using PRODUCT_SPEC."""
+    return extract_product_with_failures(html, url)[0]
+
+
+def extract_product_with_failures(html, url, compiled=None):
+    values, failures = extract(html, compiled or _compiled_default())
+    product = {'url': url}
+    product.update(values)
+    product['asin'] = get_product_asin(url)
+    product['categories'] = product.pop('categories')  # same key order as parse_product_page
+    return product, failures
+
+
+class ExtractionStats:
+    """Per field counts of pages where it was found, missing or failed to convert."""
+
+    def __init__(self):
+        self.pages = 0
+        self.missing = Counter()
+        self.errors = Counter()
+
+    def add(self, failures):
+        self.pages += 1
+        for field, reason in failures.items():
+            (self.missing if reason == 'missing' else self.errors)[field] += 1
+
+    def report(self):
+        fields = sorted(set(self.missing) | set(self.errors))
+        return {'pages': self.pages,
+                'fields': {f: {'missing': self.missing[f], 'errors': self.errors[f],
+                               'failure_rate': round((self.missing[f] + self.errors[f]) / self.pages, 4)}
+                           for f in fields}}
+
+
+_worker = {}
+
+
+def _init_worker(spec):
+    _worker['compiled'] = CompiledSpec(spec)
+
+
+def _extract_job(page):
+    html, url = page
+    return extract_product_with_failures(html, url, _worker['compiled'])
+
+
+def extract_many(pages, spec=PRODUCT_SPEC, processes=None, chunksize=8):
+    """
+    Products of an iterable of (html, url) parsed on a process pool (processes=1 parses
+    in this process), in input order, and the ExtractionStats of the run.
+    """
+    stats = ExtractionStats()
+    products = []
+    if processes == 1:
+        compiled = CompiledSpec(spec)
+        results = (extract_product_with_failures(html, url, compiled) for html, url in pages)
+        for product, failures in results:
+            products.append(product)
+            stats.add(failures)
+        return products, stats
+    with Pool(processes or cpu_count(), initializer=_init_worker, initargs=(spec,)) as pool:
+        for product, failures in pool.imap(_extract_job, pages, chunksize=chunksize):
+            products.append(product)
+            stats.add(failures)
+    return products, stats
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+
+from data_processing import data_cleaning
+from monitoring.instrumentation import span
+from scraping.async_scraper import scrape_to_jsonl
+from scraping.page_cache import PageCache
+from serving import lazy_models, metadata_store, title_search
+
+META_CLEAN_PATH = 'data/processed/clean_meta.json.gz'
+METADATA_PATH = 'data/meta_All_Beauty[1].jsonl'
+NAMES_PATH = 'data/asin_title.json.gz'
+TITLE_INDEX_SNAPSHOT = 'data/snapshots/title_index.pkl'
+
+BRAND_PREFIXES = re.compile(r'^(Marque\s*:|Visiter la boutique|Brand\s*:|Visit the)\s*', re.IGNORECASE)
+
+
+def parse_price(text):
+    """Float of a scraped price ('12,34 €', '1.234,56 €', '$12.34'), None when absent."""
+    if text is None:
+        return None
+    digits = re.sub(r'[^\d,.]', '', str(text))
+    if not digits:
+        return None
+    separator = max(digits.rfind(','), digits.rfind('.'))
+    if separator >= 0 and len(digits) - separator - 1 in (1, 2):  # decimal part
+        digits = re.sub(r'[,.]', '', digits[:separator]) + '.' + digits[separator + 1:]
+    else:
+        digits = re.sub(r'[,.]', '', digits)
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def brand_name(text):
+    return BRAND_PREFIXES.sub('', text or '').strip()
+
+
+def to_raw_meta(product):
+    """Scraped product as a record of the raw meta dataset read by data_cleaning.meta_clean."""
+    price = parse_price(product.get('price'))
+    categories = product.get('categories') or []
+    return {
+        'category': categories, 'tech1': '', 'fit': '', 'tech2': '',
+        'feature': product.get('features') or [], 'date': '',
+        'image': [product['image_url']] if product.get('image_url') else [],
+        'description': [product['description']] if product.get('description') else [],
+        'title': product.get('title') or '',
+        'also_buy': [], 'brand': brand_name(product.get('brand')), 'rank': '', 'also_view': [],
+        'main_cat': categories[0] if categories else '', 'similar_item': '',
+        'price': f'${price:.2f}' if price is not None else '',
+        'asin': product['asin'], 'details': {}
+    }
+
+
+def to_metadata_record(product):
+    """Scraped product as a line of the app metadata JSONL (read by serving.metadata_store)."""
+    categories = product.get('categories') or []
+    image = product.get('image_url')
+    return {
+        'main_category': categories[0] if categories else '',
+        'title': product.get('title') or '',
+        'average_rating': product.get('rating') or 0,
+        'rating_number': product.get('review_count') or 0,
+        'features': product.get('features') or [],
+        'description': [product['description']] if product.get('description') else [],
+        'price': parse_price(product.get('price')),
+        'images': [{'thumb': image, 'large': image, 'variant': 'MAIN'}] if image else [],
+        'store': brand_name(product.get('brand')),
+        'categories': categories,
+        'details': {},
+        'parent_asin': product['asin']
+    }
+
+
+def read_delta(path):
+    """Products of a delta JSONL file, the last one of each asin, without asin-less or untitled ones."""
+    products = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                product = json.loads(line)
+                if product.get('asin') and product.get('title'):
+                    products[product['asin']] = product
+    return list(products.values())
+
+
+def _upsert(df, updates, key='asin'):
+    return pd.concat([df[~df[key].isin(updates[key])], updates], ignore_index=True)
+
+
+def _write_json(df, path):
+    tmp_path = f'{path}.tmp'
+    df.to_json(tmp_path, compression='gzip')
+    os.replace(tmp_path, path)
+
+
+def apply_delta(products, meta_clean_path=META_CLEAN_PATH, metadata_path=METADATA_PATH,
+                names_path=NAMES_PATH, title_index_snapshot=TITLE_INDEX_SNAPSHOT, store=None):
+    """
+    Merge changed products into the catalog artifacts that exist, without rerunning the pipeline:
+    - cleaned meta (meta_clean rules, missing prices filled with the catalog mean)
+    - app metadata JSONL and its offset index (appended, last line wins)
+    - asin -> title table and the title search snapshot (rebuilt from it)
+    - store : optional document_store 'metadata' collection, upserted with the raw meta records
+    Returns the number of rows updated per artifact.
+    """
+    updated = {}
+    if not products:
+        return updated
+    if meta_clean_path and os.path.exists(meta_clean_path):
+        with span('ingest.meta_clean', rows=len(products)):
+            clean = pd.read_json(meta_clean_path)
+            updates = data_cleaning.clean_meta_frame(pd.DataFrame([to_raw_meta(p) for p in products]),
+                                                     price_fill=clean['price'].mean())
+            _write_json(_upsert(clean, updates), meta_clean_path)
+            updated['meta_clean'] = len(updates)
+    if metadata_path and os.path.exists(metadata_path):
+        with span('ingest.metadata', rows=len(products)):
+            updated['metadata'] = metadata_store.append_records(metadata_path, map(to_metadata_record, products))
+    if names_path and os.path.exists(names_path):
+        with span('ingest.names', rows=len(products)):
+            names = _upsert(pd.read_json(names_path),
+                            pd.DataFrame({'asin': [p['asin'] for p in products],
+                                          'title': [p['title'] for p in products]}))
+            _write_json(names, names_path)
+            updated['names'] = len(products)
+            if title_index_snapshot and os.path.exists(title_index_snapshot):
+                index = title_search.TitleIndex(names['title'].tolist(), names['asin'].tolist())
+                lazy_models.write_snapshot(index, title_index_snapshot, lazy_models.source_key([names_path]))
+                updated['title_index'] = len(names)
+    if store is not None:
+        updated['store'] = store.upsert_many(to_raw_meta(p) for p in products)
+    return updated
+
+
+def refresh_catalog(urls, delta_path='data/scraper_delta.jsonl', cache_path='data/page_cache.json', **kwargs):
+    """
+    Scrape urls conditionally (PageCache at cache_path), write the new or changed
+    products to delta_path and merge them into the catalog with apply_delta.
+    The page cache is saved and the delta removed only once apply_delta succeeded:
+    after a failure the delta is kept and applied with the next refresh (appended
+    to, the last product of each asin wins), and the products are scraped again.
+    kwargs go to AsyncScraper. Returns (scraper report, apply_delta counts).
+    """
+    cache = PageCache(cache_path)
+    report = scrape_to_jsonl(urls, delta_path, f'{delta_path}.errors', cache=cache, save_cache=False, **kwargs)
+    updated = apply_delta(read_delta(delta_path)) if os.path.exists(delta_path) else {}
+    cache.save()
+    if os.path.exists(delta_path):
+        os.remove(delta_path)
+    return report, updated
+
+
+if __name__ == "__main__":
+    # python -m scraping.ingest urls.txt
+    with open(sys.argv[1], encoding='utf-8') as f:
+        product_urls = [line.strip() for line in f if line.strip()]
+    report, updated = refresh_catalog(product_urls)
+    print(report)
+    print(f"Catalogue mis à jour : {updated}")
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import time
+
+
+def content_hash(value):
+    """sha1 of a page text or of a product dict (keys sorted)."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """
+    Per url HTTP validators (ETag, Last-Modified) and content hashes of the last
+    scrape, persisted as JSON in path.
+    A page is skipped when the server answers 304 to the conditional request,
+    when its body hash is unchanged (not parsed again), or when the extracted
+    product is unchanged (not emitted again).
+    """
+
+    def __init__(self, path='data/page_cache.json'):
+        self.path = path
+        self.entries = {}  # url -> etag, last_modified, page_hash, product_hash, checked_at
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def validators(self, url):
+        """Conditional request headers for url, None when it was never fetched."""
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers or None
+
+    def same_page(self, url, text):
+        entry = self.entries.get(url)
+        return entry is not None and entry.get('page_hash') == content_hash(text)
+
+    def touch(self, url, response=None):
+        """Record that url was checked and did not change, refreshing its validators."""
+        entry = self.entries.get(url)
+        if entry is None:
+            return
+        entry['checked_at'] = time.time()
+        if response is not None:
+            entry['etag'] = response.headers.get('ETag') or entry.get('etag')
+            entry['last_modified'] = response.headers.get('Last-Modified') or entry.get('last_modified')
+
+    def update(self, url, response, product):
+        """Store the validators and hashes of a fetched page, True when product is new or changed."""
+        product_hash = content_hash(product)
+        old = self.entries.get(url)
+        self.entries[url] = {'etag': response.headers.get('ETag'),
+                             'last_modified': response.headers.get('Last-Modified'),
+                             'page_hash': content_hash(response.text),
+                             'product_hash': product_hash,
+                             'checked_at': time.time()}
+        return old is None or old.get('product_hash') != product_hash
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
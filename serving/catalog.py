@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+
+import numpy as np
+import pandas as pd
+
+from data_processing.tables import read_table
+from monitoring.instrumentation import count, span
+from serving import precomputed
+
+CATALOG_DIR = 'data/catalog'
+SHARD_COLUMN = 'main_cat'
+DEFAULT_SHARD = 'other'  # products without main category
+
+
+def shard_name(category):
+    """Directory name of a category shard: 'All Beauty' -> 'all_beauty'."""
+    name = re.sub(r'[^0-9a-z]+', '_', '' if pd.isna(category) else str(category).lower()).strip('_')
+    return name or DEFAULT_SHARD
+
+
+def _shard_path(out_dir, shard):
+    return os.path.join(out_dir, shard)
+
+
+def split(df_path, out_dir=CATALOG_DIR, column=SHARD_COLUMN, shards=None):
+    """
+    Split the final dataset into one final.json.gz per category under out_dir/<shard>/
+    (only for the shards listed in shards when given) and write the routing files:
+    shards.json : {shard: {'category', 'products', 'reviews'}}
+    asins.npy / shard_ids.npy : sorted asin dictionary and the position of each asin's
+    shard in the sorted shard names (an asin belongs to the shard of its first row).
+    Data without the column goes to a single DEFAULT_SHARD.
+    """
+    with span('catalog.split', path=df_path) as s:
+        df = read_table(df_path, compact=False)
+        categories = df[column] if column in df.columns else None
+        labels = (categories.map(shard_name) if categories is not None
+                  else np.full(len(df), DEFAULT_SHARD))
+        df['_shard'] = np.asarray(labels)
+        os.makedirs(out_dir, exist_ok=True)
+        manifest = {}
+        for shard, part in df.groupby('_shard', sort=True):
+            part = part.drop(columns='_shard').reset_index(drop=True)
+            if shards is None or shard in shards:
+                os.makedirs(_shard_path(out_dir, shard), exist_ok=True)
+                tmp_path = os.path.join(_shard_path(out_dir, shard), 'final.tmp.json.gz')
+                part.to_json(tmp_path, compression='gzip')
+                os.replace(tmp_path, os.path.join(_shard_path(out_dir, shard), 'final.json.gz'))
+            manifest[shard] = {'category': str(part[column].iloc[0]) if column in part.columns else '',
+                               'products': int(part['asin'].nunique()), 'reviews': len(part)}
+        first = df.drop_duplicates('asin')
+        order = np.argsort(first['asin'].to_numpy(dtype=str), kind='stable')
+        names = sorted(manifest)
+        np.save(os.path.join(out_dir, 'asins.npy'),
+                np.array(first['asin'].to_numpy(dtype=str)[order], dtype=bytes))
+        np.save(os.path.join(out_dir, 'shard_ids.npy'),
+                np.searchsorted(names, first['_shard'].to_numpy(dtype=str)[order]).astype(np.int16))
+        with open(os.path.join(out_dir, 'shards.json'), 'w') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        s.set(shards=len(manifest), rows=len(df))
+    return manifest
+
+
+def build_shard(out_dir, shard, **params):
+    """Precomputed tables of one shard (out_dir/<shard>/tables), from its final.json.gz."""
+    path = _shard_path(out_dir, shard)
+    params.setdefault('n_jobs', 1)
+    with span('catalog.build_shard', shard=shard):
+        precomputed.build_tables(os.path.join(path, 'tables'), df_path=os.path.join(path, 'final.json.gz'), **params)
+    return shard
+
+
+def build_catalog(df_path, out_dir=CATALOG_DIR, shards=None, n_jobs=None, resplit=True, **params):
+    """
+    Split df_path by category then build the tables of every shard (or of shards only)
+    in n_jobs processes, one shard per process; a shard is rebuilt without touching
+    the others. params go to precomputed.build_tables (top_n, models, clusters, ...).
+    Returns the names of the built shards.
+    """
+    if resplit or not os.path.exists(os.path.join(out_dir, 'shards.json')):
+        split(df_path, out_dir, shards=shards)
+    with open(os.path.join(out_dir, 'shards.json')) as f:
+        names = sorted(json.load(f))
+    names = [name for name in names if shards is None or name in shards]
+    with ProcessPoolExecutor(n_jobs or os.cpu_count()) as pool:
+        return list(pool.map(_build_shard_job, [(out_dir, name, params) for name in names]))
+
+
+def _build_shard_job(job):
+    out_dir, shard, params = job
+    return build_shard(out_dir, shard, **params)
+
+
+def merge(lists, top_n=None):
+    """Round-robin merge of recommendation lists, first occurrence kept."""
+    merged = []
+    for recs in zip_longest(*lists):
+        for asin in recs:
+            if asin is not None and asin not in merged:
+                merged.append(asin)
+    return merged[:top_n] if top_n else merged
+
+
+class Catalog:
+    """
+    Router over the shards written by build_catalog: each asin query goes to the
+    precomputed tables of its category shard, opened on first use; at most
+    max_loaded shards stay open (least recently used closed first), so memory
+    follows the active shards.
+    """
+
+    def __init__(self, path=CATALOG_DIR, max_loaded=8):
+        self.path = path
+        self.max_loaded = max_loaded
+        with open(os.path.join(path, 'shards.json')) as f:
+            self.shards = json.load(f)
+        self.names = sorted(self.shards)
+        self.asins = np.load(os.path.join(path, 'asins.npy'), mmap_mode='r')
+        self.shard_ids = np.load(os.path.join(path, 'shard_ids.npy'), mmap_mode='r')
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of products of the catalog."""
+        return sum(info['products'] for info in self.shards.values())
+
+    def shard_of(self, asin):
+        key = asin.encode() if isinstance(asin, str) else asin
+        pos = int(np.searchsorted(self.asins, key))
+        if pos < len(self.asins) and self.asins[pos] == key:
+            return self.names[self.shard_ids[pos]]
+        return None
+
+    def shard(self, name):
+        """PrecomputedTables of a shard."""
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name]
+        with span('catalog.load_shard', shard=name):
+            tables = precomputed.PrecomputedTables(os.path.join(self.path, name, 'tables'))
+        with self._lock:
+            self._loaded[name] = tables
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        count('catalog.shard_loads')
+        return tables
+
+    def lookup(self, model, asin):
+        """Recommendations of model for asin from its shard, None when unknown."""
+        name = self.shard_of(asin)
+        if name is None:
+            return None
+        tables = self.shard(name)
+        if model not in tables:
+            return None
+        return tables.lookup(model, asin)
+
+    def lookup_many(self, model, asins, top_n=10):
+        """Merged recommendations for several asins, possibly from different shards."""
+        lists = [self.lookup(model, asin) or [] for asin in asins]
+        return merge([[r for r in recs if r not in asins] for recs in lists], top_n)
+
+    def popular(self, top_n=10, shards=None):
+        """Popularity lists of the shards (all by default), merged."""
+        lists = []
+        for name in shards or self.names:
+            tables = self.shard(name)
+            recs = tables.lookup('popularity', None) if 'popularity' in tables else None
+            if recs is not None:  # None : stale shard tables
+                lists.append(recs)
+        return merge(lists, top_n)
+
+
+if __name__ == "__main__":
+    # python -m serving.catalog [final json] [out dir] [shard ...]
+    source = sys.argv[1] if len(sys.argv) > 1 else 'data/traitees/final.json.gz'
+    target = sys.argv[2] if len(sys.argv) > 2 else CATALOG_DIR
+    print(build_catalog(source, target, shards=sys.argv[3:] or None,
+                        models=('content', 'collaborative', 'popularity'), clusters=precomputed.load_clusters()))
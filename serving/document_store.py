@@ -0,0 +1,266 @@
+import json
+import os
+import sys
+from itertools import islice
+
+import pandas as pd
+
+from monitoring.instrumentation import count, span
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+STORE_DIR = 'data/store'
+MONGO_URI = 'mongodb://127.0.0.1:27017'
+MONGO_DATABASE = 'projet_amazon'
+# primary key and secondary indexes of each collection
+COLLECTIONS = {
+    'reviews': {'key': ('asin', 'reviewerID'), 'indexes': ('asin', 'reviewerID')},
+    'metadata': {'key': ('asin',), 'indexes': ('asin',)},
+}
+# the notebook writes the reviews to projet_amazon.projet_amazon
+MONGO_COLLECTIONS = {'reviews': 'projet_amazon', 'metadata': 'metadata'}
+BATCH_SIZE = 1000
+
+
+def _batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _project(doc, projection):
+    """doc restricted to the projection fields (all fields when None)."""
+    if projection is None:
+        return doc
+    return {field: doc[field] for field in projection if field in doc}
+
+
+class MemoryCollection:
+    """
+    In-memory document collection, the stand-in used in tests and notebooks.
+    Documents are replaced as a whole on upsert, identified by their key fields;
+    indexes map a field value to the keys holding it, a field without index is scanned.
+    key : primary key fields ; indexes : fields indexed for get_many
+    """
+
+    def __init__(self, key=('asin',), indexes=()):
+        self.key = tuple(key)
+        self._entries = {}  # key tuple -> stored entry (the document here)
+        self._indexes = {}
+        for field in indexes:
+            self.create_index(field)
+
+    def _key(self, doc):
+        return tuple(doc[field] for field in self.key)
+
+    def _write(self, docs):
+        """Stored entries of a batch of documents."""
+        return list(docs)
+
+    def _read(self, entries):
+        return list(entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def create_index(self, field, batch_size=BATCH_SIZE):
+        """Index field value -> keys, the documents read batch_size at a time."""
+        index = {}
+        with span('store.create_index', field=field) as s:
+            for batch in _batches(self._entries.items(), batch_size):
+                keys, entries = zip(*batch)
+                for key, doc in zip(keys, self._read(entries)):
+                    if field in doc:
+                        index.setdefault(doc[field], set()).add(key)
+            s.set(values=len(index))
+        self._indexes[field] = index
+
+    def upsert_many(self, docs, batch_size=BATCH_SIZE):
+        """Insert or replace docs, batch_size at a time. Returns the number written."""
+        written = 0
+        with span('store.upsert', backend=type(self).__name__) as s:
+            for batch in _batches(docs, batch_size):
+                for doc, entry in zip(batch, self._write(batch)):
+                    key = self._key(doc)
+                    self._entries[key] = entry
+                    for field, index in self._indexes.items():
+                        if field in doc:
+                            # stale keys of an old value are filtered out on read
+                            index.setdefault(doc[field], set()).add(key)
+                written += len(batch)
+            s.set(rows=written)
+        return written
+
+    def get_many(self, values, field='asin', projection=None, batch_size=BATCH_SIZE):
+        """Documents whose field is in values, restricted to the projection fields."""
+        values = set(values)
+        if field in self._indexes:
+            index = self._indexes[field]
+            keys = sorted({key for value in values for key in index.get(value, ())}, key=repr)
+            entries = [self._entries[key] for key in keys]
+        else:
+            entries = list(self._entries.values())
+        docs = []
+        for batch in _batches(entries, batch_size):
+            docs.extend(_project(doc, projection) for doc in self._read(batch) if doc.get(field) in values)
+        count('store.docs_read', len(docs))
+        return docs
+
+    def find(self, projection=None, batch_size=BATCH_SIZE):
+        """Every document, batch_size read at a time."""
+        for batch in _batches(self._entries.values(), batch_size):
+            for doc in self._read(batch):
+                yield _project(doc, projection)
+
+    def close(self):
+        pass
+
+
+class FileCollection(MemoryCollection):
+    """
+    Collection persisted as a JSONL file: upserts append lines (the last line of a key
+    wins) and only the key -> byte offset map and the indexes stay in memory.
+    compact() rewrites the file without the replaced lines.
+    """
+
+    def __init__(self, path, key=('asin',), indexes=()):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        super().__init__(key, ())
+        if os.path.exists(path):
+            self._scan()
+        self._file = open(path, 'a+b')
+        for field in indexes:
+            self.create_index(field)
+
+    def _scan(self):
+        with span('store.scan', path=self.path) as s, open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    self._entries[self._key(json.loads(line))] = offset
+                offset += len(line)
+            s.set(rows=len(self._entries))
+
+    def _write(self, docs):
+        self._file.seek(0, os.SEEK_END)
+        offsets = []
+        for doc in docs:
+            offsets.append(self._file.tell())
+            self._file.write((json.dumps(doc, ensure_ascii=False) + '\n').encode('utf-8'))
+        self._file.flush()
+        return offsets
+
+    def _read(self, entries):
+        """Documents at the given offsets, read in file order and returned in input order."""
+        docs = {}
+        for offset in sorted(set(entries)):
+            self._file.seek(offset)
+            docs[offset] = json.loads(self._file.readline())
+        return [docs[offset] for offset in entries]
+
+    def compact(self):
+        """Rewrite the file with the live documents only (atomic replace)."""
+        tmp_path = f'{self.path}.tmp'
+        offsets = {}
+        with open(tmp_path, 'wb') as out:
+            for key, entry in self._entries.items():
+                offsets[key] = out.tell()
+                out.write((json.dumps(self._read([entry])[0], ensure_ascii=False) + '\n').encode('utf-8'))
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._entries = offsets
+        self._file = open(self.path, 'a+b')
+
+    def close(self):
+        self._file.close()
+
+
+class MongoCollection:
+    """
+    Same interface on a MongoDB collection (pymongo): bulk upserts of ReplaceOne
+    operations per batch, ascending indexes on the indexed fields and a unique one on
+    the key, get_many as batched $in queries with a projection.
+    """
+
+    def __init__(self, collection, key=('asin',), indexes=(), uri=MONGO_URI, database=MONGO_DATABASE):
+        if pymongo is None:
+            raise ImportError("pymongo est requis pour le stockage MongoDB : pip install pymongo")
+        self.key = tuple(key)
+        self._client = pymongo.MongoClient(uri)
+        self._collection = self._client[database][collection]
+        self._collection.create_index([(field, pymongo.ASCENDING) for field in self.key], unique=True)
+        for field in indexes:
+            self.create_index(field)
+
+    def __len__(self):
+        return self._collection.estimated_document_count()
+
+    def create_index(self, field):
+        self._collection.create_index([(field, pymongo.ASCENDING)])
+
+    def upsert_many(self, docs, batch_size=BATCH_SIZE):
+        written = 0
+        with span('store.upsert', backend='mongodb') as s:
+            for batch in _batches(docs, batch_size):
+                self._collection.bulk_write(
+                    [pymongo.ReplaceOne({field: doc[field] for field in self.key}, doc, upsert=True)
+                     for doc in batch], ordered=False)
+                written += len(batch)
+            s.set(rows=written)
+        return written
+
+    @staticmethod
+    def _projection(projection):
+        fields = {'_id': 0}
+        fields.update({field: 1 for field in projection or ()})
+        return fields
+
+    def get_many(self, values, field='asin', projection=None, batch_size=BATCH_SIZE):
+        docs = []
+        for batch in _batches(sorted(set(values)), batch_size):
+            docs.extend(self._collection.find({field: {'$in': batch}}, self._projection(projection)))
+        count('store.docs_read', len(docs))
+        return docs
+
+    def find(self, projection=None, batch_size=BATCH_SIZE):
+        return self._collection.find({}, self._projection(projection), batch_size=batch_size)
+
+    def close(self):
+        self._client.close()
+
+
+def open_collection(name, backend='file', store_dir=STORE_DIR, **kwargs):
+    """
+    Collection 'reviews' or 'metadata' of a backend: 'file' (JSONL under store_dir),
+    'mongodb' (kwargs uri, database) or 'memory'.
+    """
+    spec = COLLECTIONS[name]
+    if backend == 'file':
+        return FileCollection(os.path.join(store_dir, f'{name}.jsonl'), **spec)
+    if backend == 'mongodb':
+        return MongoCollection(MONGO_COLLECTIONS[name], **spec, **kwargs)
+    if backend == 'memory':
+        return MemoryCollection(**spec)
+    raise ValueError(f"Backend inconnu : {backend}")
+
+
+def load_frame(collection, df, batch_size=BATCH_SIZE):
+    """Upsert the rows of a DataFrame (NaN become null). Returns the number written."""
+    records = json.loads(df.to_json(orient='records'))
+    return collection.upsert_many(records, batch_size)
+
+
+if __name__ == "__main__":
+    # python -m serving.document_store <final json> <clean meta json> [file|mongodb]
+    store = sys.argv[3] if len(sys.argv) > 3 else 'file'
+    for name, path in (('reviews', sys.argv[1]), ('metadata', sys.argv[2])):
+        coll = open_collection(name, store)
+        print(f"{name} : {load_frame(coll, pd.read_json(path))} documents écrits")
+        coll.close()
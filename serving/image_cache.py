@@ -0,0 +1,159 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are stored as downloaded
+    Image = None
+
+
+# leading bytes of the formats served by product pages, checked when Pillow is missing
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM')
+
+
+def is_image(content):
+    """Whether content starts like a JPEG, PNG, GIF, BMP or WebP file."""
+    return content.startswith(IMAGE_SIGNATURES) or (content[:4] == b'RIFF' and content[8:12] == b'WEBP')
+
+
+def make_thumbnail(content, size=(240, 240), quality=85):
+    """
+    JPEG thumbnail bytes fitting in size, None when content is not an image (an error
+    page, or bytes Pillow cannot open). Without Pillow, image bytes are kept as downloaded.
+    """
+    if Image is None:
+        return content if is_image(content) else None
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            img.thumbnail(size)
+            out = io.BytesIO()
+            img.convert('RGB').save(out, format='JPEG', quality=quality)
+            return out.getvalue()
+    except Exception:
+        return None
+
+
+class ImageCache:
+    """
+    Disk-backed LRU cache of product thumbnails keyed by image url.
+    cache_dir : directory of the thumbnails ('<sha1(url)>.jpg')
+    max_bytes : total size kept on disk, least recently used files removed first
+    max_age : seconds after which a thumbnail is downloaded again (None: kept until evicted);
+        the expired copy is still served when the download fails
+    max_workers : concurrent downloads, also the size of the connection pool
+    timeout : seconds per request
+    A file's mtime is its download time (for max_age), its atime its last use (for the LRU).
+    """
+
+    def __init__(self, cache_dir='data/image_cache', max_bytes=200 * 1024 ** 2, max_age=7 * 24 * 3600,
+                 thumb_size=(240, 240), max_workers=8, timeout=10, session=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.thumb_size = thumb_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image')
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = self.misses = self.errors = 0
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.jpg')
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _read(self, path, stat):
+        """Bytes of a cached thumbnail, marked as used now; None when it was evicted meanwhile."""
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))  # used now, same download time
+            return content
+        except FileNotFoundError:
+            return None
+
+    def get(self, url):
+        """Thumbnail bytes of url (downloaded when not cached or expired), None on failure."""
+        if not url:
+            return None
+        path = self.path(url)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and (self.max_age is None or time.time() - stat.st_mtime < self.max_age):
+            content = self._read(path, stat)
+            if content is not None:
+                self._count('hits')
+                return content
+            stat = None
+        self._count('misses')
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            content = make_thumbnail(response.content, self.thumb_size)
+        except requests.RequestException:
+            content = None
+        if content is None:
+            self._count('errors')
+            return self._read(path, stat) if stat is not None else None  # the expired copy, if any
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(content) - (stat.st_size if stat is not None else 0)
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+        return content
+
+    def prefetch(self, urls):
+        """Dict url -> thumbnail bytes (or None), all urls fetched concurrently."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        return dict(zip(urls, self._pool.map(self.get, urls)))
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Remove least recently used thumbnails until the cache fits max_bytes."""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._size = total
+
+    def stats(self):
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
@@ -0,0 +1,230 @@
+import os
+import pickle
+import threading
+import time
+
+from monitoring.instrumentation import count, span
+from monitoring.memory import memory_report
+
+
+def source_key(paths):
+    """(mtime_ns, size) of every path, None for a missing one: changes when a file is rewritten."""
+    key = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            key.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            key.append(None)
+    return tuple(key)
+
+
+class LazyModel:
+    """
+    Handle on a model that is loaded (or built) on first use.
+    name : identifier shown in the startup report
+    build : function without arguments returning the model
+    snapshot_path : optional pickle file; loaded instead of calling build when
+    it exists and was built from the current sources, written after a build otherwise.
+    sources : files the model is built from; their source_key is stored with the
+    snapshot and is the model's version, refresh() rebuilds the model when it changes.
+    """
+
+    def __init__(self, name, build, snapshot_path=None, sources=()):
+        self.name = name
+        self.build = build
+        self.snapshot_path = snapshot_path
+        self.sources = tuple(sources)
+        self.source = None  # 'snapshot' or 'build' once loaded
+        self.version = None  # source_key of sources, else snapshot mtime or build time
+        self.key = None  # source_key of sources at the last load
+        self.load_time = None
+        self.error = None
+        self._value = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._reloading = False
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    @property
+    def status(self):
+        if self.error is not None:
+            return 'error'
+        if self.ready:
+            return 'ready'
+        if self._thread is not None:
+            return 'loading'
+        return 'pending'
+
+    def start(self):
+        """Start loading in a background thread (no-op if already started)."""
+        with self._lock:
+            if self._thread is None and not self.ready:
+                self._thread = threading.Thread(target=self._load, name=f'load-{self.name}', daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def stale(self):
+        """True when a source file changed since the last load."""
+        return bool(self.sources) and self.ready and source_key(self.sources) != self.key
+
+    def get(self, timeout=None):
+        """
+        Return the model, starting its background load when nobody started it and
+        waiting for it (TimeoutError after timeout seconds).
+        Raises the loading error if the load failed.
+        """
+        if self._thread is None:
+            self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError(f'{self.name} is still loading')
+        if self.error is not None:
+            raise self.error
+        return self._value
+
+    def _claim_reload(self):
+        with self._lock:
+            if self._reloading or not self.stale:
+                return False
+            self._reloading = True
+            return True
+
+    def refresh(self):
+        """
+        Reload the model in a background thread when it is stale; the loaded value
+        is served until the new one is ready. Returns True when a reload started.
+        """
+        if not self._claim_reload():
+            return False
+        threading.Thread(target=self._load, name=f'reload-{self.name}', daemon=True).start()
+        return True
+
+    def _load(self):
+        start = time.perf_counter()
+        key = source_key(self.sources)
+        try:
+            with span('model_load', model=self.name) as s:
+                value, source, version = self._load_value(key)
+                s.set(source=source)
+            # value before version: results cached under the old version are dropped
+            self._value, self.source, self.error = value, source, None
+            self.version = version
+        except Exception as e:
+            if self.ready and self.error is None:
+                count('model_reload_errors')  # the previous value is still served
+            else:
+                self.error = e
+        finally:
+            self.key = key
+            self.load_time = time.perf_counter() - start
+            self._reloading = False
+            self._done.set()
+
+    def _load_value(self, key):
+        """(value, source, version) from the snapshot built from key, else from build."""
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+            if isinstance(snapshot, dict) and snapshot.keys() == {'sources', 'value'} and snapshot['sources'] == key:
+                version = key if self.sources else os.path.getmtime(self.snapshot_path)
+                return snapshot['value'], 'snapshot', version
+        value = self.build()
+        if self.snapshot_path:
+            write_snapshot(value, self.snapshot_path, key)
+        return value, 'build', key if self.sources else time.time()
+
+
+def write_snapshot(value, path, sources=()):
+    """
+    Pickle value with the source_key it was built from to path atomically (write
+    to a temp file then rename).
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'sources': tuple(sources), 'value': value}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+class ModelLoader:
+    """
+    Registry of LazyModel handles with a startup timing report.
+    snapshot_dir : directory holding '<name>.pkl' snapshots, None to disable.
+    """
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = snapshot_dir
+        self.models = {}
+        self.queued = []
+        self.created = time.perf_counter()
+
+    def register(self, name, build, snapshot=False, sources=()):
+        path = None
+        if snapshot and self.snapshot_dir:
+            path = os.path.join(self.snapshot_dir, f'{name}.pkl')
+        self.models[name] = LazyModel(name, build, path, sources)
+        return self.models[name]
+
+    def __getitem__(self, name):
+        return self.models[name]
+
+    def get(self, name, timeout=None):
+        return self.models[name].get(timeout)
+
+    def start(self, names=None):
+        """
+        Load names (all registered models by default) one after the other, in that
+        order, in a background thread. A model requested with get() before its turn
+        is loaded right away by the caller; models left out are loaded on first use.
+        """
+        names = list(self.models) if names is None else list(names)
+        self.queued += names
+        threading.Thread(target=self._load_queue, args=(names,), name='load-queue', daemon=True).start()
+        return self
+
+    def _load_queue(self, names):
+        for name in names:
+            try:
+                self.models[name].get()
+            except Exception:
+                pass  # kept in the model's error, shown by report()
+
+    def refresh(self):
+        """
+        Reload the models whose sources changed, one after the other in registration
+        order (a model built from another one sees its new value) in a background
+        thread; loaded values are served until then. Returns their names.
+        """
+        stale = [model for model in self.models.values() if model._claim_reload()]
+        if stale:
+            threading.Thread(target=self._reload_queue, args=(stale,), name='reload-queue', daemon=True).start()
+        return [model.name for model in stale]
+
+    def _reload_queue(self, models):
+        for model in models:
+            model._load()
+
+    def report(self):
+        """List of dicts (model, status, source, seconds) for every registered model."""
+        return [{'model': m.name,
+                 'status': m.status,
+                 'source': m.source,
+                 'seconds': None if m.load_time is None else round(m.load_time, 3)}
+                for m in self.models.values()]
+
+    def memory_report(self):
+        """monitoring.memory.memory_report of the loaded models."""
+        return memory_report({m.name: m.get() for m in self.models.values()
+                              if m.ready and m.error is None})
+
+    def progress(self):
+        """Fraction of the queued (or already requested) models that finished loading."""
+        models = [m for m in self.models.values() if m.name in self.queued or m.status != 'pending']
+        if not models:
+            return 1.0
+        return sum(m.ready for m in models) / len(models)
@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from monitoring.instrumentation import count, span
+
+ASIN_PATTERN = re.compile(rb'"parent_asin"\s*:\s*"([^"]*)"')
+
+
+def main_image(images):
+    """Best available image url: MAIN variant first, else the first image."""
+    if not images:
+        return None
+    for img in images:
+        if img.get('variant') == 'MAIN':
+            return img.get('large') or img.get('thumb')
+    return images[0].get('large') or images[0].get('thumb')
+
+
+def display_fields(data):
+    """Fields of a raw metadata record used by the display code."""
+    return {
+        'title': data.get('title', ''),
+        'image_url': main_image(data.get('images')),
+        'average_rating': data.get('average_rating', 0),
+        'rating_number': data.get('rating_number', 0),
+        'price': data.get('price', None),
+        'store': data.get('store', ''),
+        'main_category': data.get('main_category', ''),
+        'features': data.get('features', [])
+    }
+
+
+def build_index(path):
+    """
+    Scan a metadata JSONL file once and return (asins, offsets):
+    asins : sorted fixed-width bytes array of parent_asin
+    offsets : int64 byte offset of the matching line
+    Lines are not json decoded, the asin is matched with a regex.
+    When an asin appears twice the last line wins.
+    """
+    asins, offsets = [], []
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            match = ASIN_PATTERN.search(line)
+            if match and match.group(1):
+                asins.append(match.group(1))
+                offsets.append(offset)
+            offset += len(line)
+
+    return _sorted_index(np.array(asins, dtype=bytes), np.array(offsets, dtype=np.int64))
+
+
+def _sorted_index(asins, offsets):
+    """Sort by asin, keeping the last occurrence (highest position) of duplicates."""
+    order = np.argsort(asins, kind='stable')
+    asins, offsets = asins[order], offsets[order]
+    last = np.ones(len(asins), dtype=bool)
+    last[:-1] = asins[:-1] != asins[1:]  # keep the last occurrence of duplicates
+    return asins[last], offsets[last]
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def append_records(path, records, index_path=None):
+    """
+    Append raw metadata records (with parent_asin) to the JSONL file; they replace
+    earlier lines of the same asin. An up to date '<path>.idx.npz' sidecar is merged
+    with the new offsets instead of being rebuilt by a full scan.
+    Returns the number of records written.
+    """
+    index_path = index_path or f'{path}.idx.npz'
+    fresh = (os.path.exists(path) and os.path.exists(index_path)
+             and os.path.getmtime(index_path) >= os.path.getmtime(path))
+    asins, offsets = [], []
+    with open(path, 'ab') as f:
+        offset = f.tell()
+        if offset and not _ends_with_newline(path):
+            f.write(b'\n')
+            offset += 1
+        for record in records:
+            line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+            f.write(line)
+            asins.append(record['parent_asin'].encode())
+            offsets.append(offset)
+            offset += len(line)
+    if fresh and asins:
+        with np.load(index_path) as index:
+            old_asins, old_offsets = index['asins'], index['offsets']
+        merged = _sorted_index(np.concatenate([old_asins, np.array(asins, dtype=bytes)]),
+                               np.concatenate([old_offsets, np.array(offsets, dtype=np.int64)]))
+        tmp_path = f'{index_path}.tmp.npz'
+        np.savez(tmp_path, asins=merged[0], offsets=merged[1])
+        os.replace(tmp_path, index_path)
+    return len(asins)
+
+
+class MetadataStore:
+    """
+    Read-only ASIN -> metadata lookup backed by the JSONL file itself.
+    Only a sorted ASIN array and a byte-offset array are held in memory;
+    the sidecar '<path>.idx.npz' is rebuilt when older than the JSONL file.
+    Records are decoded on lookup and the last cache_size ones are kept.
+    Supports metadata.get(asin, default) like the former dict-of-dicts.
+    """
+
+    def __init__(self, path, index_path=None, cache_size=1024):
+        self.path = path
+        self.index_path = index_path or f'{path}.idx.npz'
+        self.asins, self.offsets = self._load_index()
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        self._decode = lru_cache(maxsize=cache_size)(self._read)
+
+    def _load_index(self):
+        if (os.path.exists(self.index_path)
+                and os.path.getmtime(self.index_path) >= os.path.getmtime(self.path)):
+            with np.load(self.index_path) as index:
+                return index['asins'], index['offsets']
+        with span('metadata.build_index', path=self.path) as s:
+            asins, offsets = build_index(self.path)
+            s.set(rows=len(asins))
+        tmp_path = f'{self.index_path}.tmp.npz'
+        np.savez(tmp_path, asins=asins, offsets=offsets)
+        os.replace(tmp_path, self.index_path)
+        return asins, offsets
+
+    def __len__(self):
+        return len(self.asins)
+
+    def __contains__(self, asin):
+        return self.offset(asin) is not None
+
+    def offset(self, asin):
+        """Byte offset of asin's record, None when unknown."""
+        key = asin.encode() if isinstance(asin, str) else asin
+        pos = np.searchsorted(self.asins, key)
+        if pos < len(self.asins) and self.asins[pos] == key:
+            return int(self.offsets[pos])
+        return None
+
+    def _read(self, offset):
+        count('metadata.decode')
+        with self._lock:
+            self._file.seek(offset)
+            line = self._file.readline()
+        try:
+            return display_fields(json.loads(line))
+        except json.JSONDecodeError:
+            return None
+
+    def get(self, asin, default=None):
+        offset = self.offset(asin)
+        if offset is None:
+            return default
+        record = self._decode(offset)
+        return default if record is None else record
+
+    def get_many(self, asins):
+        """Dict asin -> display fields for the known asins, read in file order."""
+        found = sorted((offset, asin) for asin, offset in
+                       ((a, self.offset(a)) for a in set(asins)) if offset is not None)
+        records = {asin: self._decode(offset) for offset, asin in found}
+        return {asin: rec for asin, rec in records.items() if rec is not None}
+
+    def close(self):
+        self._file.close()
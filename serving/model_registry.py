@@ -0,0 +1,169 @@
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+
+import joblib
+
+from monitoring.instrumentation import count, span
+
+REGISTRY_DIR = './models/registry'
+# name -> artifact written by the training scripts (version 0)
+ARTIFACTS = {
+    'svc.ngram_vec': './models/pickle_files/svc/ngram_vec.pkl',
+    'svc.model': './models/pickle_files/svc/final_Lin_SVC.pkl',
+    'nb.count_vect': './models/pickle_files/nb/count_vect_file.pkl',
+    'nb.tfidf_vect': './models/pickle_files/nb/tfidf_vect_file.pkl',
+    'nb.model': './models/pickle_files/nb/final_nb_file.pkl',
+    'knn.model': './models/pickle_files/knn/final_knn.pkl',
+}
+CURRENT = 'current.json'
+_MISSING = object()
+
+
+class ModelRegistry:
+    """
+    Artifacts resolved by name and version, loaded once per process.
+    Version 0 is the pickle of ARTIFACTS written by the training scripts; publish()
+    adds root/<name>/v<version>.joblib and switches root/<name>/current.json to it
+    with an atomic rename, so get(name) returns the rebuilt artifact on its next call
+    while older references stay valid. The numpy arrays of published versions (a
+    fitted vectorizer vocabulary, the training matrix of a knn model, ...) are
+    memory-mapped on load instead of copied in every process. Version 0 is loaded
+    again when the training script rewrites its file (new mtime).
+    Loads are thread-safe (one lock per artifact version); stats holds the load time
+    and size of every loaded version.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, artifacts=None):
+        self.root = root
+        self.artifacts = dict(ARTIFACTS if artifacts is None else artifacts)
+        self.stats = {}
+        self._loaded = {}
+        self._current = {}  # name -> (current.json mtime, version)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        """Version 0 of name."""
+        self.artifacts[name] = path
+
+    def _dir(self, name):
+        return os.path.join(self.root, name)
+
+    def versions(self, name):
+        """Available versions of name, 0 included when its training file exists."""
+        versions = [0] if os.path.exists(self.artifacts.get(name, '')) else []
+        if os.path.isdir(self._dir(name)):
+            versions += sorted(int(f[1:-7]) for f in os.listdir(self._dir(name))
+                               if f.startswith('v') and f.endswith('.joblib') and f[1:-7].isdigit())
+        return versions
+
+    def current(self, name):
+        """Published current version of name, 0 when nothing was published."""
+        path = os.path.join(self._dir(name), CURRENT)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        cached = self._current.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path) as f:
+            version = json.load(f)['version']
+        self._current[name] = (mtime, version)
+        return version
+
+    def path(self, name, version=None):
+        version = self.current(name) if version is None else version
+        if version == 0:
+            if name not in self.artifacts:
+                raise KeyError(f'Unknown model {name}')
+            return self.artifacts[name]
+        path = os.path.join(self._dir(name), f'v{version:04d}.joblib')
+        if os.path.exists(path):
+            return path
+        raise FileNotFoundError(f'{name} version {version} not found in {self.root}')
+
+    def _stamp(self, name, version):
+        """mtime of version 0, rewritten in place by the training scripts (published versions never change)."""
+        return os.stat(self.path(name, 0)).st_mtime_ns if version == 0 else None
+
+    def get(self, name, version=None):
+        """The artifact (current version by default), loaded on the first call only."""
+        current = self.current(name)
+        version = current if version is None else version
+        key = (name, version, self._stamp(name, version))
+        value = self._loaded.get(key, _MISSING)
+        if value is not _MISSING:
+            count('registry.hits')
+            return value
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            value = self._loaded.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._load(name, version)
+                with self._lock:
+                    self._loaded[key] = value
+                    if version == current:  # swapped in: older versions are released
+                        for old in [k for k in self._loaded if k[0] == name and k != key]:
+                            del self._loaded[old]
+                            self._locks.pop(old, None)
+        return value
+
+    def _load(self, name, version):
+        path = self.path(name, version)
+        start = time.perf_counter()
+        with span('registry.load', model=name, version=version):
+            if path.endswith('.joblib'):
+                value = joblib.load(path, mmap_mode='r')
+            else:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+        self.stats[(name, version)] = {'model': name, 'version': version, 'path': path,
+                                       'seconds': round(time.perf_counter() - start, 4),
+                                       'bytes': os.path.getsize(path)}
+        count('registry.loads')
+        return value
+
+    def publish(self, name, value):
+        """Write value as the next version of name and make it current. Returns the version."""
+        os.makedirs(self._dir(name), exist_ok=True)
+        tmp_path = os.path.join(self._dir(name), f'.tmp-{os.getpid()}-{threading.get_ident()}.joblib')
+        with span('registry.publish', model=name):
+            joblib.dump(value, tmp_path)
+            while True:  # another publisher may take the same number
+                version = max(self.versions(name), default=0) + 1
+                path = os.path.join(self._dir(name), f'v{version:04d}.joblib')
+                try:
+                    os.link(tmp_path, path)
+                    break
+                except FileExistsError:
+                    continue
+            os.remove(tmp_path)
+            tmp_current = os.path.join(self._dir(name), f'{CURRENT}.{os.getpid()}.tmp')
+            with open(tmp_current, 'w') as f:
+                json.dump({'version': version, 'published': time.time()}, f)
+            os.replace(tmp_current, os.path.join(self._dir(name), CURRENT))
+        return version
+
+    def report(self):
+        """List of dicts (model, version, path, seconds, bytes) of the loaded versions."""
+        return list(self.stats.values())
+
+
+REGISTRY = ModelRegistry()
+
+
+def get(name, version=None):
+    """Artifact from the process-wide registry."""
+    return REGISTRY.get(name, version)
+
+
+if __name__ == "__main__":
+    # python -m serving.model_registry <name> <rebuilt pickle> : publish it as the next version
+    with open(sys.argv[2], 'rb') as f:
+        print(f"{sys.argv[1]} version {REGISTRY.publish(sys.argv[1], pickle.load(f))}")
@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from monitoring.instrumentation import count, span
+
+STORE_DIR = 'data/model_store'  # a directory under /dev/shm keeps the files in shared memory
+CURRENT = 'current.json'
+
+
+def _array(values):
+    """numpy array that can be memory-mapped: object arrays become fixed-width strings."""
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+def _is_text(values):
+    """Whether values are a 1-d array of str only."""
+    values = np.asarray(values)
+    return (values.ndim == 1 and values.dtype.kind in 'OU'
+            and (values.dtype.kind == 'U' or all(isinstance(v, str) for v in values)))
+
+
+def _decode(offsets, data):
+    """Object array of the strings of a utf-8 buffer cut at offsets."""
+    text = bytes(data).decode('utf-8')
+    if len(text) == len(data):  # ascii: byte offsets are character offsets
+        return np.array([text[start:stop] for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())],
+                        dtype=object)
+    return np.array([bytes(data[start:stop]).decode('utf-8')
+                     for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())], dtype=object)
+
+
+class Artifact:
+    """
+    Read-only version of a published model: values maps each key to a memory-mapped
+    numpy array, a CSR matrix over memory-mapped arrays, or a DataFrame / Series whose
+    numeric columns are memory-mapped.
+    Text columns and indexes are stored as a utf-8 buffer and offsets but decoded into
+    Python str when attached, a copy per process: pandas lookups by asin and the
+    recommenders need str objects. Publish only the text the model reads. Plain str
+    arrays stay fixed-width '<U', memory-mapped and searchable with np.searchsorted.
+    meta : the dict given to publish.
+    """
+
+    def __init__(self, name, version, path, values, meta):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.values = values
+        self.meta = meta
+        self.converted = None  # cached result of ModelStore.get's convert
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+
+class ModelStore:
+    """
+    Versioned store of read-only arrays shared by several processes through
+    memory-mapped files: publish() writes a new version directory and switches
+    '<name>/current.json' to it with an atomic rename; readers attach the current
+    version without copying and pick up the next one on their next get().
+    root/<name>/v<version>/manifest.json describes the stored values.
+    keep : published versions kept on disk (older ones are removed, processes
+    still mapping them keep reading the unlinked files).
+    """
+
+    def __init__(self, root=STORE_DIR, keep=2):
+        self.root = root
+        self.keep = keep
+        self._attached = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, name, version=None):
+        path = os.path.join(self.root, name)
+        return path if version is None else os.path.join(path, f'v{version:06d}')
+
+    def versions(self, name):
+        if not os.path.isdir(self._dir(name)):
+            return []
+        return sorted(int(d[1:]) for d in os.listdir(self._dir(name))
+                      if d.startswith('v') and d[1:].isdigit())
+
+    def current(self, name):
+        """Current version of name, None when nothing was published."""
+        try:
+            with open(os.path.join(self._dir(name), CURRENT)) as f:
+                return json.load(f)['version']
+        except FileNotFoundError:
+            return None
+
+    def current_meta(self, name):
+        """meta given to publish for the current version of name, None when nothing was published."""
+        version = self.current(name)
+        if version is None:
+            return None
+        with open(os.path.join(self._dir(name, version), 'manifest.json')) as f:
+            return json.load(f)['meta']
+
+    def publish(self, name, values, meta=None):
+        """
+        Write values ({key: ndarray | sparse matrix | DataFrame | Series}) as a new
+        version of name and make it current. Returns the version.
+        """
+        os.makedirs(self._dir(name), exist_ok=True)
+        tmp_dir = os.path.join(self._dir(name), f'.tmp-{os.getpid()}-{threading.get_ident()}')
+        with span('model_store.publish', model=name) as s:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            manifest = {'meta': meta or {}, 'values': {k: self._write(tmp_dir, k, v) for k, v in values.items()}}
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            while True:  # another publisher may take the same number
+                version = max(self.versions(name), default=0) + 1
+                try:
+                    os.rename(tmp_dir, self._dir(name, version))
+                    break
+                except OSError:
+                    if not os.path.exists(self._dir(name, version)):
+                        raise
+            tmp_path = os.path.join(self._dir(name), f'{CURRENT}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': version, 'published': time.time()}, f)
+            os.replace(tmp_path, os.path.join(self._dir(name), CURRENT))
+            s.set(version=version, bytes=sum(os.path.getsize(os.path.join(self._dir(name, version), file))
+                                             for file in os.listdir(self._dir(name, version))))
+        self.gc(name)
+        return version
+
+    def _write(self, path, key, value, text=False):
+        if sparse.issparse(value):
+            value = value.tocsr()
+            for part in ('data', 'indices', 'indptr'):
+                np.save(os.path.join(path, f'{key}.{part}.npy'), getattr(value, part))
+            return {'type': 'csr', 'shape': list(value.shape)}
+        if isinstance(value, pd.DataFrame):
+            columns = []
+            for i, col in enumerate(value.columns):
+                columns.append({'name': col, **self._write_column(path, f'{key}.{i}', value[col])})
+            index = self._write(path, f'{key}.index', value.index.to_numpy(), text=True)
+            return {'type': 'frame', 'columns': columns, 'index': index}
+        if isinstance(value, pd.Series):
+            return {'type': 'series', 'name': value.name, 'values': self._write_column(path, key, value),
+                    'index': self._write(path, f'{key}.index', value.index.to_numpy(), text=True)}
+        if text and _is_text(value):  # pandas turns a '<U' index into str objects anyway
+            self._write_text(path, key, value)
+            return {'type': 'text', 'file': key}
+        np.save(os.path.join(path, f'{key}.npy'), _array(value))
+        return {'type': 'array', 'file': f'{key}.npy'}
+
+    def _write_text(self, path, key, values):
+        # utf-8 buffer and offsets: fixed-width '<U' arrays take 4 bytes times the
+        # longest value for every row
+        encoded = [str(value).encode('utf-8') for value in values]
+        np.save(os.path.join(path, f'{key}.offsets.npy'),
+                np.concatenate([[0], np.cumsum([len(b) for b in encoded], dtype=np.int64)]))
+        np.save(os.path.join(path, f'{key}.utf8.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def _read_text(self, path, key):
+        return _decode(self._load(path, f'{key}.offsets.npy'), self._load(path, f'{key}.utf8.npy'))
+
+    def _write_column(self, path, key, column):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(path, f'{key}.codes.npy'), column.cat.codes.to_numpy())
+            np.save(os.path.join(path, f'{key}.categories.npy'), _array(column.cat.categories.to_numpy()))
+            return {'kind': 'category', 'file': key}
+        if (column.dtype == object or pd.api.types.is_string_dtype(column)) and not column.isna().any():
+            self._write_text(path, key, column)
+            return {'kind': 'text', 'file': key}
+        np.save(os.path.join(path, f'{key}.npy'), _array(column.to_numpy()))
+        return {'kind': 'array', 'file': key}
+
+    def attach(self, name, version=None):
+        """Artifact of a version of name (the current one by default), memory-mapped."""
+        version = self.current(name) if version is None else version
+        if version is None:
+            raise FileNotFoundError(f'{name} has not been published in {self.root}')
+        path = self._dir(name, version)
+        with span('model_store.attach', model=name, version=version):
+            with open(os.path.join(path, 'manifest.json')) as f:
+                manifest = json.load(f)
+            values = {key: self._read(path, key, spec) for key, spec in manifest['values'].items()}
+        count('model_store.attach')
+        return Artifact(name, version, path, values, manifest['meta'])
+
+    def _load(self, path, file):
+        return np.load(os.path.join(path, file), mmap_mode='r')
+
+    def _read(self, path, key, spec):
+        if spec['type'] == 'csr':
+            parts = [self._load(path, f'{key}.{part}.npy') for part in ('data', 'indices', 'indptr')]
+            return sparse.csr_matrix(tuple(parts), shape=tuple(spec['shape']), copy=False)
+        if spec['type'] == 'frame':
+            index = self._read(path, f'{key}.index', spec['index'])
+            return pd.DataFrame({c['name']: self._read_column(path, c) for c in spec['columns']},
+                                index=index, copy=False)
+        if spec['type'] == 'series':
+            return pd.Series(self._read_column(path, spec['values']), name=spec['name'],
+                             index=self._read(path, f'{key}.index', spec['index']), copy=False)
+        if spec['type'] == 'text':
+            return self._read_text(path, spec['file'])
+        return self._load(path, spec['file'])
+
+    def _read_column(self, path, spec):
+        if spec['kind'] == 'category':
+            return pd.Categorical.from_codes(self._load(path, f"{spec['file']}.codes.npy"),
+                                             self._load(path, f"{spec['file']}.categories.npy"))
+        if spec['kind'] == 'text':
+            return self._read_text(path, spec['file'])
+        return self._load(path, f"{spec['file']}.npy")
+
+    def get(self, name, convert=None):
+        """
+        Artifact of the current version of name, attached once per process and
+        re-attached after a new publish. convert : function(artifact) whose result is
+        cached with the version and returned instead of the artifact.
+        """
+        version = self.current(name)
+        with self._lock:
+            artifact = self._attached.get(name)
+            if artifact is None or artifact.version != version:
+                artifact = self.attach(name, version)
+                self._attached[name] = artifact
+            if convert is None:
+                return artifact
+            if artifact.converted is None:
+                artifact.converted = convert(artifact)
+            return artifact.converted
+
+    def gc(self, name):
+        """Remove the versions older than the keep last ones, never the current one."""
+        current = self.current(name)
+        for version in self.versions(name)[:-self.keep]:
+            if version != current:
+                shutil.rmtree(self._dir(name, version), ignore_errors=True)
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from data_processing import near_duplicates
+from recommendation_filters import content_based_filter, popularity_filter
+from serving.lazy_models import source_key
+
+MISSING = -1  # padding of the neighbour arrays
+ABSENT = -2  # whole row: the model failed for this asin, lookups miss and the caller falls back
+GLOBAL_TABLES = {'popularity'}  # single row tables, same list for every asin
+
+_worker = {}  # models shared with the pool workers
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(models):
+    _worker.update(models)
+
+
+def _encode(recs, asins, top_n):
+    """int32 row of the positions of recs in the sorted asins array, padded with MISSING."""
+    row = np.full(top_n, MISSING, dtype=np.int32)
+    if len(recs) == 0:
+        return row
+    keys = np.array([str(r).encode() for r in recs], dtype=bytes)
+    pos = np.searchsorted(asins, keys).clip(0, len(asins) - 1)
+    pos = pos[asins[pos] == keys][:top_n]
+    row[:len(pos)] = pos
+    return row
+
+
+def _content_rows(chunk):
+    m = _worker
+    rows = []
+    for asin in chunk:
+        # same list as the live model, the query item included
+        recs = content_based_filter.recommend(asin, m['cosine_sim'], m['indices'], m['cbf_df'],
+                                              clusters=m['clusters'], top_n=m['top_n'], **m['content_params'])
+        rows.append(_encode(recs, m['asins'], m['top_n']))
+    return np.vstack(rows)
+
+
+def _collaborative_rows(chunk):
+    from models import collaborative_model_based
+    m = _worker
+    rows = []
+    for asin in chunk:
+        try:
+            recs = collaborative_model_based.recommend(asin, m['svd_model'], **m['collaborative_params'])
+        except Exception as e:
+            logger.debug('collaborative model failed for %s: %r', asin, e)
+            rows.append(np.full(m['top_n'], ABSENT, dtype=np.int32))
+            continue
+        rows.append(_encode(recs, m['asins'], m['top_n']))
+    return np.vstack(rows)
+
+
+def build_tables(out_dir, df_path='data/traitees/final.json.gz', top_n=10,
+                 models=('content', 'collaborative', 'popularity'), n_jobs=None, chunk_size=500,
+                 content_params=None, collaborative_params=None, popularity_params=None, sample_frac=0.5,
+                 clusters=None, clusters_path=near_duplicates.CLUSTERS_PATH):
+    """
+    Precompute the top_n recommendations of every asin of the `indices` map.
+    out_dir will contain:
+    asins.npy : sorted fixed-width bytes asin dictionary
+    <model>.npy : int32 (len(asins), top_n) positions into asins, -1 padded
+    popularity.npy : one row, the list does not depend on the asin
+    meta.json : build parameters, rows the model failed on and the (mtime_ns, size)
+    of the data and cluster files, checked by PrecomputedTables.stale
+    n_jobs : worker processes, all cores by default
+    sample_frac : fraction of the reviews the collaborative model is trained on, as in the app
+    clusters : near_duplicates.load_clusters Series; content and popularity lists then keep
+    one product per near-duplicate cluster, as the app's live models do
+    clusters_path : file clusters were loaded from, recorded for the staleness check
+    Returns the meta dict.
+    """
+    content_params = content_params or {'lim': 5, 'min_rate': 2}
+    collaborative_params = collaborative_params or {'corr_thresh': 0.5}
+    popularity_params = popularity_params or {'rev_count': 25, 'rating': 3, 'sentiment': 0.6}
+
+    cbf_df = content_based_filter.cbf_data(df_path)
+    if clusters is not None:
+        cbf_df = content_based_filter.representatives(cbf_df, clusters)
+    indices = content_based_filter.indices(cbf_df, clusters)
+    asins = np.sort(np.array(indices.index.astype(str).tolist(), dtype=bytes))
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, 'asins.npy'), asins)
+
+    shared = {'asins': asins, 'top_n': top_n, 'clusters': clusters,
+              'content_params': content_params, 'collaborative_params': collaborative_params}
+    jobs = {}
+    if 'content' in models:
+        shared.update(cbf_df=cbf_df, indices=indices,
+                      cosine_sim=content_based_filter.cosine_sim(cbf_df['description']))
+        jobs['content'] = _content_rows
+    if 'collaborative' in models:
+        from models import collaborative_model_based
+        shared['svd_model'] = collaborative_model_based.train(
+            df_path=df_path, sample_frac=sample_frac, idx='asin', col='reviewerID', val='positive_prob')
+        jobs['collaborative'] = _collaborative_rows
+
+    asin_list = [a.decode() for a in asins]
+    chunks = [asin_list[i:i + chunk_size] for i in range(0, len(asin_list), chunk_size)]
+    failures = {}
+    with Pool(n_jobs or cpu_count(), initializer=_init_worker, initargs=(shared,)) as pool:
+        for name, rows in jobs.items():
+            table = np.vstack(pool.map(rows, chunks)) if chunks else np.empty((0, top_n), np.int32)
+            failures[name] = int((table[:, 0] == ABSENT).sum()) if len(table) else 0
+            if failures[name]:
+                logger.warning('%s: the model failed on %d of %d asins, no row stored for them',
+                               name, failures[name], len(table))
+            _save(out_dir, name, table)
+
+    if 'popularity' in models:
+        recs = popularity_filter.recommend(df_path, **popularity_params)
+        if clusters is not None:
+            recs = content_based_filter.collapse(recs, clusters)
+        _save(out_dir, 'popularity', _encode(recs, asins, top_n)[None, :])
+
+    sources = [df_path] + ([clusters_path] if clusters is not None else [])
+    meta = {'df_path': df_path, 'top_n': top_n, 'models': list(models), 'sample_frac': sample_frac,
+            'content_params': content_params,
+            'collaborative_params': collaborative_params,
+            'popularity_params': popularity_params,
+            'near_duplicates': clusters is not None,
+            'failures': failures,
+            'sources': dict(zip(sources, source_key(sources)))}
+    tmp_path = os.path.join(out_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, 'meta.json'))
+    return meta
+
+
+def _save(out_dir, name, table):
+    tmp_path = os.path.join(out_dir, f'{name}.tmp.npy')
+    np.save(tmp_path, table.astype(np.int32))
+    os.replace(tmp_path, os.path.join(out_dir, f'{name}.npy'))
+
+
+def read_meta(path):
+    """meta.json of the tables in path, {} when there is none."""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def is_stale(meta):
+    """True when a data file the tables were built from changed since (or no tables)."""
+    sources = meta.get('sources')
+    if not sources:
+        return True
+    return source_key(sources) != tuple(None if key is None else tuple(key) for key in sources.values())
+
+
+def fresh_models(path):
+    """Models with a table in path built from the current data files, [] when stale."""
+    meta = read_meta(path)
+    return [] if is_stale(meta) else meta['models']
+
+
+class PrecomputedTables:
+    """
+    Read-only, memory-mapped view of the tables written by build_tables.
+    Lookups cost one binary search in the asin dictionary plus one row read,
+    no model is needed in memory. Every lookup misses (None) once the data or
+    cluster file the tables were built from has changed, so that the caller falls
+    back to the live model until the tables are rebuilt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        self.asins = np.load(os.path.join(path, 'asins.npy'), mmap_mode='r')
+        self.tables = {}
+        for file in os.listdir(path):
+            name, ext = os.path.splitext(file)
+            if ext == '.npy' and name != 'asins' and not name.endswith('.tmp'):
+                self.tables[name] = np.load(os.path.join(path, file), mmap_mode='r')
+
+    def __contains__(self, model):
+        return model in self.tables
+
+    @property
+    def stale(self):
+        return is_stale(self.meta)
+
+    def position(self, asin):
+        key = asin.encode() if isinstance(asin, str) else asin
+        pos = int(np.searchsorted(self.asins, key))
+        if pos < len(self.asins) and self.asins[pos] == key:
+            return pos
+        return None
+
+    def lookup(self, model, asin):
+        """List of recommended asins, None when the asin has no row or the tables are stale."""
+        if self.stale:
+            return None
+        table = self.tables[model]
+        if model in GLOBAL_TABLES:
+            row = table[0]
+        else:
+            pos = self.position(asin)
+            if pos is None:
+                return None
+            row = table[pos]
+        if len(row) and row[0] == ABSENT:
+            return None
+        return [self.asins[i].decode() for i in row[row != MISSING]]
+
+
+def load_clusters(path=near_duplicates.CLUSTERS_PATH):
+    """Clusters of the near_duplicates stage, None when it was not run."""
+    return near_duplicates.load_clusters(path) if os.path.exists(path) else None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_tables('data/precomputed', clusters=load_clusters())
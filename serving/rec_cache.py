@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+from monitoring.instrumentation import count
+
+
+def cache_key(model, asin, params=None, version=None):
+    """Hashable key (model, asin, sorted params, model version)."""
+    return model, asin, tuple(sorted((params or {}).items())), version
+
+
+class RecommendationCache:
+    """
+    Process-wide recommendation cache, thread-safe.
+    maxsize : maximum number of cached lists, least recently used evicted first
+    ttl : seconds an entry stays valid, None for no expiry
+    Entries are keyed by (model, asin, params, version): when a model's
+    artifacts are rebuilt its version changes and old entries stop matching,
+    invalidate(model) drops them right away.
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, recs)
+        self._lock = threading.Lock()
+        self.versions = {}  # model -> last version seen by set_version
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, model, asin, params=None, version=None):
+        """Cached list or None."""
+        key = cache_key(model, asin, params, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[0] < self.clock():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                count('rec_cache.miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        count('rec_cache.hit')
+        return list(entry[1])
+
+    def put(self, model, asin, recs, params=None, version=None):
+        key = cache_key(model, asin, params, version)
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, tuple(recs))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, model, asin, compute, params=None, version=None):
+        """
+        Cached recommendations, or compute(asin, **params) stored then returned.
+        Concurrent misses on the same key may both compute, the last one is kept.
+        """
+        recs = self.get(model, asin, params, version)
+        if recs is None:
+            recs = list(compute(asin, **(params or {})))
+            self.put(model, asin, recs, params, version)
+        return recs
+
+    def invalidate(self, model=None):
+        """Drop all entries of model (every entry when model is None)."""
+        with self._lock:
+            if model is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == model]:
+                    del self._entries[key]
+
+    def set_version(self, model, version):
+        """Record the current version of model, dropping its entries when it changed."""
+        with self._lock:
+            previous = self.versions.get(model, version)
+            self.versions[model] = version
+        if previous != version:
+            self.invalidate(model)
+            count('rec_cache.invalidate')
+
+    def prewarm(self, model, asins, compute, params=None, version=None, background=True):
+        """
+        Compute and store recommendations for asins not cached yet, without
+        counting lookups, hits or misses. Runs in a daemon thread by default and returns it.
+        """
+        def warm():
+            for asin in asins:
+                key = cache_key(model, asin, params, version)
+                if key in self._entries:
+                    continue
+                try:
+                    recs = compute(asin, **(params or {}))
+                except Exception:
+                    continue
+                self.put(model, asin, recs, params, version)
+
+        if not background:
+            warm()
+            return None
+        thread = threading.Thread(target=warm, name=f'prewarm-{model}', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expired': self.expired}
@@ -0,0 +1,169 @@
+import numpy as np
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+class TitleIndex:
+    """
+    Search index over product titles.
+    titles : iterable of titles (None/NaN skipped, duplicates kept once)
+    asins : iterable of asins aligned with titles, for the title -> asin map
+    n : largest n-gram size of the postings
+    chunk_size : titles encoded at a time while building
+
+    Every query matches the titles containing it (same matches as
+    `query in title.lower()`, spaces included). The postings of every 1..n-gram
+    are sorted numpy arrays: a query of at most n characters reads its own
+    posting, a longer one intersects the postings of its n-grams, shortest first,
+    and checks the remaining candidates. Matches are ranked with numpy: exact
+    title, then title prefix, then word prefix, then shorter titles first.
+    """
+
+    def __init__(self, titles, asins=None, n=3, chunk_size=50000):
+        self.n = n
+        self.titles = []
+        self.asin_of = {}
+        asins = asins if asins is not None else [None] * len(titles)
+        for title, asin in zip(titles, asins):
+            if not isinstance(title, str):
+                continue
+            if title not in self.asin_of:
+                self.titles.append(title)
+                self.asin_of[title] = asin  # first asin seen, as name_df[...]['asin'].values[0]
+        self.keys = [t.lower() for t in self.titles]
+        self.lengths = np.array([len(k) for k in self.keys], dtype=np.int32)
+
+        # characters are numbered 1..len(alphabet), 0 separates the titles; a gram is
+        # the base len(alphabet) + 1 number of its characters
+        self.alphabet = {c: i for i, c in enumerate(sorted(set(''.join(self.keys))), 1)}
+        self.base = len(self.alphabet) + 1
+        n_titles = max(len(self.keys), 1)
+        if self.base ** n * n_titles >= 2 ** 63:
+            raise ValueError(f'{self.base - 1} distinct characters, {n_titles} titles: '
+                             f'(n={n} gram, title) pairs do not fit in int64')
+        codepoints = np.array([0] + [ord(c) for c in self.alphabet], dtype=np.uint32)
+
+        # one size at a time: the (gram, title) pairs of a single size are in memory
+        self.postings = {}  # size -> (sorted gram codes, start of each gram in ids, title ids)
+        heads = []
+        for size in range(1, n + 1):
+            chunks = []
+            for chars, ids, firsts, lengths in self._encode(codepoints, chunk_size):
+                if size == 1:
+                    heads.append(self._heads(chars, firsts, lengths))
+                codes, valid = np.zeros(len(chars) - size + 1, dtype=np.int64), True
+                for j in range(size):
+                    part = chars[j:len(chars) - size + 1 + j]
+                    codes = codes * self.base + part
+                    valid = valid & (part > 0)
+                # gram * n_titles + title, once per (gram, title)
+                pair = np.sort(codes[valid] * n_titles + ids[:len(valid)][valid])
+                chunks.append(pair[np.diff(pair, prepend=-1) != 0])
+            pair = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+            del chunks
+            pair.sort()  # by gram then title
+            ids = (pair % n_titles).astype(np.int32)
+            pair //= n_titles
+            starts = np.flatnonzero(np.diff(pair, prepend=-1))
+            self.postings[size] = (pair[starts], np.append(starts, len(pair)), ids)
+        self.heads = np.concatenate(heads) if heads else np.empty(0, dtype=np.int64)
+
+    def _encode(self, codepoints, chunk_size):
+        """
+        Per chunk of chunk_size titles: (character numbers of the titles joined by 0,
+        title id of each position, first position and length of each title).
+        """
+        for start in range(0, len(self.keys), chunk_size):
+            keys = self.keys[start:start + chunk_size]
+            text = np.frombuffer(('\0'.join(keys) + '\0').encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+            lengths = self.lengths[start:start + len(keys)]
+            yield (np.searchsorted(codepoints, text).astype(np.int64),
+                   np.repeat(np.arange(start, start + len(keys), dtype=np.int64), lengths + 1),
+                   np.concatenate([[0], np.cumsum(lengths + 1)[:-1]]), lengths)
+
+    def _heads(self, chars, firsts, lengths):
+        """Code of the first n characters of each title, 0 padded."""
+        heads = np.zeros(len(firsts), dtype=np.int64)
+        for j in range(self.n):
+            part = np.where(lengths > j, chars[np.minimum(firsts + j, len(chars) - 1)], 0)
+            heads = heads * self.base + part
+        return heads
+
+    def __len__(self):
+        return len(self.titles)
+
+    def asin(self, title):
+        """Asin of title, None when unknown."""
+        return self.asin_of.get(title)
+
+    def _code(self, gram):
+        """Code of gram, None when one of its characters is in no title."""
+        code = 0
+        for c in gram:
+            if c not in self.alphabet:
+                return None
+            code = code * self.base + self.alphabet[c]
+        return code
+
+    def _postings(self, gram):
+        """Sorted ids of the titles containing gram (1 to n characters)."""
+        code = self._code(gram)
+        if code is None:
+            return _EMPTY
+        codes, starts, ids = self.postings[len(gram)]
+        pos = int(np.searchsorted(codes, code))
+        if pos == len(codes) or codes[pos] != code:
+            return _EMPTY
+        return ids[starts[pos]:starts[pos + 1]]
+
+    def _matches(self, query):
+        """Sorted ids of the titles containing query."""
+        if len(query) <= self.n:
+            return self._postings(query)
+        postings = sorted((self._postings(query[i:i + self.n]) for i in range(len(query) - self.n + 1)), key=len)
+        ids = postings[0]
+        for p in postings[1:]:
+            if len(ids) == 0:
+                break
+            ids = np.intersect1d(ids, p, assume_unique=True)
+        return ids[[query in self.keys[i] for i in ids.tolist()]] if len(ids) else ids
+
+    def _is_prefix(self, ids, query):
+        """For each title of ids, whether it starts with query."""
+        head = self._code(query[:self.n])
+        if head is None:
+            return np.zeros(len(ids), dtype=bool)
+        width = self.base ** (self.n - min(len(query), self.n))
+        prefix = self.heads[ids] // width == head
+        if len(query) > self.n:
+            candidates = np.flatnonzero(prefix)
+            prefix[candidates] = [self.keys[i].startswith(query) for i in ids[candidates].tolist()]
+        return prefix
+
+    def _has_word(self, ids, query):
+        """For each title of ids, whether one of its words (after the first) starts with query."""
+        word = f' {query}'
+        if len(word) <= self.n:
+            word_ids = self._postings(word)
+            pos = np.searchsorted(word_ids, ids).clip(0, max(len(word_ids) - 1, 0))
+            return word_ids[pos] == ids if len(word_ids) else np.zeros(len(ids), dtype=bool)
+        return np.array([word in self.keys[i] for i in ids.tolist()], dtype=bool)
+
+    def search(self, query, k=100):
+        """Top-k titles containing query (case-insensitive), best ranked first."""
+        query = query.lower()
+        if not query:
+            return self.titles[:k]
+        ids = self._matches(query)
+        if len(ids) == 0:
+            return []
+        ids = ids.astype(np.int64)
+        lengths = self.lengths[ids].astype(np.int64)
+        prefix = self._is_prefix(ids, query)
+        rank = np.where(prefix, np.where(lengths == len(query), 0, 1), 3)
+        others = np.flatnonzero(~prefix)
+        rank[others[self._has_word(ids[others], query)]] = 2
+        order = (rank * (int(self.lengths.max()) + 1) + lengths) * len(self.keys) + ids  # (rank, len, id)
+        if len(order) > k:
+            order = np.partition(order, k - 1)[:k]
+        return [self.titles[i] for i in (np.sort(order) % len(self.keys)).tolist()]
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+# the packages are imported from the repository root, as with PYTHONPATH=.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def spark():
+    """Local-mode SparkSession on one core, skipped when pyspark is not installed."""
+    pytest.importorskip('pyspark')
+    pytest.importorskip('pyarrow')  # pandas UDFs and parquet
+    from data_processing.spark_etl import get_spark
+    session = get_spark('tests', master='local[1]', conf={'spark.sql.shuffle.partitions': '2',
+                                                          'spark.ui.enabled': 'false'})
+    yield session
+    session.stop()
+
+
+@pytest.fixture(scope='session')
+def final_path(tmp_path_factory):
+    """Small final.json.gz (the review table of the pipeline); asins 0/1, 2/3, ..., 8/9 share their description."""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    words = [f'w{i}' for i in range(120)]
+    descriptions = [' '.join(rng.choice(words, 30)) for _ in range(60)]
+    for i in range(0, 10, 2):
+        descriptions[i + 1] = descriptions[i]
+    rows = []
+    for _ in range(800):
+        i = int(rng.integers(0, 60))
+        rows.append({'asin': f'B{i:05d}', 'description': descriptions[i], 'title': f'title {i}',
+                     'price': float(10 + i % 7), 'overall': float(rng.integers(1, 6)),
+                     'reviewerID': f'U{int(rng.integers(0, 80))}', 'positive_prob': float(rng.random()),
+                     'main_cat': ['Beauty', 'Tools'][i % 2], 'reviewText': f'review {i}', 'summary': 'ok',
+                     'review_count': 30, 'reviewText_senti': 1})
+    path = tmp_path_factory.mktemp('data') / 'final.json.gz'
+    pd.DataFrame(rows).to_json(path, compression='gzip')
+    return str(path)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraping import async_scraper
+from scraping.async_scraper import AsyncScraper, TokenBucket, _RequestsClient
+from scraping.page_cache import PageCache
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Stub shop: /<name> answers the next (status, headers, body) of script[name], then
+    repeats the last one. Answers 304 when If-None-Match matches the ETag it would send.
+    """
+    script = {}
+    log = []  # (time, path, request headers)
+
+    def do_GET(self):
+        self.log.append((time.monotonic(), self.path, dict(self.headers)))
+        answers = self.script.get(self.path.lstrip('/'), [(404, {}, 'missing')])
+        status, headers, body = answers.pop(0) if len(answers) > 1 else answers[0]
+        if status == 200 and headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            status, body = 304, ''
+        data = body.encode()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def port():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)  # free port
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def shop(port):
+    Handler.script.clear()
+    Handler.log.clear()
+    return f'http://127.0.0.1:{port}'
+
+
+def parse(html, url):
+    return {'asin': url.rsplit('/', 1)[-1], 'title': html}
+
+
+def run(urls, **kwargs):
+    """Results by url and the scraper, through a _RequestsClient injected as client=."""
+    kwargs = dict({'rate': 1000, 'burst': 100, 'backoff': 0.01, 'parse': parse}, **kwargs)
+
+    async def go():
+        scraper = AsyncScraper(client=_RequestsClient(8, 5, {}), **kwargs)
+        try:
+            return {url: (product, error) async for url, product, error in scraper.scrape(urls)}, scraper
+        finally:
+            await scraper.client.close()
+
+    return asyncio.run(go())
+
+
+def test_retries_with_exponential_backoff(shop, monkeypatch):
+    monkeypatch.setattr(async_scraper.random, 'random', lambda: 0.0)  # no jitter
+    Handler.script['A1'] = [(503, {}, 'busy'), (500, {}, 'oops'), (200, {}, 'Shampoo')]
+    start = time.monotonic()
+    results, scraper = run([f'{shop}/A1'], backoff=0.1)
+    assert results[f'{shop}/A1'] == ({'asin': 'A1', 'title': 'Shampoo'}, None)
+    assert scraper.stats['retries'] == 2 and scraper.stats['failures'] == 0
+    assert time.monotonic() - start >= 0.1 + 0.2  # backoff * 2 ** attempt
+
+
+def test_gives_up_after_retries(shop):
+    Handler.script['A1'] = [(503, {}, 'busy')]
+    Handler.script['A2'] = [(404, {}, 'gone')]
+    results, scraper = run([f'{shop}/A1', f'{shop}/A2'], retries=2)
+    assert results[f'{shop}/A1'] == (None, 'RuntimeError: HTTP 503')
+    assert results[f'{shop}/A2'] == (None, 'RuntimeError: HTTP 404')  # not retried
+    assert [path for _, path, _ in Handler.log].count('/A1') == 3
+    assert [path for _, path, _ in Handler.log].count('/A2') == 1
+    assert scraper.stats['failures'] == 2
+
+
+def test_retry_after_pauses_the_host(shop):
+    Handler.script['A1'] = [(429, {'Retry-After': '0.4'}, 'slow down'), (200, {}, 'Shampoo')]
+    Handler.script['A2'] = [(200, {}, 'Soap')]
+    results, _ = run([f'{shop}/A1', f'{shop}/A2'], concurrency=1, backoff=10)
+    assert results[f'{shop}/A1'][0]['title'] == 'Shampoo' and results[f'{shop}/A2'][0]['title'] == 'Soap'
+    times = [t for t, _, _ in Handler.log]
+    assert [path for _, path, _ in Handler.log] == ['/A1', '/A1', '/A2']
+    assert times[1] - times[0] >= 0.4  # the Retry-After delay instead of the 10 s backoff
+    assert times[1] - times[0] < 5
+
+
+def test_not_modified_pages_are_skipped(shop, tmp_path):
+    Handler.script['A1'] = [(200, {'ETag': '"v1"'}, 'Shampoo')]
+    Handler.script['A2'] = [(200, {}, 'Soap')]
+    urls = [f'{shop}/A1', f'{shop}/A2']
+    cache = PageCache(str(tmp_path / 'cache.json'))
+    results, _ = run(urls, cache=cache)
+    assert all(product is not None for product, _ in results.values())
+
+    results, scraper = run(urls, cache=PageCache(cache.path))
+    assert results == {url: (None, None) for url in urls}  # nothing new
+    requests = {path: headers for _, path, headers in Handler.log[2:]}
+    assert requests['/A1'].get('If-None-Match') == '"v1"'  # answered 304
+    assert 'If-None-Match' not in requests['/A2']  # same body hash
+    assert scraper.stats['unchanged'] == 2 and scraper.stats['pages'] == 0 and scraper.stats['bytes'] == len('Soap')
+
+    Handler.script['A2'] = [(200, {}, 'Soap Bar')]
+    results, _ = run(urls, cache=PageCache(cache.path))
+    assert results[f'{shop}/A2'] == ({'asin': 'A2', 'title': 'Soap Bar'}, None) and results[f'{shop}/A1'] == (None, None)
+
+
+def test_per_host_rate_limit(shop, port):
+    for i in range(6):
+        Handler.script[f'A{i}'] = [(200, {}, f'Product {i}')]
+    other = f'http://localhost:{port}'  # same server, another host name: its own bucket
+    urls = [f'{host}/A{i}' for i in range(6) for host in (shop, other)]
+    start = time.monotonic()
+    results, _ = run(urls, rate=10, burst=1, concurrency=12)
+    elapsed = time.monotonic() - start
+    assert all(product is not None for product, _ in results.values())
+    for host in ('127.0.0.1', 'localhost'):
+        times = sorted(t for t, _, headers in Handler.log if headers['Host'].startswith(host))
+        assert len(times) == 6
+        assert times[-1] - times[0] >= 5 / 10 - 0.05  # 10 requests per second per host
+    assert elapsed < 6 / 10 * 2  # the two hosts are served in parallel
+
+
+def test_token_bucket_pause():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0])
+    asyncio.run(bucket.acquire())
+    bucket.pause(3)
+    assert bucket.tokens == -6  # 3 s at 2 tokens per second before the next one
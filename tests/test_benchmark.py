@@ -0,0 +1,55 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+from benchmarks import benchmark
+
+
+def test_latency_stats():
+    stats = benchmark.latency_stats([0.001] * 98 + [0.1, 0.2])
+    assert stats['n'] == 100 and stats['p50_ms'] == pytest.approx(1.0)
+    assert stats['p99_ms'] > 99 and stats['mean_ms'] == pytest.approx((98 * 1 + 100 + 200) / 100)
+    assert stats['qps'] == pytest.approx(100 / 0.398)
+    assert benchmark.latency_stats([0.0, 0.0])['qps'] is None
+
+
+def test_measure_latency_warms_up_first():
+    calls = []
+    stats = benchmark.measure_latency(calls.append, list(range(5)), warmup=2)
+    assert calls == [0, 1, 0, 1, 2, 3, 4] and stats['n'] == 5
+
+
+def test_measure_stage_runs_in_a_fresh_process(tmp_path, final_path):
+    dest = str(tmp_path / 'head.json.gz')
+    result = benchmark.measure_stage(benchmark.head_json, final_path, dest, 25)
+    assert result['wall_s'] > 0 and len(pd.read_json(dest)) == 25
+    if benchmark.resource is not None:
+        assert result['peak_rss_mb'] > 0
+    assert benchmark.measure_stage(sys.exit, 3) == {'error': 'exit code 3'}
+
+
+def test_bench_recommenders(final_path):
+    results = benchmark.bench_recommenders(final_path, n_queries=20, collaborative=False)
+    assert [r['model'] for r in results] == ['content', 'popularity']
+    assert results[0]['n'] == 20 and results[1]['n'] == 10 and results[0]['n_items'] == 60
+
+
+def test_compare_reports_regressions(tmp_path):
+    def report(path, results):
+        with open(path, 'w') as f:
+            json.dump({'environment': {}, 'results': results}, f)
+        return path
+
+    old = report(str(tmp_path / 'old.json'), [
+        {'bench': 'recommend', 'model': 'content', 'n_items': 60, 'p95_ms': 10.0},
+        {'bench': 'stage', 'stage': 'meta_clean', 'rows': 100, 'wall_s': 2.0, 'peak_rss_mb': 100.0}])
+    new = report(str(tmp_path / 'new.json'), [
+        {'bench': 'recommend', 'model': 'content', 'n_items': 60, 'p95_ms': 10.5},
+        {'bench': 'stage', 'stage': 'meta_clean', 'rows': 100, 'wall_s': 3.0, 'peak_rss_mb': 90.0},
+        {'bench': 'stage', 'stage': 'final_data', 'rows': 100, 'wall_s': 9.0}])
+    regressions = benchmark.compare(old, new)
+    assert regressions == [{'key': ('stage', None, 'meta_clean', 100, None, None), 'metric': 'wall_s',
+                            'old': 2.0, 'new': 3.0, 'change': 0.5}]
+    assert benchmark.compare(old, new, threshold=0.01)[0]['metric'] == 'p95_ms'
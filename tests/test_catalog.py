@@ -0,0 +1,80 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from serving import catalog
+from serving.catalog import Catalog
+from serving.precomputed import PrecomputedTables
+
+PARAMS = {'models': ('content', 'popularity'),
+          'popularity_params': {'rev_count': 1, 'rating': 1, 'sentiment': 0.0}}
+
+
+@pytest.fixture(scope='module')
+def built(tmp_path_factory, final_path):
+    out = str(tmp_path_factory.mktemp('catalog'))
+    names = catalog.build_catalog(final_path, out, n_jobs=1, **PARAMS)
+    return out, names
+
+
+def test_shard_name():
+    assert catalog.shard_name('All Beauty') == 'all_beauty'
+    assert catalog.shard_name('Tools & Home Improvement') == 'tools_home_improvement'
+    assert catalog.shard_name(None) == catalog.shard_name('&') == catalog.DEFAULT_SHARD
+
+
+def test_split_routes_every_asin_to_its_category(built, final_path):
+    out, names = built
+    df = pd.read_json(final_path)
+    assert names == ['beauty', 'tools']
+    with open(os.path.join(out, 'shards.json')) as f:
+        manifest = json.load(f)
+    assert {n: m['category'] for n, m in manifest.items()} == {'beauty': 'Beauty', 'tools': 'Tools'}
+    assert sum(m['reviews'] for m in manifest.values()) == len(df)
+
+    shards = Catalog(out)
+    assert len(shards) == df['asin'].nunique()
+    first = df.drop_duplicates('asin').set_index('asin')['main_cat']
+    assert all(shards.shard_of(asin) == catalog.shard_name(cat) for asin, cat in first.items())
+    assert shards.shard_of('unknown') is None
+    for name in names:
+        part = pd.read_json(os.path.join(out, name, 'final.json.gz'))
+        assert set(part['main_cat']) == {manifest[name]['category']}
+
+
+def test_router_reads_the_shard_tables(built):
+    out, names = built
+    shards = Catalog(out, max_loaded=1)
+    for name in names:
+        tables = PrecomputedTables(os.path.join(out, name, 'tables'))
+        for asin in tables.asins[:10]:
+            asin = asin.decode()
+            recs = shards.lookup('content', asin)
+            assert recs == tables.lookup('content', asin)
+            assert all(shards.shard_of(r) == name for r in recs)
+    assert len(shards._loaded) == 1  # least recently used shard closed
+    assert shards.lookup('content', 'unknown') is None and shards.lookup('collaborative', asin) is None
+
+    beauty = shards.shard('beauty').asins[0].decode()
+    tools = shards.shard('tools').asins[0].decode()
+    merged = shards.lookup_many('content', [beauty, tools], top_n=6)
+    assert len(merged) <= 6 and beauty not in merged and tools not in merged
+    lists = [[r for r in shards.lookup('content', a) if r not in (beauty, tools)] for a in (beauty, tools)]
+    assert merged == catalog.merge(lists, 6) and merged[:2] == [lists[0][0], lists[1][0]]
+    assert shards.popular(top_n=4) == catalog.merge([shards.shard(n).lookup('popularity', None) for n in names], 4)
+
+
+def test_merge():
+    assert catalog.merge([['a', 'b', 'c'], ['b', 'd'], []]) == ['a', 'b', 'd', 'c']
+    assert catalog.merge([['a', 'b'], ['c', 'd']], top_n=3) == ['a', 'c', 'b']
+
+
+def test_rebuild_one_shard(tmp_path, final_path):
+    out = str(tmp_path / 'catalog')
+    assert catalog.build_catalog(final_path, out, shards=['tools'], n_jobs=1, **PARAMS) == ['tools']
+    assert sorted(os.listdir(out)) == ['asins.npy', 'shard_ids.npy', 'shards.json', 'tools']
+    shards = Catalog(out)
+    assert shards.names == ['beauty', 'tools'] and shards.shard_of('B00001') == 'tools'
+    assert shards.lookup('content', 'B00001') is not None
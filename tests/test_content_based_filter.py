@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from recommendation_filters import content_based_filter
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({'asin': [f'A{i:04d}' for i in range(n)],
+                       'price': rng.integers(0, 20, n).astype(float),
+                       'overall': rng.integers(1, 6, n).astype(float)})
+    df.loc[7, 'price'] = np.nan
+    words = [f'w{i}' for i in range(60)]
+    descriptions = [' '.join(rng.choice(words, 8)) for _ in range(n)]
+    return df, content_based_filter.indices(df), descriptions
+
+
+def reference(prod_asin, cosine_sim, indices, df, lim=5, min_rate=2):
+    """
+    recommend before the numpy ranking: sorted() of the whole row, then the pandas filters
+    (the query item first among equal scores).
+    """
+    idx = indices[prod_asin]
+    price = df.iloc[idx]['price']
+    sim_scores = sorted(enumerate(cosine_sim[idx]), key=lambda x: (x[1], x[0] == idx), reverse=True)
+    temp = df.iloc[[i for i, _ in sim_scores]]
+    return temp[(temp['price'] >= price - lim) & (temp['price'] <= price + lim) &
+                (temp['overall'] >= min_rate)]['asin'].tolist()
+
+
+@pytest.mark.parametrize('asin', ['A0000', 'A0007', 'A0123', 'A0399'])
+def test_dense_ranking_matches_reference(catalog, asin):
+    df, idx, _ = catalog
+    sim = np.round(np.random.default_rng(1).random((len(df), len(df))), 1)  # many ties
+    expected = reference(asin, sim, idx, df)
+    assert content_based_filter.recommend(asin, sim, idx, df) == expected
+    for top_n in (0, 1, 5, 10, len(expected) + 1):
+        assert content_based_filter.recommend(asin, sim, idx, df, top_n=top_n) == expected[:top_n]
+
+
+def test_neighbours_rank_stored_items_only(catalog):
+    df, idx, descriptions = catalog
+    tfidf = TfidfVectorizer().fit_transform(descriptions)
+    neighbours = content_based_filter.NeighbourSimilarity(*content_based_filter.top_k_block(tfidf, tfidf, 20))
+    dense = (tfidf @ tfidf.T).toarray()
+    for asin in idx.index[:50]:
+        row = neighbours.neighbours[idx[asin]]
+        stored = set(df['asin'].to_numpy()[row[row >= 0]])
+        expected = [a for a in reference(asin, dense, idx, df) if a in stored]
+        assert content_based_filter.recommend(asin, neighbours, idx, df) == expected
+        assert content_based_filter.recommend(asin, neighbours, idx, df, top_n=3) == expected[:3]
+
+
+def test_top_n_with_clusters(catalog):
+    df, idx, _ = catalog
+    sim = np.round(np.random.default_rng(2).random((len(df), len(df))), 2)
+    clusters = pd.Series({a: df['asin'][i - i % 9] for i, a in enumerate(df['asin'])})
+    for asin in ['A0000', 'A0050']:
+        full = content_based_filter.recommend(asin, sim, idx, df, clusters=clusters)
+        for top_n in (1, 5, 30, len(full) + 1):
+            assert content_based_filter.recommend(asin, sim, idx, df, clusters=clusters, top_n=top_n) == full[:top_n]
+
+
+def test_query_item_first_with_and_without_clusters():
+    df = pd.DataFrame({'asin': ['A', 'A2', 'B', 'C', 'C2'], 'price': [10.0] * 5, 'overall': [4.0] * 5,
+                       'description': ['red shampoo', 'red shampoo', 'red soap bar', 'blue soap', 'blue soap']})
+    clusters = pd.Series({'A': 'A', 'A2': 'A', 'C': 'C', 'C2': 'C'})
+    sim = content_based_filter.cosine_sim(df['description'])
+    idx = content_based_filter.indices(df)
+    for asin in ['A', 'A2']:
+        plain = content_based_filter.recommend(asin, sim, idx, df)
+        collapsed = content_based_filter.recommend(asin, sim, idx, df, clusters=clusters)
+        assert plain[0] == collapsed[0] == asin
+        assert collapsed == [asin, 'B', 'C']
+
+    # index over the representatives: a member is answered by its representative's row
+    reps = content_based_filter.representatives(df, clusters)
+    rep_idx = content_based_filter.indices(reps, clusters)
+    rep_sim = content_based_filter.cosine_sim(reps['description'])
+    assert content_based_filter.recommend('A2', rep_sim, rep_idx, reps, clusters=clusters) == ['A2', 'B', 'C']
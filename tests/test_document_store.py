@@ -0,0 +1,115 @@
+import pytest
+
+from serving import document_store
+from serving.document_store import COLLECTIONS, FileCollection, MemoryCollection
+
+
+def review(asin, reviewer, overall=5.0, text='great'):
+    return {'asin': asin, 'reviewerID': reviewer, 'overall': overall, 'reviewText': text}
+
+
+@pytest.fixture(params=['memory', 'file'])
+def open_reviews(request, tmp_path):
+    """Function opening the reviews collection of a backend (the same file on every call)."""
+    opened = []
+
+    def open_():
+        if request.param == 'memory':
+            coll = MemoryCollection(**COLLECTIONS['reviews'])
+        else:
+            coll = FileCollection(str(tmp_path / 'reviews.jsonl'), **COLLECTIONS['reviews'])
+        opened.append(coll)
+        return coll
+
+    yield open_
+    for coll in opened:
+        coll.close()
+
+
+def test_upsert_many_writes_in_batches(open_reviews):
+    coll = open_reviews()
+    sizes = []
+    write = coll._write
+    coll._write = lambda docs: sizes.append(len(docs)) or write(docs)
+
+    docs = (review(f'a{i % 3}', f'u{i}') for i in range(7))  # any iterable, consumed lazily
+    assert coll.upsert_many(docs, batch_size=3) == 7
+    assert sizes == [3, 3, 1]
+    assert len(coll) == 7
+
+
+def test_create_index_reads_in_batches(open_reviews):
+    coll = open_reviews()
+    coll.upsert_many(review(f'a{i}', f'u{i % 4}') for i in range(7))
+    sizes = []
+    read = coll._read
+    coll._read = lambda entries: sizes.append(len(entries)) or read(entries)
+
+    coll.create_index('reviewerID', batch_size=3)
+    assert sizes == [3, 3, 1]
+    assert {value: len(keys) for value, keys in coll._indexes['reviewerID'].items()} == \
+        {'u0': 2, 'u1': 2, 'u2': 2, 'u3': 1}
+
+
+def test_compound_key_overwrites(open_reviews):
+    coll = open_reviews()
+    coll.upsert_many([review('a1', 'u1', 5.0), review('a1', 'u2', 4.0), review('a2', 'u1', 3.0)])
+    coll.upsert_many([review('a1', 'u1', 1.0, 'changed my mind')])
+
+    assert len(coll) == 3
+    docs = coll.get_many(['a1'])
+    assert sorted((d['reviewerID'], d['overall']) for d in docs) == [('u1', 1.0), ('u2', 4.0)]
+    assert [d['reviewText'] for d in docs if d['reviewerID'] == 'u1'] == ['changed my mind']
+
+
+def test_get_many_projection(open_reviews):
+    coll = open_reviews()
+    coll.upsert_many([review('a1', 'u1'), review('a2', 'u2'), review('a3', 'u3')])
+
+    docs = coll.get_many(['a1', 'a3', 'missing'], projection=['asin', 'overall'])
+    assert sorted(docs, key=lambda d: d['asin']) == [{'asin': 'a1', 'overall': 5.0}, {'asin': 'a3', 'overall': 5.0}]
+    assert coll.get_many([]) == []
+
+
+def test_reviewer_index(open_reviews):
+    coll = open_reviews()
+    coll.upsert_many([review('a1', 'u1'), review('a2', 'u1'), review('a2', 'u2')])
+
+    assert 'reviewerID' in coll._indexes
+    assert sorted(d['asin'] for d in coll.get_many(['u1'], field='reviewerID')) == ['a1', 'a2']
+    assert coll.get_many(['u3'], field='reviewerID') == []
+
+
+def test_replaced_index_value_not_returned():
+    coll = MemoryCollection(key=('asin',), indexes=('brand',))
+    coll.upsert_many([{'asin': 'a1', 'brand': 'old'}])
+    coll.upsert_many([{'asin': 'a1', 'brand': 'new'}])
+
+    assert coll.get_many(['old'], field='brand') == []
+    assert coll.get_many(['new'], field='brand') == [{'asin': 'a1', 'brand': 'new'}]
+
+
+def test_file_collection_reopen_and_compact(tmp_path):
+    path = str(tmp_path / 'reviews.jsonl')
+    coll = FileCollection(path, **COLLECTIONS['reviews'])
+    coll.upsert_many([review('a1', 'u1', 5.0), review('a1', 'u2')])
+    coll.upsert_many([review('a1', 'u1', 2.0)])
+    coll.close()
+
+    coll = FileCollection(path, **COLLECTIONS['reviews'])
+    assert len(coll) == 2
+    assert [d['overall'] for d in coll.get_many(['u1'], field='reviewerID')] == [2.0]
+    coll.compact()
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+    assert sorted(d['reviewerID'] for d in coll.find(projection=['reviewerID'])) == ['u1', 'u2']
+    coll.close()
+
+
+def test_open_collection_backends(tmp_path):
+    coll = document_store.open_collection('metadata', 'file', store_dir=str(tmp_path))
+    assert isinstance(coll, FileCollection) and coll.key == ('asin',)
+    coll.close()
+    assert isinstance(document_store.open_collection('reviews', 'memory'), MemoryCollection)
+    with pytest.raises(ValueError):
+        document_store.open_collection('reviews', 'sqlite')
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from recommendation_filters import embeddings
+
+
+@pytest.fixture(scope='module')
+def descriptions():
+    rng = np.random.default_rng(0)
+    words = [f'w{i}' for i in range(300)]
+    texts = [' '.join(rng.choice(words, 25)) for _ in range(300)]
+    for i in range(0, 20, 2):  # exact duplicates: tied similarities
+        texts[i + 1] = texts[i]
+    return texts
+
+
+def overlap(left, right, k):
+    """Mean share of the top k of right found in the top k of left, the item itself excluded."""
+    left, right = left.copy(), right.copy()
+    np.fill_diagonal(left, -np.inf)
+    np.fill_diagonal(right, -np.inf)
+    top_left = np.argsort(-left, axis=1, kind='stable')[:, :k]
+    top_right = np.argsort(-right, axis=1, kind='stable')[:, :k]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(top_left, top_right)])
+
+
+def test_quantize():
+    vectors = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+    codes, scales = embeddings.quantize(vectors)
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    assert codes[0, 1] == -127 and (codes[1] == 0).all() and scales[1] == 1
+    assert (np.abs(codes * scales[:, None] - vectors) <= scales[:, None] / 2 + 1e-7).all()
+    half, ones = embeddings.quantize(vectors, 'float16')
+    assert half.dtype == np.float16 and (ones == 1).all()
+    with pytest.raises(ValueError):
+        embeddings.quantize(vectors, 'int4')
+
+
+@pytest.mark.parametrize('dtype, min_overlap', [('int8', 0.9), ('float16', 0.97)])
+def test_quantized_ranks_agree_with_float_embeddings(descriptions, dtype, min_overlap):
+    latent = embeddings.reduce(embeddings.tfidf_vectors(descriptions), 64)
+    similarity = embeddings.QuantizedSimilarity(*embeddings.quantize(latent, dtype), block_size=37)
+    exact = latent @ latent.T
+    approx = similarity[np.arange(len(similarity))]
+    assert approx.dtype == np.float32 and np.abs(approx - exact).max() < 0.02
+    assert overlap(approx, exact, 10) >= min_overlap
+    np.testing.assert_allclose(similarity[5], approx[5], atol=1e-6)
+
+
+def test_quality_report_recall(descriptions):
+    similarity, tfidf = embeddings.build(descriptions, n_components=256)
+    report = embeddings.quality_report(tfidf, similarity, k=10, sample=100)
+    assert report['sample'] == 100 and report['dimensions'] == similarity.codes.shape[1]
+    assert report['recall@10'] >= 0.95 and report['mean_abs_error'] < 0.01
+
+
+def test_top_k_matches_sorted_scores(descriptions):
+    similarity, _ = embeddings.build(descriptions, n_components=32)
+    rows = np.arange(0, 40, 3)
+    ids, scores = similarity.top_k(rows, 7)
+    full = similarity.scores(rows)
+    for row, row_ids, row_scores in zip(full, ids, scores):
+        expected = sorted(range(len(row)), key=lambda j: (-row[j], j))[:7]  # decreasing score, then item
+        assert row_ids.tolist() == expected and row_scores.tolist() == row[expected].tolist()
+    assert similarity.top_k(3, 1000)[0].shape == (1, len(similarity))
+
+    # every item repeated: the cut falls inside a tie for every odd k
+    rng = np.random.default_rng(1)
+    tied = embeddings.QuantizedSimilarity(*embeddings.quantize(np.repeat(rng.random((150, 8)), 2, axis=0)))
+    row = tied.scores(np.array([7]))[0]
+    for k in range(1, 60):
+        assert tied.top_k(7, k)[0][0].tolist() == sorted(range(len(row)), key=lambda j: (-row[j], j))[:k]
+
+    loaded = embeddings.QuantizedSimilarity.from_arrays(similarity.arrays())
+    np.testing.assert_array_equal(loaded.top_k(rows, 7)[0], ids)
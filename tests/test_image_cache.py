@@ -0,0 +1,110 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from serving import image_cache
+from serving.image_cache import ImageCache
+
+PNG = (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4'
+       b'\x89\x00\x00\x00\rIDATx\x9cc\xf8\xcf\xc0\xf0\x1f\x00\x05\x00\x01\xff\x89\x99=\x1d\x00\x00\x00\x00'
+       b'IEND\xaeB`\x82')
+
+
+class Handler(BaseHTTPRequestHandler):
+    pages = {'/a.png': (200, 'image/png', PNG), '/b.png': (200, 'image/png', PNG),
+             '/error.html': (200, 'text/html', b'<html>Robot check</html>')}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        status, content_type, body = self.pages.get(self.path, (404, 'text/plain', b'not found'))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)  # free port
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    Handler.requests.clear()
+    c = ImageCache(str(tmp_path), max_age=60, max_workers=4, timeout=5)
+    yield c
+    c._pool.shutdown()
+
+
+def test_miss_then_hit(server, cache):
+    first = cache.get(f'{server}/a.png')
+    assert first is not None and cache.get(f'{server}/a.png') == first
+    assert Handler.requests == ['/a.png']
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'errors': 0}
+    assert os.path.exists(cache.path(f'{server}/a.png'))
+
+
+def test_expired_thumbnail_is_downloaded_again(server, cache):
+    url = f'{server}/a.png'
+    cache.get(url)
+    stat = os.stat(cache.path(url))
+    os.utime(cache.path(url), ns=(stat.st_atime_ns, stat.st_mtime_ns - 120 * 10 ** 9))  # downloaded 2 min ago
+    assert cache.get(url) is not None
+    assert Handler.requests == ['/a.png', '/a.png']
+    assert cache.stats() == {'hits': 0, 'misses': 2, 'errors': 0}
+
+
+def test_expired_copy_served_when_download_fails(server, cache, monkeypatch):
+    url = f'{server}/a.png'
+    content = cache.get(url)
+    stat = os.stat(cache.path(url))
+    os.utime(cache.path(url), ns=(stat.st_atime_ns, stat.st_mtime_ns - 120 * 10 ** 9))
+    monkeypatch.setitem(Handler.pages, '/a.png', (503, 'text/plain', b'busy'))
+    assert cache.get(url) == content
+    assert cache.stats()['errors'] == 1
+
+
+def test_failures_are_not_cached(server, cache):
+    assert cache.get(f'{server}/missing.png') is None
+    assert cache.get(f'{server}/error.html') is None  # not an image
+    assert cache.get('http://127.0.0.1:9/closed.png') is None  # connection refused
+    assert cache.stats() == {'hits': 0, 'misses': 3, 'errors': 3}
+    assert not os.listdir(cache.cache_dir)
+
+
+def test_make_thumbnail_rejects_non_images():
+    assert image_cache.make_thumbnail(b'<html>Robot check</html>') is None
+    assert image_cache.make_thumbnail(b'') is None
+    assert image_cache.make_thumbnail(PNG) is not None
+
+
+def test_prefetch_counts_every_request(server, cache):
+    urls = [f'{server}/a.png', f'{server}/b.png', f'{server}/missing.png'] * 20
+    images = cache.prefetch(urls + [None, ''])
+    assert set(images) == set(urls)
+    assert images[f'{server}/missing.png'] is None
+    cache.prefetch(urls * 10)
+    stats = cache.stats()
+    assert stats['misses'] == 3 + 1  # the failure is fetched again, the images are hits
+    assert stats['hits'] == 2 and stats['errors'] == 2
+
+
+def test_lru_eviction(server, tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=len(PNG) * 3 // 2, max_age=None)
+    first = cache.path(f'{server}/a.png')
+    cache.get(f'{server}/a.png')
+    cache.get(f'{server}/b.png')
+    assert not os.path.exists(first) and os.path.exists(cache.path(f'{server}/b.png'))
+    cache._pool.shutdown()
@@ -0,0 +1,103 @@
+import json
+
+import pandas as pd
+import pytest
+
+from scraping import ingest
+from scraping.async_scraper import Response
+from scraping.page_cache import PageCache
+from serving.metadata_store import MetadataStore
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1.234,56 €', 1234.56), ('$12.34', 12.34), ('12,34 €', 12.34), ('1,234', 1234.0),
+    ('EUR 7', 7.0), ('', None), (None, None), ('n/a', None),
+])
+def test_parse_price(text, expected):
+    assert ingest.parse_price(text) == expected
+
+
+def product(asin, title, price='$10.00'):
+    return {'asin': asin, 'title': title, 'price': price, 'description': f'{title} description',
+            'brand': 'Brand: Acme', 'categories': ['All Beauty'], 'image_url': None}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    paths = {'meta_clean_path': str(tmp_path / 'clean_meta.json.gz'),
+             'metadata_path': str(tmp_path / 'meta.jsonl'),
+             'names_path': str(tmp_path / 'asin_title.json.gz'),
+             'title_index_snapshot': None}
+    old = [product('A1', 'Old Shampoo'), product('A2', 'Conditioner', '$4.00')]
+    ingest._write_json(pd.DataFrame({'asin': ['A1', 'A2'], 'title': ['Old Shampoo', 'Conditioner']}),
+                       paths['names_path'])
+    ingest._write_json(ingest.data_cleaning.clean_meta_frame(pd.DataFrame(map(ingest.to_raw_meta, old))),
+                       paths['meta_clean_path'])
+    with open(paths['metadata_path'], 'w', encoding='utf-8') as f:
+        for p in old:
+            f.write(json.dumps(ingest.to_metadata_record(p)) + '\n')
+    return paths
+
+
+def test_apply_delta_replaces_existing_asin(catalog):
+    updated = ingest.apply_delta([product('A1', 'New Shampoo', '$12.50'), product('A3', 'Soap')], **catalog)
+    assert updated == {'meta_clean': 2, 'metadata': 2, 'names': 2}
+
+    names = pd.read_json(catalog['names_path'])
+    assert sorted(names['asin']) == ['A1', 'A2', 'A3']
+    assert names.set_index('asin')['title'].to_dict() == {'A1': 'New Shampoo', 'A2': 'Conditioner', 'A3': 'Soap'}
+
+    clean = pd.read_json(catalog['meta_clean_path']).set_index('asin')
+    assert sorted(clean.index) == ['A1', 'A2', 'A3']
+    assert clean.loc['A1', 'title'] == 'new shampoo' and clean.loc['A1', 'price'] == 12.5
+
+    store = MetadataStore(catalog['metadata_path'])
+    assert store.get('A1')['title'] == 'New Shampoo' and store.get('A1')['price'] == 12.5
+    assert store.get('A2')['title'] == 'Conditioner'
+    store.close()
+
+
+class StubClient:
+    """Client answering every url with a page whose text is its product title."""
+    errors = (OSError,)
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def get(self, url, headers=None):
+        return Response(url, 200, {}, self.pages[url])
+
+    async def close(self):
+        pass
+
+
+def parse(text, url):
+    return {'asin': url.rsplit('/', 1)[-1], 'title': text}
+
+
+def test_refresh_catalog_keeps_cache_and_delta_until_applied(tmp_path, monkeypatch):
+    delta_path, cache_path = str(tmp_path / 'delta.jsonl'), str(tmp_path / 'cache.json')
+    urls = ['http://shop/A1', 'http://shop/A2']
+    client = StubClient({'http://shop/A1': 'Shampoo', 'http://shop/A2': 'Soap'})
+    applied = []
+
+    def failing(products):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(ingest, 'apply_delta', failing)
+    with pytest.raises(OSError):
+        ingest.refresh_catalog(urls, delta_path, cache_path, client=client, parse=parse, rate=1000)
+    assert len(PageCache(cache_path)) == 0  # nothing recorded as scraped
+    assert [p['asin'] for p in ingest.read_delta(delta_path)] == ['A1', 'A2']
+
+    client.pages['http://shop/A2'] = 'Soap Bar'
+    monkeypatch.setattr(ingest, 'apply_delta', lambda products: applied.append(products) or {'names': len(products)})
+    report, updated = ingest.refresh_catalog(urls, delta_path, cache_path, client=client, parse=parse, rate=1000)
+    assert updated == {'names': 2}
+    assert sorted((p['asin'], p['title']) for p in applied[0]) == [('A1', 'Shampoo'), ('A2', 'Soap Bar')]
+    assert len(PageCache(cache_path)) == 2
+    assert not (tmp_path / 'delta.jsonl').exists()
+
+    # unchanged pages: nothing to apply, the delta stays empty
+    report, updated = ingest.refresh_catalog(urls, delta_path, cache_path, client=client, parse=parse, rate=1000)
+    assert report['unchanged'] == 2 and len(applied) == 2 and applied[1] == []
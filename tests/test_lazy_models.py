@@ -0,0 +1,87 @@
+import os
+import time
+
+from serving.lazy_models import LazyModel, ModelLoader, source_key
+
+
+def rewrite(path, text):
+    """Rewrite path with a new mtime, even on a coarse-grained clock."""
+    stat = os.stat(path) if os.path.exists(path) else None
+    with open(path, 'w') as f:
+        f.write(text)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_snapshot_rebuilt_when_source_changes(tmp_path):
+    source = str(tmp_path / 'final.json')
+    snapshot = str(tmp_path / 'snapshots' / 'model.pkl')
+    rewrite(source, 'v1')
+    builds = []
+
+    def build():
+        builds.append(1)
+        return read(source)
+
+    first = LazyModel('model', build, snapshot, sources=[source])
+    assert first.get() == 'v1' and first.source == 'build'
+    assert first.version == source_key([source])
+
+    second = LazyModel('model', build, snapshot, sources=[source])
+    assert second.get() == 'v1' and second.source == 'snapshot'
+    assert len(builds) == 1
+
+    rewrite(source, 'v2')
+    third = LazyModel('model', build, snapshot, sources=[source])
+    assert third.get() == 'v2' and third.source == 'build'
+    assert third.version != first.version
+
+
+def test_snapshot_of_old_format_is_rebuilt(tmp_path):
+    import pickle
+    snapshot = str(tmp_path / 'model.pkl')
+    with open(snapshot, 'wb') as f:
+        pickle.dump(['old'], f)
+    model = LazyModel('model', lambda: ['new'], snapshot)
+    assert model.get() == ['new'] and model.source == 'build'
+
+
+def test_refresh_serves_loaded_value_until_reloaded(tmp_path):
+    names = str(tmp_path / 'names.json')
+    rewrite(names, 'a')
+    loader = ModelLoader(snapshot_dir=str(tmp_path / 'snapshots'))
+    loader.register('names', lambda: read(names), sources=[names])
+    loader.register('index', lambda: loader.get('names').upper(), snapshot=True, sources=[names])
+    assert loader.get('index') == 'A'
+    assert loader.refresh() == []
+
+    rewrite(names, 'b')
+    assert loader['index'].stale
+    assert loader.refresh() == ['names', 'index']
+    assert loader.get('index') in ('A', 'B')  # never blocks on the reload
+    wait_for(lambda: not loader['index'].stale and loader.get('index') == 'B')
+    assert loader.get('names') == 'b'
+
+
+def test_failed_reload_keeps_previous_value(tmp_path):
+    source = str(tmp_path / 'final.json')
+    rewrite(source, '1')
+    model = LazyModel('model', lambda: int(read(source)), sources=[source])
+    assert model.get() == 1
+
+    rewrite(source, 'not a number')
+    assert model.refresh()
+    wait_for(lambda: not model.stale)
+    assert model.get() == 1 and model.error is None
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from serving import metadata_store
+from serving.metadata_store import MetadataStore, append_records
+
+
+def record(asin, title, **fields):
+    return dict({'parent_asin': asin, 'title': title, 'images': [{'thumb': f'{asin}.jpg', 'variant': 'MAIN'}]},
+                **fields)
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'meta.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        for rec in [record('B2', 'Soap'), record('B1', 'Shampoo'), {'title': 'no asin'},
+                    record('B3', 'Crème', price=9.5), record('B1', 'Shampoo v2')]:
+            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        f.write('\n')
+    return path
+
+
+def no_scan(path):
+    raise AssertionError('the index was rebuilt by a full scan')
+
+
+def test_offset_index_last_line_wins(path):
+    asins, offsets = metadata_store.build_index(path)
+    assert asins.tolist() == [b'B1', b'B2', b'B3']
+    titles = []
+    with open(path, 'rb') as f:
+        for offset in offsets.tolist():
+            f.seek(offset)
+            titles.append(json.loads(f.readline())['title'])
+    assert titles == ['Shampoo v2', 'Soap', 'Crème']
+    store = MetadataStore(path)
+    assert len(store) == 3 and 'B1' in store and 'B9' not in store
+    assert store.get('B1')['title'] == 'Shampoo v2'
+    assert store.get('B3') == metadata_store.display_fields(record('B3', 'Crème', price=9.5))
+    assert store.get('B9', 'missing') == 'missing'
+    assert {a: r['title'] for a, r in store.get_many(['B3', 'B1', 'B9']).items()} == {'B3': 'Crème', 'B1': 'Shampoo v2'}
+    store.close()
+
+
+def test_sidecar_is_reused_then_rebuilt_when_stale(path, monkeypatch):
+    MetadataStore(path).close()
+    assert os.path.exists(f'{path}.idx.npz')
+    monkeypatch.setattr(metadata_store, 'build_index', no_scan)
+    MetadataStore(path).close()
+
+    monkeypatch.undo()
+    with open(path, 'a', encoding='utf-8') as f:  # edited without append_records
+        f.write(json.dumps(record('B4', 'Brush')) + '\n')
+    stat = os.stat(f'{path}.idx.npz')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    store = MetadataStore(path)
+    assert store.get('B4')['title'] == 'Brush'
+    store.close()
+
+
+def test_append_merges_the_sidecar(path, monkeypatch):
+    MetadataStore(path).close()
+    with open(path, 'rb+') as f:  # no trailing newline
+        f.truncate(os.path.getsize(path) - 1)
+    stat = os.stat(path)
+    os.utime(f'{path}.idx.npz', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert append_records(path, [record('B2', 'Soap v2'), record('B5', 'Nail polish'), record('B2', 'Soap v3')]) == 3
+    monkeypatch.setattr(metadata_store, 'build_index', no_scan)
+    store = MetadataStore(path)
+    assert len(store) == 4
+    assert store.get('B2')['title'] == 'Soap v3' and store.get('B5')['title'] == 'Nail polish'
+    assert store.get('B1')['title'] == 'Shampoo v2'
+    store.close()
+
+    monkeypatch.undo()
+    rebuilt = metadata_store.build_index(path)
+    assert rebuilt[0].tolist() == store.asins.tolist() and rebuilt[1].tolist() == store.offsets.tolist()
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from evaluation import metrics
+
+
+# per-list functions of the evaluation script before the vectorized kernels
+def precision_at_k(recommended, relevant, k):
+    recommended_k = recommended[:k]
+    relevant_set = set(relevant)
+    hits = sum(1 for item in recommended_k if item in relevant_set)
+    return hits / k if k > 0 else 0
+
+
+def recall_at_k(recommended, relevant, k):
+    recommended_k = recommended[:k]
+    relevant_set = set(relevant)
+    hits = sum(1 for item in recommended_k if item in relevant_set)
+    return hits / len(relevant_set) if len(relevant_set) > 0 else 0
+
+
+def diversity_score(recommended_list, asin_to_idx, cosine_sim):
+    if len(recommended_list) < 2:
+        return 0.0
+    idxs = [asin_to_idx.get(asin) for asin in recommended_list if asin in asin_to_idx]
+    if len(idxs) < 2:
+        return 0.0
+    sim_sum, count = 0, 0
+    for i in range(len(idxs)):
+        for j in range(i + 1, len(idxs)):
+            sim_sum += cosine_sim[idxs[i], idxs[j]]
+            count += 1
+    return 1 - (sim_sum / count)
+
+
+def ndcg_at_k(recommended, relevant, k):
+    relevant = set(relevant)
+    dcg = sum(1 / math.log2(j + 2) for j, item in enumerate(recommended[:k]) if item in relevant)
+    ideal = sum(1 / math.log2(j + 2) for j in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def average_precision_at_k(recommended, relevant, k):
+    relevant = set(relevant)
+    hits, total = 0, 0.0
+    for j, item in enumerate(recommended[:k]):
+        if item in relevant:
+            hits += 1
+            total += hits / (j + 1)
+    return total / min(len(relevant), k) if relevant else 0.0
+
+
+@pytest.fixture(scope='module')
+def lists():
+    rng = np.random.default_rng(0)
+    n_items = 40
+    asins = [f'B{i:03d}' for i in range(n_items)]
+    asin_to_idx = {a: i for i, a in enumerate(asins)}
+    recs, truth = [], []
+    for _ in range(300):
+        rec = [asins[i] for i in rng.choice(n_items, rng.integers(0, 12), replace=True)]  # repeats allowed
+        if rng.random() < 0.2:
+            rec.insert(int(rng.integers(0, len(rec) + 1)), 'UNKNOWN')  # keeps its rank
+        recs.append(rec)
+        truth.append([asins[i] for i in rng.choice(n_items, rng.integers(0, 8), replace=False)])
+    vectors = rng.random((n_items, 5))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return asins, asin_to_idx, recs, truth, vectors
+
+
+@pytest.mark.parametrize('k', [1, 5, 10])
+def test_vectorized_metrics_match_per_list_functions(lists, k):
+    asins, asin_to_idx, recs, truth, _ = lists
+    n_items = len(asins)
+    encoded = metrics.encode(recs, asin_to_idx, k)
+    relevant = metrics.to_csr(metrics.encode(truth, asin_to_idx), n_items)
+
+    np.testing.assert_allclose(metrics.precision_at_k(encoded, relevant, k, n_items),
+                               [precision_at_k(r, t, k) for r, t in zip(recs, truth)])
+    np.testing.assert_allclose(metrics.recall_at_k(encoded, relevant, k, n_items),
+                               [recall_at_k(r, t, k) for r, t in zip(recs, truth)])
+    np.testing.assert_allclose(metrics.ndcg_at_k(encoded, relevant, k, n_items),
+                               [ndcg_at_k(r, t, k) for r, t in zip(recs, truth)])
+    np.testing.assert_allclose(metrics.average_precision_at_k(encoded, relevant, k, n_items),
+                               [average_precision_at_k(r, t, k) for r, t in zip(recs, truth)])
+
+
+def test_padded_and_sparse_relevance_agree(lists):
+    asins, asin_to_idx, recs, truth, _ = lists
+    encoded = metrics.encode(recs, asin_to_idx, 10)
+    padded = metrics.encode(truth, asin_to_idx)
+    csr = metrics.to_csr(padded, len(asins))
+    assert sparse.issparse(csr)
+    np.testing.assert_array_equal(metrics.n_relevant(padded), metrics.n_relevant(csr))
+    np.testing.assert_allclose(metrics.ndcg_at_k(encoded, padded, 10, len(asins)),
+                               metrics.ndcg_at_k(encoded, csr, 10, len(asins)))
+
+
+def test_diversity_matches_pairwise_loop(lists):
+    asins, asin_to_idx, recs, _, vectors = lists
+    similarity = vectors @ vectors.T
+    k = 6
+    expected = [diversity_score([a for a in r[:k]], asin_to_idx, similarity) for r in recs]
+    encoded = metrics.encode(recs, asin_to_idx, k)
+    np.testing.assert_allclose(metrics.intra_list_diversity(encoded, k, similarity=similarity), expected, atol=1e-12)
+    np.testing.assert_allclose(metrics.intra_list_diversity(encoded, k, item_vectors=vectors), expected, atol=1e-12)
+    np.testing.assert_allclose(metrics.intra_list_diversity(encoded, k, item_vectors=sparse.csr_matrix(vectors)),
+                               expected, atol=1e-12)
+
+
+def test_coverage_and_novelty():
+    recs = np.array([[0, 1, metrics.PAD], [1, 2, 2], [metrics.PAD] * 3])
+    assert metrics.catalog_coverage(recs, 10) == 0.3
+    assert metrics.catalog_coverage(recs, 10, k=1) == 0.2
+    counts = np.array([1, 2, 4, 8])
+    np.testing.assert_allclose(metrics.novelty(recs, counts, 8),
+                               [(3 + 2) / 2, (2 + 1 + 1) / 3, 0.0])
@@ -0,0 +1,87 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from serving import model_registry
+from serving.model_registry import ModelRegistry
+
+
+def write_pickle(path, value, mtime_ns=None):
+    with open(path, 'wb') as f:
+        pickle.dump(value, f)
+    if mtime_ns is not None:  # rewritten within the mtime resolution of the filesystem
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = str(tmp_path / 'model.pkl')
+    write_pickle(path, {'weights': [1, 2]})
+    return ModelRegistry(str(tmp_path / 'registry'), {'model': path})
+
+
+def test_reload_after_training_pickle_is_rewritten(registry, monkeypatch):
+    loads = []
+    load = registry._load
+    monkeypatch.setattr(registry, '_load', lambda name, version: loads.append(version) or load(name, version))
+
+    first = registry.get('model')
+    assert first == {'weights': [1, 2]} and registry.get('model') is first and loads == [0]
+
+    path = registry.artifacts['model']
+    write_pickle(path, {'weights': [3]}, os.stat(path).st_mtime_ns + 10 ** 9)
+    assert registry.get('model') == {'weights': [3]} and loads == [0, 0]
+    assert first == {'weights': [1, 2]}  # references to the old artifact stay valid
+    assert len(registry._loaded) == 1  # the old load is released
+    assert registry.report()[0]['path'] == path
+
+
+def test_publish_switches_the_current_version(registry):
+    assert registry.versions('model') == [0] and registry.current('model') == 0
+    old = registry.get('model')
+    assert registry.publish('model', {'weights': np.arange(10.0)}) == 1
+    assert registry.publish('model', {'weights': np.arange(20.0)}) == 2
+    assert registry.versions('model') == [0, 1, 2] and registry.current('model') == 2
+
+    current = registry.get('model')
+    assert isinstance(current['weights'], np.memmap) and len(current['weights']) == 20
+    assert len(registry.get('model', 1)['weights']) == 10 and registry.get('model', 0) == old
+
+    # the training script rewrites version 0: the published version stays current
+    path = registry.artifacts['model']
+    write_pickle(path, {'weights': [3]}, os.stat(path).st_mtime_ns + 10 ** 9)
+    assert registry.get('model') is current and registry.get('model', 0) == {'weights': [3]}
+
+    with pytest.raises(KeyError):
+        registry.get('unknown')
+    with pytest.raises(FileNotFoundError):
+        registry.get('model', 7)
+
+
+def test_concurrent_gets_load_once(registry, monkeypatch):
+    calls = []
+    load = registry._load
+    gate = threading.Event()
+
+    def slow_load(name, version):
+        calls.append(version)
+        gate.wait(1)
+        return load(name, version)
+
+    monkeypatch.setattr(registry, '_load', slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get('model'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [0] and all(r is results[0] for r in results)
+
+
+def test_module_get_uses_the_process_registry(registry, monkeypatch):
+    monkeypatch.setattr(model_registry, 'REGISTRY', registry)
+    assert model_registry.get('model') is registry.get('model')
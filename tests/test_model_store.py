@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from serving.model_store import ModelStore
+
+
+def mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_text_round_trip(tmp_path):
+    df = pd.DataFrame({'asin': ['B001', 'B002', 'B003'], 'title': ['Crème', 'x' * 500, ''],
+                       'price': [1.5, 2.0, 3.25]})
+    indices = pd.Series(df.index, index=df['asin'])
+    store = ModelStore(str(tmp_path))
+    version = store.publish('content', {'cbf_df': df, 'indices': indices, 'asins': df['asin'].to_numpy(),
+                                        'empty': np.array([], dtype=object)})
+
+    artifact = store.attach('content')
+    assert artifact.version == version
+    pd.testing.assert_frame_equal(artifact['cbf_df'], df, check_dtype=False)
+    assert artifact['indices']['B002'] == 1 and list(artifact['indices'].index) == list(df['asin'])
+    assert artifact['asins'].tolist() == ['B001', 'B002', 'B003'] and len(artifact['empty']) == 0
+    assert mapped(artifact['cbf_df']['price'].to_numpy()) and mapped(artifact['asins'])  # '<U', searchable
+
+    directory = store._dir('content', version)
+    for file in os.listdir(directory):  # the columns and indexes are not fixed-width strings
+        if file.startswith(('cbf_df', 'indices')) and file.endswith('.npy'):
+            assert np.load(os.path.join(directory, file), mmap_mode='r').dtype.kind != 'U'
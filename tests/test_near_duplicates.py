@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from data_processing import near_duplicates
+
+
+def texts(n, length=40, seed=0):
+    rng = np.random.default_rng(seed)
+    words = [f'w{i}' for i in range(500)]
+    return [' '.join(rng.choice(words, length)) for _ in range(n)]
+
+
+def jaccard(x, y):
+    x, y = set(near_duplicates.shingles(x).tolist()), set(near_duplicates.shingles(y).tolist())
+    return len(x & y) / len(x | y)
+
+
+def test_signature_agreement_estimates_jaccard():
+    base = texts(1)[0].split()
+    variants = [' '.join(base[:40 - n] + [f'x{i}' for i in range(n)]) for n in (0, 4, 10, 20, 40)]
+    sigs = near_duplicates.signatures([' '.join(base)] + variants, num_perm=512, chunk_size=3)
+    assert sigs.dtype == np.uint32 and sigs.shape == (6, 512)
+    for i, text in enumerate(variants, start=1):
+        assert abs((sigs[0] == sigs[i]).mean() - jaccard(' '.join(base), text)) < 0.07
+    assert (near_duplicates.signatures(variants[:2], num_perm=512) == sigs[1:3]).all()  # chunks do not change them
+
+
+def test_lsh_params_threshold():
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = near_duplicates.lsh_params(threshold, 128)
+        assert bands * rows <= 128 and abs((1 / bands) ** (1 / rows) - threshold) < 0.1
+
+
+def test_detect_known_duplicates(tmp_path):
+    descriptions = texts(30)
+    meta = pd.DataFrame({'asin': [f'B{i:03d}' for i in range(30)], 'title': [f'title {i}' for i in range(30)],
+                         'description': descriptions})
+    meta.loc[1, ['title', 'description']] = meta.loc[0, ['title', 'description']].to_numpy()  # exact copy
+    words = descriptions[2].split()
+    meta.loc[3, ['title', 'description']] = ['title 2', ' '.join(words[:-1] + ['other'])]  # one word changed
+    meta.loc[[4, 5, 6], ['title', 'description']] = ['title 7', descriptions[7]]  # three copies of B007
+    meta = pd.concat([meta, meta.iloc[[10]]], ignore_index=True).sample(frac=1, random_state=0)  # repeated asin
+
+    table = near_duplicates.detect(meta, threshold=0.8)
+    assert table['asin'].tolist() == sorted(meta['asin'].unique())
+    cluster = dict(zip(table['asin'], table['cluster']))
+    assert cluster['B001'] == 'B000' and cluster['B003'] == 'B002'
+    assert cluster['B004'] == cluster['B005'] == cluster['B006'] == cluster['B007'] == 'B004'
+    grouped = {'B001', 'B003', 'B005', 'B006', 'B007'}
+    assert all(cluster[a] == a for a in table['asin'] if a not in grouped)
+    assert dict(zip(table['asin'], table['cluster_size']))['B005'] == 4
+
+    path = str(tmp_path / 'meta.json.gz')
+    meta.to_json(path, compression='gzip')
+    dest = str(tmp_path / 'clusters.json.gz')
+    near_duplicates.run(path, dest)
+    loaded = near_duplicates.load_clusters(dest)
+    assert loaded.to_dict() == cluster
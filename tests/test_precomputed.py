@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import numpy as np
+
+from recommendation_filters import content_based_filter
+from serving import precomputed
+from serving.precomputed import ABSENT, PrecomputedTables
+
+
+def build(tmp_path, final_path):
+    data = str(tmp_path / 'final.json.gz')
+    shutil.copy(final_path, data)
+    out = str(tmp_path / 'tables')
+    meta = precomputed.build_tables(out, data, models=('content', 'popularity'), n_jobs=1,
+                                    popularity_params={'rev_count': 1, 'rating': 1, 'sentiment': 0.0})
+    return data, out, meta
+
+
+def test_content_table_matches_live_model(tmp_path, final_path):
+    data, out, meta = build(tmp_path, final_path)
+    tables = PrecomputedTables(out)
+    df = content_based_filter.cbf_data(data)
+    idx = content_based_filter.indices(df)
+    sim = content_based_filter.cosine_sim(df['description'])
+    assert meta['failures'] == {'content': 0} and not tables.stale
+    for asin in idx.index:
+        assert tables.lookup('content', asin) == content_based_filter.recommend(asin, sim, idx, df)[:10]
+    assert tables.lookup('content', 'unknown') is None
+    assert precomputed.fresh_models(out) == ['content', 'popularity']
+
+
+def test_tables_miss_once_the_data_file_changes(tmp_path, final_path):
+    data, out, _ = build(tmp_path, final_path)
+    tables = PrecomputedTables(out)
+    asin = tables.asins[0].decode()
+    assert tables.lookup('content', asin) is not None and tables.lookup('popularity', asin)
+
+    stat = os.stat(data)
+    os.utime(data, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert tables.stale
+    assert tables.lookup('content', asin) is None and tables.lookup('popularity', asin) is None
+    assert precomputed.fresh_models(out) == []
+
+
+def test_failed_rows_miss(tmp_path, final_path):
+    _, out, _ = build(tmp_path, final_path)
+    table = np.load(os.path.join(out, 'content.npy'))
+    table[1] = ABSENT  # as written by _collaborative_rows when the model raises
+    np.save(os.path.join(out, 'content.npy'), table)
+    tables = PrecomputedTables(out)
+    assert tables.lookup('content', tables.asins[1].decode()) is None
+    assert tables.lookup('content', tables.asins[0].decode()) is not None
@@ -0,0 +1,107 @@
+import threading
+
+from serving.rec_cache import RecommendationCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = RecommendationCache(maxsize=10, ttl=60, clock=clock)
+    cache.put('content', 'A', ['B', 'C'])
+    clock.now = 59
+    assert cache.get('content', 'A') == ['B', 'C']
+    clock.now = 61
+    assert cache.get('content', 'A') is None
+    assert len(cache) == 0 and cache.stats()['expired'] == 1
+
+    forever = RecommendationCache(ttl=None, clock=clock)
+    forever.put('content', 'A', ['B'])
+    clock.now = 10 ** 9
+    assert forever.get('content', 'A') == ['B']
+
+
+def test_lru_eviction():
+    cache = RecommendationCache(maxsize=2, ttl=None)
+    cache.put('content', 'A', ['1'])
+    cache.put('content', 'B', ['2'])
+    assert cache.get('content', 'A') == ['1']  # B is now the least recently used
+    cache.put('content', 'C', ['3'])
+    assert cache.get('content', 'B') is None
+    assert cache.get('content', 'A') == ['1'] and cache.get('content', 'C') == ['3']
+    assert cache.stats()['evictions'] == 1 and len(cache) == 2
+
+
+def test_keys_include_params_and_version():
+    cache = RecommendationCache()
+    cache.put('content', 'A', ['1'], params={'lim': 5, 'min_rate': 2}, version=(1, 10))
+    assert cache.get('content', 'A', {'min_rate': 2, 'lim': 5}, version=(1, 10)) == ['1']
+    assert cache.get('content', 'A', {'lim': 6, 'min_rate': 2}, version=(1, 10)) is None
+    assert cache.get('content', 'A', {'lim': 5, 'min_rate': 2}, version=(2, 10)) is None
+    assert cache.get('svd', 'A', {'lim': 5, 'min_rate': 2}, version=(1, 10)) is None
+
+
+def test_invalidation():
+    cache = RecommendationCache()
+    for model in ('content', 'svd'):
+        cache.put(model, 'A', [model])
+    cache.invalidate('content')
+    assert cache.get('content', 'A') is None and cache.get('svd', 'A') == ['svd']
+    cache.invalidate()
+    assert len(cache) == 0
+
+    cache.put('content', 'A', ['1'], version='v1')
+    cache.set_version('content', 'v1')
+    cache.set_version('content', 'v1')
+    assert cache.get('content', 'A', version='v1') == ['1']
+    cache.set_version('content', 'v2')  # rebuilt: entries of the old version are dropped
+    assert len(cache) == 0
+
+
+def test_get_or_compute_and_prewarm():
+    calls = []
+
+    def compute(asin, lim=5):
+        calls.append((asin, lim))
+        return [f'{asin}{lim}']
+
+    cache = RecommendationCache()
+    assert cache.get_or_compute('content', 'A', compute, {'lim': 3}) == ['A3']
+    assert cache.get_or_compute('content', 'A', compute, {'lim': 3}) == ['A3']
+    assert calls == [('A', 3)]
+    assert cache.stats() == dict(cache.stats(), hits=1, misses=1, hit_rate=0.5)
+
+    def flaky(asin):
+        if asin == 'bad':
+            raise ValueError(asin)
+        return [asin * 2]
+
+    cache.prewarm('content', ['B', 'bad', 'C'], flaky, background=False)
+    thread = cache.prewarm('svd', ['D'], flaky)
+    thread.join()
+    assert cache.get('content', 'B') == ['BB'] and cache.get('content', 'bad') is None
+    assert cache.get('svd', 'D') == ['DD']
+
+
+def test_concurrent_puts_stay_bounded():
+    cache = RecommendationCache(maxsize=50, ttl=None)
+
+    def work(t):
+        for i in range(500):
+            cache.put('content', f'{t}-{i}', [str(i)])
+            cache.get('content', f'{t}-{i // 2}')
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert len(cache) == 50 and stats['hits'] + stats['misses'] == 8 * 500
+    assert stats['evictions'] == 8 * 500 - 50
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyspark')
+
+from data_processing import data_cleaning, spark_etl, synthetic_data
+from data_processing.tables import BUCKET_COLUMN, asin_bucket, read_table
+
+META_COLUMNS = ['asin', 'title', 'description', 'brand', 'price', 'main_cat', 'category']
+
+
+def test_meta_clean_matches_pandas(spark, tmp_path):
+    src = str(tmp_path / 'meta.json')
+    synthetic_data.generate_meta(src, 40, seed=3, dup_rate=0.1)
+    expected = data_cleaning.clean_meta_frame(pd.read_json(src))
+    got = spark_etl.meta_clean(spark, src).drop('row_id').toPandas()
+
+    def ordered(df):
+        return df[META_COLUMNS].sort_values(['asin', 'description']).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(ordered(got), ordered(expected), check_dtype=False)
+
+
+def test_final_data_keeps_first_verified_review(spark):
+    reviews = spark.createDataFrame(pd.DataFrame({
+        'asin': ['a1', 'a1', 'a1', 'a2'],
+        'reviewerID': ['u1', 'u1', 'u2', 'u1'],
+        'verified': [True, True, False, True],
+        'overall': [5.0, 1.0, 4.0, 3.0],
+        'review_count': [3, 3, 3, 1],
+        'reviewText_senti': [1, 0, 1, 1],
+        'positive_prob': [0.9, 0.1, 0.8, 0.5],
+        'row_id': [0, 1, 2, 3],
+    }))
+    meta = spark.createDataFrame(pd.DataFrame({
+        'asin': ['a1', 'a2', 'a3'], 'description': ['d1', 'd2', 'd3'], 'title': ['t1', 't2', 't3'],
+        'price': [1.0, 2.0, 3.0], 'main_cat': ['c', 'c', 'c'], 'row_id': [0, 1, 2],
+    }))
+    out = spark_etl.final_data(reviews, meta).toPandas().sort_values(['asin', 'reviewerID'])
+    assert list(out.columns) == spark_etl.FINAL_FEATURES
+    assert list(zip(out['asin'], out['reviewerID'], out['overall'])) == [('a1', 'u1', 5.0), ('a2', 'u1', 3.0)]
+
+
+def test_partitioned_output_reads_back_by_bucket(spark, tmp_path):
+    df = spark.createDataFrame(pd.DataFrame({'asin': [f'B{i:09d}' for i in range(20)], 'price': range(20)}))
+    path = str(tmp_path / 'table')
+    spark_etl.write_partitioned(df, path, n_buckets=4)
+    assert {int(p.name.split('=')[1]) for p in tmp_path.joinpath('table').glob(f'{BUCKET_COLUMN}=*')} == \
+        {asin_bucket(f'B{i:09d}', 4) for i in range(20)}
+    back = read_table(path, asins=['B000000007'], n_buckets=4)
+    assert back['asin'].tolist() == ['B000000007'] and back['price'].tolist() == [7]
@@ -0,0 +1,70 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyspark')
+
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.svm import LinearSVC
+
+from data_processing import feature_genration, spark_sentiment
+from data_processing.text_processing import rem_stopwords, stem_text, text_clean
+from serving import model_registry
+
+TRAIN = [
+    ('I love this shampoo, my hair feels great', 'Great product', 2),
+    ('Wonderful smell and works perfectly', 'Love it', 2),
+    ('Terrible, it burned my skin', 'Awful', 0),
+    ('Broke after one day, waste of money', 'Do not buy', 0),
+    ('It is okay, nothing special', 'Average', 1),
+    ('Does the job, the bottle is small', 'Fine', 1),
+]
+TEXTS = ['Love the smell, works great', 'Awful product, burned my hair', 'okay I guess',
+         'Not bad but the bottle broke', '', 'GREAT!!! <br /><br />would buy again']
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Registry of tiny svc / nb models fitted like the training scripts, as the process-wide REGISTRY."""
+    reviews = pd.Series([t for t, _, _ in TRAIN])
+    summaries = pd.Series([s for _, s, _ in TRAIN])
+    labels = [label for _, _, label in TRAIN]
+
+    svc_texts = reviews.apply(text_clean).apply(rem_stopwords).apply(stem_text)
+    ngram_vec = CountVectorizer(ngram_range=(1, 2)).fit(svc_texts)
+    svc = LinearSVC().fit(ngram_vec.transform(svc_texts), [int(label == 2) for label in labels])
+
+    nb_texts = summaries.apply(text_clean)
+    count_vect = CountVectorizer().fit(nb_texts)
+    tfidf_vect = TfidfTransformer().fit(count_vect.transform(nb_texts))
+    nb = MultinomialNB().fit(tfidf_vect.transform(count_vect.transform(nb_texts)), labels)
+
+    artifacts = {}
+    for name, value in zip(spark_sentiment.SVC_MODELS + spark_sentiment.NB_MODELS,
+                           (ngram_vec, svc, count_vect, tfidf_vect, nb)):
+        artifacts[name] = str(tmp_path / f'{name}.pkl')
+        with open(artifacts[name], 'wb') as f:
+            pickle.dump(value, f)
+    registry = model_registry.ModelRegistry(str(tmp_path / 'registry'), artifacts)
+    monkeypatch.setattr(model_registry, 'REGISTRY', registry)
+    return registry
+
+
+def test_udfs_match_pandas_features(spark, registry):
+    texts = pd.Series(TEXTS)
+    expected_svc = feature_genration.svc_features(texts)
+    expected_nb = feature_genration.nb_features(texts)
+
+    svc_bc, nb_bc = spark_sentiment.broadcast_models(spark)
+    svc = spark_sentiment.svc_sentiment_udf(svc_bc, spark_sentiment._label_type(svc_bc.value[1].classes_))
+    df = spark.createDataFrame(pd.DataFrame({'row': range(len(TEXTS)), 'text': TEXTS})).repartition(3)
+    got = (df.withColumn('reviewText_senti', svc('text'))
+             .withColumn('_nb', spark_sentiment.nb_proba_udf(nb_bc)('text'))
+             .select('row', 'reviewText_senti', *[f'_nb.{c}' for c in spark_sentiment.NB_COLUMNS])
+             .toPandas().sort_values('row').reset_index(drop=True))
+
+    assert got['reviewText_senti'].tolist() == expected_svc['reviewText_senti'].tolist()
+    np.testing.assert_allclose(got[spark_sentiment.NB_COLUMNS].to_numpy(), expected_nb.to_numpy(), rtol=1e-12)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyspark')
+
+from data_processing import spark_similarity
+from recommendation_filters import content_based_filter
+
+DESCRIPTIONS = [
+    'argan oil hair serum for dry hair',
+    'hair serum with argan oil and keratin',
+    'matte red lipstick long lasting',
+    'long lasting liquid lipstick nude',
+    'gentle face wash for sensitive skin',
+    'face moisturizer for dry sensitive skin',
+    'nail polish remover acetone free',
+]
+
+
+@pytest.fixture(scope='module')
+def meta(spark, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('meta') / 'clean_meta')
+    df = pd.DataFrame({'asin': [f'B{i:09d}' for i in range(len(DESCRIPTIONS))][::-1],
+                       'description': DESCRIPTIONS, 'row_id': range(len(DESCRIPTIONS))})
+    spark.createDataFrame(df).write.parquet(path)
+    return path, df.sort_values('asin').reset_index(drop=True)
+
+
+def expected_top_k(df, k):
+    """
+    Exact ranking of the full cosine_sim (linear_kernel) matrix: positive scores by
+    decreasing score then row, k at most per row.
+    """
+    sim = content_based_filter.cosine_sim(df['description'])
+    ids, scores = [], []
+    for row in sim:
+        top = [col for col in np.lexsort((np.arange(len(row)), -row.round(12))) if row[col] > 0][:k]
+        ids.append(top)
+        scores.append(row[top])
+    return ids, scores
+
+
+def test_band_count():
+    mb = 1024 ** 2
+    assert spark_similarity.band_count(0, 4, band_bytes=mb) == 1
+    assert spark_similarity.band_count(mb, 4, band_bytes=mb) == 1
+    assert spark_similarity.band_count(mb + 1, 4, band_bytes=mb) == 2
+    assert spark_similarity.band_count(100 * mb, 4, band_bytes=mb) == 4  # at most one band per block
+
+
+@pytest.mark.parametrize('n_bands, band_bytes', [(1, spark_similarity.BAND_BYTES), (2, spark_similarity.BAND_BYTES),
+                                                 (None, 1)])
+def test_blockwise_top_k_matches_exact_ranking(spark, meta, tmp_path, n_bands, band_bytes):
+    path, df = meta
+    dest = str(tmp_path / 'neighbours')
+    # band_bytes=1 : one band per block, sized from the data, shuffled instead of broadcast
+    spark_similarity.run(spark, path, dest, top_k=3, block_size=2, n_bands=n_bands, band_bytes=band_bytes)
+    ids, scores = expected_top_k(df, 3)
+
+    got = spark.read.parquet(dest).toPandas().set_index('asin').loc[df['asin']]
+    asins = df['asin'].to_numpy()
+    assert [list(n) for n in got['neighbours']] == [asins[row].tolist() for row in ids]
+    for row, expected in zip(got['scores'], scores):
+        np.testing.assert_allclose(list(row), expected, rtol=1e-9)
+
+
+def test_load_neighbours_rows(spark, meta, tmp_path):
+    path, df = meta
+    dest = str(tmp_path / 'neighbours')
+    spark_similarity.run(spark, path, dest, top_k=3, block_size=3)
+    ids, scores = expected_top_k(df, 3)
+
+    similarity = content_based_filter.load_neighbours(dest, df)
+    assert [row[row >= 0].tolist() for row in similarity.neighbours] == [list(row) for row in ids]
+    for row in range(len(df)):
+        np.testing.assert_allclose(similarity[row][ids[row]], scores[row], rtol=1e-9)
@@ -0,0 +1,52 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processing import synthetic_data
+
+
+@pytest.mark.parametrize('n, a', [(1, 1.3), (10, 1.0), (50, 1.3), (5000, 1.1), (3, 2.0)])
+def test_zipf_sample_matches_the_law(n, a):
+    ranks = synthetic_data.Zipf(n, a).sample(np.random.default_rng(0), 400_000)
+    weights = 1.0 / np.arange(1, n + 1) ** a
+    expected = weights / weights.sum()
+    assert ranks.min() >= 0 and ranks.max() < n
+    np.testing.assert_allclose(np.bincount(ranks, minlength=n) / len(ranks), expected, atol=3e-3)
+
+
+def test_zipf_sample_needs_no_table():
+    law = synthetic_data.Zipf(10 ** 12, 1.3)  # a cdf table of this size would not fit in memory
+    ranks = law.sample(np.random.default_rng(0), 1000)
+    assert ranks.max() < 10 ** 12 and (ranks == 0).mean() > 0.1
+
+
+def test_reviews_are_deterministic(tmp_path):
+    first, second = str(tmp_path / 'a.json.gz'), str(tmp_path / 'b.json')
+    assert synthetic_data.generate_reviews(first, 250, seed=1, dup_rate=0.2, chunk_size=100) == 250
+    synthetic_data.generate_reviews(second, 250, seed=1, dup_rate=0.2, chunk_size=100)
+    with gzip.open(first, 'rt', encoding='utf-8') as f, open(second, encoding='utf-8') as g:
+        assert json.load(f) == json.load(g)
+
+    reviews = pd.read_json(first)
+    assert len(reviews) == 250 and reviews['asin'].str.match(r'^B\d{9}$').all()
+    assert reviews.duplicated().sum() >= 20  # dup_rate repeats the previous row
+    assert set(reviews['overall']) <= {1, 2, 3, 4, 5}
+
+
+def test_meta_records(tmp_path):
+    path, lines = str(tmp_path / 'meta.json.gz'), str(tmp_path / 'meta.jsonl')
+    n = synthetic_data.generate_meta(path, 120, dup_rate=0.1, chunk_size=50, main_cats=('A', 'B'))
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        records = json.load(f)
+    assert len(records) == n > 120
+    assert sorted({r['asin'] for r in records}) == [synthetic_data.item_asin(i) for i in range(120)]
+    assert {r['main_cat'] for r in records} == {'A', 'B'} and all(len(r['category']) == 1 for r in records)
+
+    assert synthetic_data.generate_meta_jsonl(lines, 30, chunk_size=7) == 30
+    with open(lines, encoding='utf-8') as f:
+        products = [json.loads(line) for line in f]
+    assert [p['parent_asin'] for p in products] == [synthetic_data.item_asin(i) for i in range(30)]
+    assert all(len(p['features']) <= 3 and p['details'] == {} for p in products)
@@ -0,0 +1,65 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+
+from data_processing import data_merge, tables
+
+
+def frame():
+    return pd.DataFrame({'asin': ['B1', 'B2', 'B1'], 'reviewerID': ['U1', 'U1', 'U2'],
+                         'reviewText': ['good', 'bad', 'good'], 'price': [1.5, 2.25, np.nan],
+                         'overall': [5, 1, 3], 'review_count': [300, 70000, 2], 'verified': [True, False, True]})
+
+
+def test_compact_frame_dtypes():
+    df = frame()
+    compact = tables.compact_frame(df, drop=('reviewText', 'missing'))
+    assert list(compact.columns) == ['asin', 'reviewerID', 'price', 'overall', 'review_count', 'verified']
+    assert isinstance(compact['asin'].dtype, pd.CategoricalDtype)
+    assert isinstance(compact['reviewerID'].dtype, pd.CategoricalDtype)
+    assert compact['price'].dtype == np.float32
+    assert compact['overall'].dtype == np.int8 and compact['review_count'].dtype == np.int32
+    assert compact['verified'].dtype == bool
+    assert compact.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+    # same values, only the storage changes
+    pd.testing.assert_frame_equal(compact.astype(df.drop(columns='reviewText').dtypes), df.drop(columns='reviewText'))
+    assert tables.compact_frame(df)['reviewText'].dtype == df['reviewText'].dtype  # not a category column
+
+
+def test_memory_budget_from_environment(monkeypatch):
+    try:
+        for value, expected in [('1', True), ('0', False), ('', False)]:
+            monkeypatch.setenv('RECO_MEMORY_BUDGET', value)
+            assert importlib.reload(tables).MEMORY_BUDGET is expected
+    finally:
+        monkeypatch.undo()
+        importlib.reload(tables)
+
+
+def test_read_table_under_memory_budget(tmp_path, monkeypatch):
+    path = str(tmp_path / 'reviews.json.gz')
+    frame().to_json(path, compression='gzip')
+    monkeypatch.setattr(tables, 'MEMORY_BUDGET', True)
+    df = tables.read_table(path, columns=['asin', 'price', 'overall'])
+    assert isinstance(df['asin'].dtype, pd.CategoricalDtype) and df['price'].dtype == np.float32
+    assert df['overall'].dtype == np.int8
+    assert not isinstance(tables.read_table(path, compact=False)['asin'].dtype, pd.CategoricalDtype)
+
+
+def test_final_data_under_memory_budget(tmp_path, monkeypatch):
+    review_path, meta_path = str(tmp_path / 'reviews.json.gz'), str(tmp_path / 'meta.json.gz')
+    reviews = frame().drop(columns='price').assign(reviewText_senti=[1, -1, 1], positive_prob=[0.9, 0.1, 0.8])
+    pd.DataFrame({'asin': ['B1', 'B2'], 'description': ['soap', 'brush'], 'title': ['Soap', 'Brush'],
+                  'price': [1.5, 2.25], 'main_cat': ['Beauty', 'Beauty']}).to_json(meta_path, compression='gzip')
+    reviews.to_json(review_path, compression='gzip')
+
+    plain = data_merge.final_data(str(tmp_path / 'plain.json.gz'), review_path, meta_path)
+    monkeypatch.setattr(tables, 'MEMORY_BUDGET', True)
+    monkeypatch.setattr(data_merge, 'MEMORY_BUDGET', True)
+    compact = data_merge.final_data(str(tmp_path / 'compact.json.gz'), review_path, meta_path)
+    for col in ('asin', 'reviewerID', 'description', 'title', 'main_cat'):
+        assert isinstance(compact[col].dtype, pd.CategoricalDtype), col
+    assert compact['price'].dtype == np.float32 and compact['positive_prob'].dtype == np.float32
+    assert compact['overall'].dtype == np.int8
+    pd.testing.assert_frame_equal(compact.astype(plain.dtypes), plain)
@@ -0,0 +1,63 @@
+import random
+import string
+
+import pandas as pd
+import pytest
+
+from serving.title_search import TitleIndex
+
+
+@pytest.fixture(scope='module')
+def names():
+    rng = random.Random(0)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 6))) for _ in range(300)]
+    titles = [' '.join(rng.choices(words, k=rng.randint(1, 6))).title() for _ in range(3000)]
+    titles += ['A', 'ab', ' ab', 'Ab Ab', 'Crème Brûlée Set', 'CRÈME', None, 'ab']
+    return pd.DataFrame({'title': titles, 'asin': [f'B{i:05d}' for i in range(len(titles))]})
+
+
+@pytest.fixture(scope='module')
+def index(names):
+    return TitleIndex(names['title'].tolist(), names['asin'].tolist(), chunk_size=500)
+
+
+def baseline(names, query):
+    """Filter of the app before the index: titles containing the query, case-insensitive."""
+    titles = names['title'].dropna().unique()
+    return [t for t in titles if query.lower() in t.lower()]
+
+
+QUERIES = ['a', 'E', 'ab', ' ab', 'ab ', 'b a', 'abc', 'Crème', 'rème b', 'ûl', ' ', '  ', 'zzzzzz', 'q!']
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_matches_are_the_baseline_filter(names, index, query):
+    expected = baseline(names, query)
+    assert sorted(index.search(query, k=len(index))) == sorted(expected)
+    top = index.search(query, k=100)
+    assert len(top) == min(100, len(expected)) and set(top) <= set(expected)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_ranking(names, index, query):
+    order = {title: i for i, title in enumerate(names['title'].dropna().unique())}
+    q = query.lower()
+
+    def rank(title):
+        key = title.lower()
+        return (0 if key == q else 1 if key.startswith(q) else 2 if f' {q}' in key else 3,
+                len(title), order[title])
+
+    assert index.search(query, k=20) == sorted(baseline(names, query), key=rank)[:20]
+
+
+def test_spaces_are_part_of_the_query(index):
+    assert index.search(' ab', k=1) == [' ab']  # not stripped: the exact title ranks first
+    assert 'ab' not in index.search(' ab', k=len(index))
+    assert index.search('ab', k=1) == ['ab']
+    assert index.search('') == index.titles[:100]
+
+
+def test_asin_of_first_occurrence(names, index):
+    assert index.asin('ab') == names.loc[names['title'] == 'ab', 'asin'].iloc[0]
+    assert index.asin('missing') is None
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from recommendation_filters import content_based_filter, user_profiles
+
+
+@pytest.fixture(scope='module')
+def catalog(final_path):
+    return content_based_filter.cbf_data(final_path), pd.read_json(final_path)
+
+
+@pytest.fixture(scope='module')
+def model(final_path, catalog):
+    return user_profiles.build(final_path, cbf_df=catalog[0])
+
+
+def dense(matrix):
+    return matrix.toarray() if sparse.issparse(matrix) else np.asarray(matrix)
+
+
+def reference_profile(reviews, items, rows, user):
+    """Sentiment weighted sum of the vectors of the user's items, l2 normalized, one review at a time."""
+    profile = np.zeros(items.shape[1])
+    for asin, p in reviews.loc[reviews['reviewerID'] == user, ['asin', 'positive_prob']].itertuples(index=False):
+        profile += (2 * p - 1) * items[rows[asin]]
+    norm = np.linalg.norm(profile)
+    return profile / norm if norm else profile
+
+
+def test_profiles_match_per_review_sum(catalog, model):
+    cbf_df, reviews = catalog
+    items = dense(model.items)
+    rows = dict(zip(cbf_df['asin'], cbf_df.index))
+    assert model.users.tolist() == sorted(reviews['reviewerID'].unique())
+    assert model.asins.tolist() == cbf_df['asin'].tolist()
+    for user in model.users[:20]:
+        np.testing.assert_allclose(dense(model.profiles[model.position(user)]).ravel(),
+                                   reference_profile(reviews, items, rows, user), atol=1e-5)
+
+
+def test_recommend_excludes_seen_items_and_ranks_by_score(catalog, model):
+    _, reviews = catalog
+    users = list(model.users[:30]) + ['unknown']
+    recs = model.recommend_batch(users, top_n=7, batch_size=8)
+    assert recs['unknown'] == [] and model.position('unknown') is None
+    items = dense(model.items)
+    for user in users[:-1]:
+        row = model.position(user)
+        seen = set(reviews.loc[reviews['reviewerID'] == user, 'asin'])
+        assert not seen & set(recs[user]) and len(recs[user]) == min(7, len(model.asins) - len(seen))
+        scores = model.scores(np.array([row]))[0]
+        np.testing.assert_allclose(scores[np.isfinite(scores)],
+                                   (items @ dense(model.profiles[row]).ravel())[np.isfinite(scores)], atol=1e-5)
+        # the batched top_n is the head of the full ordering (decreasing score, then item row)
+        order = sorted((i for i in range(len(scores)) if np.isfinite(scores[i])), key=lambda i: (-scores[i], i))
+        assert recs[user] == model.asins[order[:7]].tolist()
+        assert model.recommend(user, top_n=7) == recs[user]
+    assert model.recommend_batch(users[:3], top_n=0) == {u: [] for u in users[:3]}
+
+
+def test_from_arrays_round_trip(tmp_path, final_path, catalog):
+    from serving.model_store import ModelStore
+    latent = user_profiles.build(final_path, cbf_df=catalog[0], n_components=8)
+    assert latent.profiles.shape == (len(latent), 8) and not sparse.issparse(latent.items)
+    store = ModelStore(str(tmp_path))
+    store.publish('user_profiles', latent.arrays())
+    loaded = user_profiles.UserProfiles.from_arrays(store.attach('user_profiles'))
+    users = list(latent.users[::5])
+    assert loaded.recommend_batch(users, top_n=5) == latent.recommend_batch(users, top_n=5)